@@ -0,0 +1,112 @@
+"""
+Benchmark dos backends de inferência (keras / tf_function / tflite) em CPU
+Mede a latência de uma imagem e de lotes de vários tamanhos para cada backend
+"""
+
+import os
+import sys
+import time
+import json
+
+# Benchmark é de CPU: esconde GPUs antes de o TensorFlow ser importado
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+
+import numpy as np
+
+from utils import load_config, load_model, TFLiteBackend, TF_AVAILABLE, INFERENCE_BACKENDS
+
+
+def build_backend(name, model_path):
+    """Carrega o modelo no backend pedido (TFLite é convertido em memória se preciso)"""
+    if name == 'tflite':
+        tflite_path = os.path.splitext(model_path)[0] + '.tflite'
+        if os.path.exists(tflite_path):
+            return TFLiteBackend(tflite_path)
+        import tensorflow as tf
+        from export_model import convert_to_tflite
+        return TFLiteBackend(model_content=convert_to_tflite(tf.keras.models.load_model(model_path)))
+
+    model, error = load_model(model_path, backend=name)
+    if error:
+        raise RuntimeError(error)
+    return model
+
+
+def measure(model, batch, iterations, warmup):
+    """Retorna latências (ms) de predict sobre o mesmo lote"""
+    for _ in range(warmup):
+        model.predict(batch, verbose=0)
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        model.predict(batch, verbose=0)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark de backends de inferência (CPU)')
+    parser.add_argument('model', help='Arquivo .h5 do modelo')
+    parser.add_argument('--backends', nargs='+', choices=INFERENCE_BACKENDS,
+                        default=list(INFERENCE_BACKENDS), help='Backends a comparar')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 16, 32],
+                        help='Tamanhos de lote')
+    parser.add_argument('--iterations', type=int, default=50, help='Medições por tamanho de lote')
+    parser.add_argument('--warmup', type=int, default=5, help='Execuções descartadas antes de medir')
+    parser.add_argument('--config', default='config.json', help='Arquivo de configuração')
+    parser.add_argument('--output', help='Salva resultados em JSON')
+    args = parser.parse_args()
+
+    if not TF_AVAILABLE:
+        print("✗ TensorFlow não encontrado")
+        sys.exit(1)
+
+    config = load_config(args.config)
+    height, width = config['model']['img_height'], config['model']['img_width']
+    rng = np.random.default_rng(0)
+
+    print("=" * 60)
+    print("BENCHMARK DE BACKENDS DE INFERÊNCIA (CPU)")
+    print("=" * 60)
+    print(f"Modelo: {args.model}")
+
+    results = []
+    for backend in args.backends:
+        try:
+            start = time.perf_counter()
+            model = build_backend(backend, args.model)
+            load_s = time.perf_counter() - start
+        except Exception as e:
+            print(f"\n[{backend}] ✗ Erro ao carregar: {e}")
+            continue
+
+        print(f"\n[{backend}] carregado em {load_s:.2f}s")
+        for batch_size in args.batch_sizes:
+            batch = rng.random((batch_size, height, width, 3), dtype=np.float32)
+            latencies = measure(model, batch, args.iterations, args.warmup)
+            row = {
+                'backend': backend,
+                'batch_size': batch_size,
+                'load_seconds': round(load_s, 3),
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p95_ms': float(np.percentile(latencies, 95)),
+                'mean_ms': float(latencies.mean()),
+                'images_per_s': float(batch_size * 1000 / latencies.mean())
+            }
+            results.append(row)
+            print(f"  lote {batch_size:>3}: p50 {row['p50_ms']:8.2f} ms | "
+                  f"p95 {row['p95_ms']:8.2f} ms | {row['images_per_s']:8.1f} img/s")
+            sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Resultados salvos em: {args.output}")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,35 +17,75 @@ import sys
 sys.setrecursionlimit(5000)  # Default = 1000
 
 # Importação do protocolo RPC manual
-from rpc_protocol import send_rpc_message, receive_rpc_message, image_to_base64
+from rpc_protocol import (
+    RPCConnectionPool, image_to_base64, send_rpc_message, receive_rpc_message
+)
 
 class FireDetectionClient:
     """Cliente de detecção de incêndios via RPC Manual"""
     
-    def __init__(self, host="127.0.0.1", port=5000):
+    # Long-poll do acquire + heartbeat do lease (um de cada por vez)
+    CONTROL_POOL_SIZE = 2
+
+    def __init__(self, host="127.0.0.1", port=5000, pool_size=4):
         self.host = host
         self.port = port
+        self.pool_size = pool_size
         self.is_connected = False
         self.client_id = str(uuid.uuid4())
-        
-    def _send_request(self, method, params=None):
+        # Negociado no health_check: envia imagens como anexos binários
+        self.binary_frames = False
+        # Negociado no health_check: lote em streaming (predict_stream_*)
+        self.stream_batch = False
+        # Nome do modelo no registro do servidor (None = modelo padrão)
+        self.target_model = None
+        self._pool = None
+        self._control_pool = None
+        self._pool_lock = threading.Lock()
+        # Heartbeat do lease enquanto o lock estiver com este cliente
+        self._heartbeat_stop = None
+
+    def _get_pool(self, control=False):
+        """
+        Pool de conexões persistentes (recriado se host/porta mudarem).
+        control=True: pool separado para o long-poll do mutex_acquire e o
+        heartbeat, que seguram conexões por muito tempo e não podem disputar
+        com predições e streams pelas conexões do pool principal.
+        """
+        size = self.CONTROL_POOL_SIZE if control else self.pool_size
+        with self._pool_lock:
+            pool = self._control_pool if control else self._pool
+            if (pool is None or pool.host != self.host or pool.port != self.port
+                    or pool.max_size != size):
+                if pool is not None:
+                    pool.close()
+                pool = RPCConnectionPool(self.host, self.port, max_size=size)
+                if control:
+                    self._control_pool = pool
+                else:
+                    self._pool = pool
+            return pool
+
+    def close(self):
+        """Fecha as conexões mantidas pelos pools"""
+        with self._pool_lock:
+            for pool in (self._pool, self._control_pool):
+                if pool is not None:
+                    pool.close()
+            self._pool = None
+            self._control_pool = None
+        
+    def _send_request(self, method, params=None, timeout=None, control=False):
         if params is None:
             params = {}
-            
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(10)
+        
+        message = {
+            "method": method,
+            "params": params
+        }
         
         try:
-            sock.connect((self.host, self.port))
-            
-            message = {
-                "method": method,
-                "params": params
-            }
-            
-            send_rpc_message(sock, message)
-            response = receive_rpc_message(sock)
-            
+            response = self._get_pool(control).call(message, timeout=timeout)
             return True, response
         except ConnectionRefusedError:
             return False, "Conexão recusada. O servidor está rodando?"
@@ -53,15 +93,13 @@ class FireDetectionClient:
             return False, "Timeout de conexão."
         except Exception as e:
             return False, f"Erro RPC: {str(e)}"
-        finally:
-            try:
-                sock.close()
-            except:
-                pass
 
     def check_health(self):
         success, response = self._send_request("health_check")
         if success and response:
+            capabilities = response.get('capabilities', [])
+            self.binary_frames = 'binary_frames' in capabilities
+            self.stream_batch = 'stream_batch' in capabilities
             return True, response
         return False, response if response else "Sem resposta"
     
@@ -73,43 +111,78 @@ class FireDetectionClient:
             return False, None
         return False, response
     
-    def acquire_lock(self, status_callback=None):
+    def acquire_lock(self, status_callback=None, wait_timeout=20, priority=None):
         while True:
-            success, response = self._send_request("mutex_acquire", {"client_id": self.client_id})
+            # Long-poll: o servidor segura a requisição até conceder o lock
+            params = {"client_id": self.client_id, "wait": True, "timeout": wait_timeout}
+            if priority:
+                params["priority"] = priority  # classe na fila do servidor (critical/normal/bulk)
+            success, response = self._send_request("mutex_acquire", params, timeout=wait_timeout + 5,
+                                                control=True)
             
             if success and response:
                 if response.get('success') and response.get('status') == 'GRANTED':
+                    if response.get('lease_seconds'):
+                        self._start_heartbeat(response['lease_seconds'])
                     return True
                 
                 pos = response.get('queue_position', 1)
-                wait_time = 1.0 + (pos * 0.5)
                 
                 msg = f"⏳ Aguardando vez na fila (Posição: {pos})..."
                 if status_callback:
                     status_callback(msg)
                 print(msg)
                 
-                time.sleep(wait_time)
+                # Servidor antigo (sem long-poll) responde na hora: volta ao polling
+                if not response.get('long_poll'):
+                    time.sleep(1.0 + (pos * 0.5))
             else:
                 if status_callback:
                     status_callback("⚠️ Falha de rede... tentando reconectar.")
                 time.sleep(2)
 
     def release_lock(self):
+        self._stop_heartbeat()
         self._send_request("mutex_release", {"client_id": self.client_id})
 
+    def _start_heartbeat(self, lease_seconds):
+        """Renova o lease a cada 1/3 da validade até release_lock"""
+        self._stop_heartbeat()
+        stop = threading.Event()
+        self._heartbeat_stop = stop
+        
+        def beat():
+            while not stop.wait(lease_seconds / 3.0):
+                success, response = self._send_request("mutex_heartbeat", {"client_id": self.client_id},
+                                                       timeout=lease_seconds / 3.0, control=True)
+                if success and response and not response.get('success'):
+                    break  # lease já perdido: o próximo pedido receberá Mutex Violation
+        
+        threading.Thread(target=beat, daemon=True, name='lease-heartbeat').start()
+
+    def _stop_heartbeat(self):
+        if self._heartbeat_stop is not None:
+            self._heartbeat_stop.set()
+            self._heartbeat_stop = None
+
+    def _image_payload(self, img_bytes):
+        """Bytes crus (quadro binário) se o servidor suportar, senão Base64"""
+        if self.binary_frames:
+            return {'image_bytes': img_bytes}
+        return {'image_b64': image_to_base64(img_bytes)}
+
     def predict_image(self, image_path):
         try:
             with open(image_path, 'rb') as f:
                 img_bytes = f.read()
-                
-            b64_string = image_to_base64(img_bytes)
             
             params = {
                 'client_id': self.client_id,
-                'image_b64': b64_string,
                 'filename': os.path.basename(image_path)
             }
+            params.update(self._image_payload(img_bytes))
+            if self.target_model:
+                params['model'] = self.target_model
             
             success, response = self._send_request("predict_image", params)
             
@@ -131,15 +204,16 @@ class FireDetectionClient:
             for path in image_paths:
                 with open(path, 'rb') as f:
                     b_content = f.read()
-                    images_payload.append({
-                        'filename': os.path.basename(path),
-                        'image_b64': image_to_base64(b_content)
-                    })
+                    item = {'filename': os.path.basename(path)}
+                    item.update(self._image_payload(b_content))
+                    images_payload.append(item)
             
             params = {
                 'client_id': self.client_id,
                 'images': images_payload
             }
+            if self.target_model:
+                params['model'] = self.target_model
 
             success, response = self._send_request("predict_batch", params)
             
@@ -150,6 +224,119 @@ class FireDetectionClient:
         except Exception as e:
             return False, f"Batch Error: {str(e)}"
 
+    def _read_chunk(self, paths, errors):
+        """Lê do disco apenas as imagens de um bloco"""
+        images_payload = []
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    b_content = f.read()
+            except OSError as e:
+                errors.append({'filename': os.path.basename(path), 'error': str(e)})
+                continue
+            item = {'filename': os.path.basename(path)}
+            item.update(self._image_payload(b_content))
+            images_payload.append(item)
+        return images_payload
+
+    def predict_batch_stream(self, image_paths, chunk_size=16, window=2,
+                             progress_callback=None, timeout=120):
+        """
+        Lote em streaming: envia as imagens em blocos por uma única conexão
+        e recebe os resultados de cada bloco assim que ficam prontos.
+        Mantém até 'window' blocos em voo, de modo que o envio do próximo
+        bloco se sobrepõe à inferência do anterior. Só 'window' blocos
+        de imagens ficam na memória do cliente por vez.
+        
+        progress_callback(concluidas, total, resposta_do_bloco) é chamado a cada bloco.
+        Servidores sem suporte a streaming caem no predict_batch tradicional.
+        """
+        if not self.stream_batch:
+            return self.predict_batch(image_paths)
+        
+        total = len(image_paths)
+        results = []
+        errors = []
+        fire_count = 0
+        done = 0
+        
+        def handle(response):
+            nonlocal fire_count, done
+            if response is None:
+                raise ConnectionError("Conexão encerrada pelo servidor durante o stream")
+            if not response.get('success'):
+                # Mutex Violation / modelo ausente: aborta o lote
+                if response.get('error') != 'No valid images in batch':
+                    raise RuntimeError(response.get('error', 'Unknown error from server'))
+            chunk_results = response.get('results', [])
+            results.extend(chunk_results)
+            errors.extend(response.get('errors', []))
+            fire_count += response.get('fires_detected', 0)
+            done += len(chunk_results) + len(response.get('errors', []))
+            if progress_callback:
+                progress_callback(done, total, response)
+        
+        try:
+            with self._get_pool().connection(timeout=timeout) as sock:
+                open_params = {"client_id": self.client_id}
+                if self.target_model:
+                    open_params['model'] = self.target_model
+                send_rpc_message(sock, {"method": "predict_stream_open", "params": open_params})
+                opened = receive_rpc_message(sock)
+                if not opened or not opened.get('success'):
+                    return False, (opened or {}).get('error', 'Falha ao abrir stream')
+                stream_id = opened['stream_id']
+                
+                in_flight = 0
+                for seq, start in enumerate(range(0, total, chunk_size)):
+                    read_errors = []
+                    payload = self._read_chunk(image_paths[start:start + chunk_size], read_errors)
+                    if read_errors:
+                        errors.extend(read_errors)
+                        done += len(read_errors)
+                    if not payload:
+                        continue
+                    
+                    send_rpc_message(sock, {
+                        "method": "predict_stream_chunk",
+                        "params": {
+                            'client_id': self.client_id,
+                            'stream_id': stream_id,
+                            'seq': seq,
+                            'images': payload
+                        }
+                    })
+                    in_flight += 1
+                    del payload
+                    
+                    if in_flight >= window:
+                        handle(receive_rpc_message(sock))
+                        in_flight -= 1
+                
+                while in_flight:
+                    handle(receive_rpc_message(sock))
+                    in_flight -= 1
+                
+                send_rpc_message(sock, {"method": "predict_stream_close",
+                                        "params": {"client_id": self.client_id,
+                                                   "stream_id": stream_id}})
+                summary = receive_rpc_message(sock) or {}
+            
+            return True, {
+                'success': True,
+                'results': results,
+                'errors': errors,
+                'fires_detected': fire_count,
+                'summary': summary
+            }
+        
+        except ConnectionRefusedError:
+            return False, "Conexão recusada. O servidor está rodando?"
+        except socket.timeout:
+            return False, "Timeout de conexão."
+        except Exception as e:
+            return False, f"Batch Error: {str(e)}"
+
 
 class ClientGUI:
     """Interface gráfica do cliente com testes integrados"""
@@ -195,12 +382,17 @@ class ClientGUI:
                     config = json.load(f)
                     self.client.host = config.get('host', '127.0.0.1')
                     self.client.port = config.get('port', 5000)
+                    self.client.pool_size = config.get('pool_size', 4)
         except:
             pass
     
     def save_config(self):
         try:
-            config = {'host': self.client.host, 'port': self.client.port}
+            config = {
+                'host': self.client.host,
+                'port': self.client.port,
+                'pool_size': self.client.pool_size
+            }
             with open('.client_config.json', 'w') as f:
                 json.dump(config, f)
         except:
@@ -313,6 +505,9 @@ class ClientGUI:
         
         self.label_batch_status = tk.Label(batch_frame, text="", bg="#e8f5e9")
         self.label_batch_status.pack(side=tk.LEFT, padx=5)
+        
+        # Progresso do lote em streaming (exibida só durante o processamento)
+        self.batch_progress = ttk.Progressbar(batch_frame, mode='determinate', length=200)
     
     def setup_tests_tab(self):
         """Configura aba de testes de mutex"""
@@ -481,6 +676,11 @@ class ClientGUI:
             self.label_warning.config(text="✅ Servidor online e modelo carregado", fg="green")
             self.btn_select_image.config(state=tk.NORMAL)
             self.btn_batch.config(state=tk.NORMAL)
+        elif isinstance(data, dict) and data.get('model_status') == 'loading':
+            # Servidor já aceita conexões, mas o modelo padrão ainda está carregando
+            self.label_current_model.config(text="⏳ Modelo carregando no servidor...", fg="#1565c0")
+            self.label_warning.config(text="⏳ Aguardando o servidor carregar o modelo", fg="#1565c0")
+            self.master.after(2000, self.connect_to_server)
         else:
             self.label_current_model.config(text="⚠️ Nenhum modelo carregado", fg="#ff6f00")
             self.label_warning.config(text="⚠️ Carregue um modelo no servidor", fg="#ff6f00")
@@ -571,21 +771,41 @@ class ClientGUI:
     def _batch_thread(self, images):
         def update(txt):
             self.master.after(0, lambda: self.label_batch_status.config(text=txt))
+        
+        def progress(done, total, chunk):
+            # Chamado a cada bloco concluído no servidor
+            fires = sum(1 for _, ok, res in results if ok and res.get('fire_detected'))
+            fires += sum(1 for r in chunk.get('results', []) if r.get('fire_detected'))
+            for res in chunk.get('results', []):
+                results.append((res['filename'], True, res))
+            for err in chunk.get('errors', []):
+                results.append((err['filename'], False, err))
+            txt = f"{done}/{total} imagens | 🔥 {fires}"
+            self.master.after(0, lambda: (self.batch_progress.config(value=done),
+                                          self.label_batch_status.config(text=txt)))
             
         results = []
         try:
             update("Aguardando GPU (Lock)...")
-            if self.client.acquire_lock(status_callback=update):
+            # Lotes entram na classe 'bulk' para não atrasar quadros únicos
+            if self.client.acquire_lock(status_callback=update, priority='bulk'):
                 update(f"Enviando {len(images)} imagens...")
-                success, data = self.client.predict_batch(images)
+                self.master.after(0, lambda: (self.batch_progress.config(maximum=len(images), value=0),
+                                              self.batch_progress.pack(side=tk.LEFT, padx=5)))
+                success, data = self.client.predict_batch_stream(images, progress_callback=progress)
                 
                 if success:
-                    for res in data.get('results', []):
-                        results.append((res['filename'], True, res))
+                    # Sem streaming (servidor antigo) os resultados chegam todos no final
+                    if not results:
+                        for res in data.get('results', []):
+                            results.append((res['filename'], True, res))
+                    # Falhas de leitura local não passam pelo servidor
+                    reported = {name for name, _, _ in results}
                     for err in data.get('errors', []):
-                        results.append((err['filename'], False, err))
+                        if err['filename'] not in reported:
+                            results.append((err['filename'], False, err))
                 else:
-                    results = [("Batch Failed", False, str(data))]
+                    results.append(("Batch Failed", False, str(data)))
             else:
                 results = [("Lock Failed", False, "Timeout")]
         finally:
@@ -594,6 +814,7 @@ class ClientGUI:
         self.master.after(0, lambda: self._show_batch_results(results))
         self.master.after(0, lambda: self.btn_batch.config(state=tk.NORMAL))
         self.master.after(0, lambda: self.label_batch_status.config(text=""))
+        self.master.after(0, self.batch_progress.pack_forget)
 
     def _show_batch_results(self, results):
         win = tk.Toplevel(self.master)
@@ -812,7 +1033,9 @@ class ClientGUI:
             )
             return
         
-        json_files = glob.glob("tests/test_concurrent_client_*.json")
+        # Journals binários (.evj); JSON exportado como alternativa
+        json_files = (glob.glob("tests/test_concurrent_client_*.evj")
+                      or glob.glob("tests/test_concurrent_client_*.json"))
         
         if not json_files:
             messagebox.showwarning(
@@ -0,0 +1,125 @@
+"""
+Exporta modelos Keras (.h5) para formatos de inferência otimizados
+- SavedModel com assinatura tf.function 'serving_default'
+- TFLite (flatbuffer float32)
+
+Uso:
+    python export_model.py models/IdentyFIRE_2064_best.h5
+    python export_model.py --all --format tflite
+"""
+
+import os
+import sys
+import time
+
+from utils import load_config, scan_models, TF_AVAILABLE
+
+
+def export_saved_model(model, output_dir, img_height=150, img_width=150):
+    """Salva o modelo com um forward compilado como assinatura de serviço"""
+    import tensorflow as tf
+
+    @tf.function(input_signature=[
+        tf.TensorSpec([None, img_height, img_width, 3], tf.float32, name='image')
+    ])
+    def serve(image):
+        return {'score': model(image, training=False)}
+
+    tf.saved_model.save(model, output_dir, signatures={'serving_default': serve})
+    return output_dir
+
+
+def convert_to_tflite(model, converter_setup=None):
+    """
+    Converte um modelo Keras para TFLite e retorna o flatbuffer (bytes).
+    converter_setup(converter) permite configurar otimizações (ex.: quantização).
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if converter_setup:
+        converter_setup(converter)
+    return converter.convert()
+
+
+def export_tflite(model, output_path, converter_setup=None):
+    """Converte para TFLite e grava o flatbuffer"""
+    with open(output_path, 'wb') as f:
+        f.write(convert_to_tflite(model, converter_setup))
+    return output_path
+
+
+def export_model(model_path, formats, img_height, img_width, output_dir=None):
+    import tensorflow as tf
+
+    base_dir = output_dir or os.path.dirname(model_path)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+
+    print(f"\n📦 {os.path.basename(model_path)}")
+    model = tf.keras.models.load_model(model_path)
+    outputs = []
+
+    if 'savedmodel' in formats:
+        start = time.time()
+        target = export_saved_model(model, os.path.join(base_dir, f"{stem}_savedmodel"),
+                                    img_height, img_width)
+        print(f"  ✓ SavedModel: {target} ({time.time() - start:.1f}s)")
+        outputs.append(target)
+
+    if 'tflite' in formats:
+        start = time.time()
+        target = export_tflite(model, os.path.join(base_dir, f"{stem}.tflite"))
+        size_mb = os.path.getsize(target) / (1024 * 1024)
+        print(f"  ✓ TFLite: {target} ({size_mb:.2f} MB, {time.time() - start:.1f}s)")
+        outputs.append(target)
+
+    return outputs
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Exporta modelos .h5 para SavedModel/TFLite')
+    parser.add_argument('models', nargs='*', help='Arquivos .h5 a exportar')
+    parser.add_argument('--all', action='store_true', help='Exporta todos os .h5 do diretório de modelos')
+    parser.add_argument('--format', choices=['savedmodel', 'tflite', 'all'], default='all',
+                        help='Formato de saída')
+    parser.add_argument('--output-dir', help='Diretório de saída (padrão: ao lado do .h5)')
+    parser.add_argument('--config', default='config.json', help='Arquivo de configuração')
+    args = parser.parse_args()
+
+    if not TF_AVAILABLE:
+        print("✗ TensorFlow não encontrado")
+        sys.exit(1)
+
+    config = load_config(args.config)
+    model_paths = list(args.models)
+    if args.all:
+        model_paths += [m['path'] for m in scan_models(config['server']['models_directory'])
+                        if m['format'] == 'keras']
+    if not model_paths:
+        parser.error("informe os modelos ou use --all")
+
+    formats = ['savedmodel', 'tflite'] if args.format == 'all' else [args.format]
+
+    print("=" * 60)
+    print("EXPORTAÇÃO DE MODELOS")
+    print("=" * 60)
+
+    failures = 0
+    for path in model_paths:
+        try:
+            export_model(path, formats, config['model']['img_height'],
+                         config['model']['img_width'], args.output_dir)
+        except Exception as e:
+            failures += 1
+            print(f"  ✗ Erro: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"Concluído: {len(model_paths) - failures}/{len(model_paths)} modelo(s)")
+    print("=" * 60)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
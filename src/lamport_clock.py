@@ -3,12 +3,20 @@ Implementação de Relógio Lógico de Lamport para Sistemas Distribuídos
 Usado para ordenar eventos e testar o protocolo de exclusão mútua
 """
 
+import os
+import mmap
+import struct
+import zlib
 import threading
 import json
+import heapq
 import time
+from enum import IntEnum
 from datetime import datetime
 from collections import deque
 
+import numpy as np
+
 class LamportClock:
     """
     Relógio Lógico de Lamport
@@ -86,26 +94,29 @@ class VectorClock:
     """
     Relógio Vetorial (extensão do Lamport)
     Permite detectar causalidade entre eventos
+    
+    Vetor esparso indexado pelo process_id (qualquer string, ex.: UUID):
+    processos entram no vetor na primeira vez em que aparecem. Entradas
+    ausentes valem 0. No fio o vetor vai como dict {process_id: contador}.
     """
     
-    def __init__(self, process_id, num_processes):
+    def __init__(self, process_id):
         self.process_id = process_id
-        self.num_processes = num_processes
-        self.vector = [0] * num_processes
+        self.vector = {}
         self.lock = threading.Lock()
         self.event_log = deque(maxlen=1000)
     
     def tick(self):
         """Incrementa posição do próprio processo"""
         with self.lock:
-            self.vector[self.process_id] += 1
-            return self.vector.copy()
+            self.vector[self.process_id] = self.vector.get(self.process_id, 0) + 1
+            return dict(self.vector)
     
     def send_event(self, event_type, data=None):
         """Evento de envio"""
         with self.lock:
-            self.vector[self.process_id] += 1
-            timestamp = self.vector.copy()
+            self.vector[self.process_id] = self.vector.get(self.process_id, 0) + 1
+            timestamp = dict(self.vector)
             
             self._log_event("SEND", event_type, timestamp, data)
             return timestamp
@@ -113,28 +124,36 @@ class VectorClock:
     def receive_event(self, received_vector, event_type, data=None):
         """Atualiza vetor ao receber mensagem"""
         with self.lock:
-            # Atualiza cada posição com o máximo
-            for i in range(self.num_processes):
-                self.vector[i] = max(self.vector[i], received_vector[i])
+            # Atualiza cada posição com o máximo (processos novos entram aqui)
+            for pid, count in received_vector.items():
+                if count > self.vector.get(pid, 0):
+                    self.vector[pid] = count
             
             # Incrementa própria posição
-            self.vector[self.process_id] += 1
+            self.vector[self.process_id] = self.vector.get(self.process_id, 0) + 1
             
-            self._log_event("RECV", event_type, self.vector.copy(), data, received_vector)
-            return self.vector.copy()
+            self._log_event("RECV", event_type, dict(self.vector), data, received_vector)
+            return dict(self.vector)
     
-    def happens_before(self, v1, v2):
+    def get_vector(self):
+        """Retorna cópia do vetor atual sem incrementar"""
+        with self.lock:
+            return dict(self.vector)
+    
+    @staticmethod
+    def happens_before(v1, v2):
         """
         Verifica se v1 happened-before v2 (v1 -> v2)
         Retorna True se v1 < v2 (todos elementos <= e pelo menos um <)
         """
-        less_or_equal = all(v1[i] <= v2[i] for i in range(self.num_processes))
-        strictly_less = any(v1[i] < v2[i] for i in range(self.num_processes))
-        return less_or_equal and strictly_less
+        if any(count > v2.get(pid, 0) for pid, count in v1.items()):
+            return False
+        return any(count > v1.get(pid, 0) for pid, count in v2.items())
     
-    def concurrent(self, v1, v2):
+    @classmethod
+    def concurrent(cls, v1, v2):
         """Verifica se dois eventos são concorrentes"""
-        return not self.happens_before(v1, v2) and not self.happens_before(v2, v1)
+        return not cls.happens_before(v1, v2) and not cls.happens_before(v2, v1)
     
     def _log_event(self, direction, event_type, vector, data=None, recv_vec=None):
         """Registra evento no log"""
@@ -155,18 +174,411 @@ class VectorClock:
             return list(self.event_log)
 
 
+def vectors_to_matrix(vectors, process_ids=None):
+    """
+    Converte vetores esparsos (dicts) para a forma densa NumPy.
+    Retorna (matriz int64 [n_eventos, n_processos], lista de process_ids).
+    """
+    if process_ids is None:
+        process_ids = sorted({pid for v in vectors for pid in v})
+    column = {pid: i for i, pid in enumerate(process_ids)}
+    matrix = np.zeros((len(vectors), len(process_ids)), dtype=np.int64)
+    for row, vector in enumerate(vectors):
+        for pid, count in vector.items():
+            matrix[row, column[pid]] = count
+    return matrix, process_ids
+
+
+def causality_matrices(vectors, block_size=None):
+    """
+    Relações causais entre todos os pares de eventos de uma vez.
+    Aceita vetores esparsos (dicts) ou a matriz densa de vectors_to_matrix.
+    
+    Retorna (happens_before, concurrent), matrizes booleanas n x n:
+    happens_before[i, j] = evento i -> evento j; concurrent[i, j] = i || j
+    (vetores iguais, como a diagonal, não contam como concorrentes).
+    Calcula apenas leq[i, j] = (v_i <= v_j em todas as posições), em blocos
+    de linhas para limitar a memória; o resto sai de leq e sua transposta.
+    """
+    matrix = vectors if isinstance(vectors, np.ndarray) else vectors_to_matrix(vectors)[0]
+    n, width = matrix.shape
+    if block_size is None:
+        # ~16M comparações por bloco
+        block_size = max(1, (1 << 24) // max(1, n * width))
+    
+    leq = np.empty((n, n), dtype=bool)
+    for start in range(0, n, block_size):
+        block = matrix[start:start + block_size]
+        leq[start:start + len(block)] = (block[:, None, :] <= matrix[None, :, :]).all(axis=2)
+    
+    happens_before = leq & ~leq.T
+    concurrent = ~leq & ~leq.T
+    return happens_before, concurrent
+
+
+def concurrent_critical_sections(intervals):
+    """
+    Exclusão mútua pela causalidade: duas seções críticas de processos
+    diferentes precisam estar ordenadas (EXIT_CS de uma -> ENTER_CS da outra).
+    intervals: {process_id: [(vetor do ENTER_CS, vetor do EXIT_CS), ...]}
+    Retorna a lista de pares concorrentes (vazia = seguro).
+    """
+    owners, enters, exits = [], [], []
+    for pid, pairs in intervals.items():
+        for enter, exit_ in pairs:
+            owners.append(pid)
+            enters.append(enter)
+            exits.append(exit_)
+    n = len(owners)
+    if n < 2:
+        return []
+    happens_before, _ = causality_matrices(enters + exits)
+    exit_before_enter = happens_before[n:, :n]  # [i, j] = EXIT_CS i -> ENTER_CS j
+    ordered = exit_before_enter | exit_before_enter.T
+    owners = np.asarray(owners, dtype=object)
+    different = owners[:, None] != owners[None, :]
+    rows, cols = np.nonzero(np.triu(~ordered & different, k=1))
+    return [{'processes': [owners[i], owners[j]], 'enter_vectors': [enters[i], enters[j]]}
+            for i, j in zip(rows.tolist(), cols.tolist())]
+
+
+# ============================================================================
+# JOURNAL BINÁRIO DE EVENTOS (APPEND-ONLY, MEMORY-MAPPED)
+# ============================================================================
+
+class MutexEventType(IntEnum):
+    """Tipos de evento de exclusão mútua (1 byte no registro binário)"""
+    REQUEST = 1
+    GRANT = 2
+    ENTER_CS = 3
+    EXIT_CS = 4
+    RELEASE = 5
+    LEASE_EXPIRED = 6  # registrado pelo coordenador; pid do registro = cliente que perdeu o lease
+
+
+# Registro de tamanho fixo (24 bytes, alinhado)
+EVENT_RECORD_DTYPE = np.dtype([
+    ('lamport_ts', '<u8'),
+    ('wall_clock', '<f8'),
+    ('pid', '<u4'),          # crc32 do process_id (o nome fica no cabeçalho) ou do cliente afetado
+    ('event_type', 'u1'),
+    ('_reserved', 'u1', (3,))
+])
+
+JOURNAL_MAGIC = b'IFEJ'
+JOURNAL_VERSION = 1
+# Cabeçalho: magic, versão, tamanho do cabeçalho, nº de registros, tamanho do pid
+_JOURNAL_HEADER = struct.Struct('<4sHIQH')
+
+
+def pid_hash(process_id):
+    """Identificador numérico estável de um processo (igual em todos os arquivos)"""
+    return zlib.crc32(str(process_id).encode('utf-8'))
+
+
+class EventJournal:
+    """
+    Journal append-only de eventos de mutex em registros binários de 24 bytes.
+    - Com path: arquivo memory-mapped que cresce por duplicação; o número de
+      registros fica no cabeçalho e é atualizado a cada append, então um
+      crash do processo não perde os eventos já registrados.
+    - Sem path: mesmo formato em memória anônima.
+    records() devolve uma view NumPy (sem cópia) dos registros válidos.
+    """
+    INITIAL_CAPACITY = 4096
+
+    def __init__(self, path=None, process_id='unknown'):
+        self.path = path
+        self.process_id = str(process_id)
+        self.pid = pid_hash(self.process_id)
+        pid_bytes = self.process_id.encode('utf-8')
+        # Área de registros começa alinhada em 8 bytes
+        self.header_size = (_JOURNAL_HEADER.size + len(pid_bytes) + 7) // 8 * 8
+        self._pid_bytes = pid_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._mm = None
+        self._records = None
+        self.count = 0
+        self.capacity = 0
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, 'w+b')
+        self._remap(self.INITIAL_CAPACITY)
+        self._write_header()
+
+    def _remap(self, capacity):
+        # O mmap antigo não é fechado explicitamente: views já entregues por
+        # records() continuam válidas e o liberam quando forem descartadas
+        size = self.header_size + capacity * EVENT_RECORD_DTYPE.itemsize
+        old = self._mm
+        self._records = None
+        if self._file is not None:
+            if old is not None:
+                old.flush()
+            if os.name != 'nt':
+                self._file.truncate(size)  # no Windows o mmap estende o arquivo sozinho
+            self._mm = mmap.mmap(self._file.fileno(), size)
+        else:
+            self._mm = mmap.mmap(-1, size)
+            if old is not None:
+                self._mm[:len(old)] = old[:]
+        self._records = np.frombuffer(self._mm, dtype=EVENT_RECORD_DTYPE,
+                                      count=capacity, offset=self.header_size)
+        self.capacity = capacity
+
+    def _write_header(self):
+        _JOURNAL_HEADER.pack_into(self._mm, 0, JOURNAL_MAGIC, JOURNAL_VERSION,
+                                  self.header_size, self.count, len(self._pid_bytes))
+        self._mm[_JOURNAL_HEADER.size:_JOURNAL_HEADER.size + len(self._pid_bytes)] = self._pid_bytes
+
+    def append(self, event_type, lamport_ts, wall_clock=None, subject=None):
+        """subject: process_id afetado pelo evento, se não for o dono do journal"""
+        with self._lock:
+            if self.count == self.capacity:
+                self._remap(self.capacity * 2)
+            record = self._records[self.count]
+            record['lamport_ts'] = lamport_ts
+            record['wall_clock'] = time.time() if wall_clock is None else wall_clock
+            record['pid'] = self.pid if subject is None else pid_hash(subject)
+            record['event_type'] = int(event_type)
+            self.count += 1
+            # Contador no cabeçalho por último: leitores só veem registros completos
+            struct.pack_into('<Q', self._mm, 10, self.count)
+
+    def records(self):
+        """View (sem cópia) dos registros gravados até agora"""
+        with self._lock:
+            if self._mm is None:
+                # Journal fechado: relê do arquivo (ou da cópia, se era em memória)
+                if self.path:
+                    return read_event_journal(self.path)[1]
+                return self._closed_records
+            return self._records[:self.count]
+
+    def flush(self):
+        with self._lock:
+            if self._mm is not None:
+                self._mm.flush()
+
+    def close(self):
+        """Fecha o journal, cortando o arquivo no último registro"""
+        with self._lock:
+            if self._mm is None:
+                return
+            if not self.path:
+                self._closed_records = self._records[:self.count].copy()
+            self._records = None
+            self._mm.flush()
+            try:
+                self._mm.close()
+            except BufferError:
+                pass  # ainda há views abertas; o mapeamento é liberado com elas
+            self._mm = None
+            if self._file is not None:
+                try:
+                    self._file.truncate(self.header_size + self.count * EVENT_RECORD_DTYPE.itemsize)
+                except OSError:
+                    pass  # arquivo ainda mapeado (Windows): leitores usam o contador do cabeçalho
+                self._file.close()
+                self._file = None
+
+
+def is_event_journal(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(4) == JOURNAL_MAGIC
+    except OSError:
+        return False
+
+
+def read_event_journal(path):
+    """
+    Abre um journal para leitura sem cópia.
+    Retorna (process_id, registros) com registros = np.memmap somente leitura.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(_JOURNAL_HEADER.size)
+        magic, version, header_size, count, pid_len = _JOURNAL_HEADER.unpack(header)
+        if magic != JOURNAL_MAGIC:
+            raise ValueError(f"{path} não é um journal de eventos")
+        process_id = f.read(pid_len).decode('utf-8')
+    # Journal ainda aberto pelo escritor: o arquivo pode ter capacidade extra
+    available = (os.path.getsize(path) - header_size) // EVENT_RECORD_DTYPE.itemsize
+    count = min(count, available)
+    if count == 0:
+        return process_id, np.zeros(0, dtype=EVENT_RECORD_DTYPE)
+    records = np.memmap(path, dtype=EVENT_RECORD_DTYPE, mode='r',
+                        offset=header_size, shape=(count,))
+    return process_id, records
+
+
+def journal_records_to_events(records, process_names):
+    """Converte registros binários para o formato dict do log JSON (export/visualização)"""
+    events = []
+    for ts, wall, pid, etype in zip(records['lamport_ts'].tolist(), records['wall_clock'].tolist(),
+                                    records['pid'].tolist(), records['event_type'].tolist()):
+        events.append({
+            'process_id': process_names.get(pid, str(pid)),
+            'event_type': MutexEventType(etype).name,
+            'lamport_ts': ts,
+            'wall_clock': wall,
+            'wall_clock_str': datetime.fromtimestamp(wall).isoformat(),
+            'data': {}
+        })
+    return events
+
+
+def load_event_log(path):
+    """
+    Lê um log de eventos (journal binário ou JSON exportado).
+    Retorna (process_id, eventos em dict).
+    """
+    if is_event_journal(path):
+        process_id, records = read_event_journal(path)
+        return process_id, journal_records_to_events(records, {pid_hash(process_id): process_id})
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    events = data.get('events', [])
+    process_id = data.get('process_id', events[0].get('process_id', 'unknown') if events else 'unknown')
+    return process_id, events
+
+
+def events_to_records(events, process_id=None):
+    """Converte eventos em dict (log JSON) para o array estruturado do journal"""
+    records = np.zeros(len(events), dtype=EVENT_RECORD_DTYPE)
+    if not events:
+        return records
+    records['lamport_ts'] = [e['lamport_ts'] for e in events]
+    records['wall_clock'] = [e.get('wall_clock', 0.0) for e in events]
+    records['event_type'] = [MutexEventType[e['event_type']] for e in events]
+    records['pid'] = [pid_hash(process_id or e.get('process_id', 'unknown')) for e in events]
+    return records
+
+
+def _distribution(values, scale=1.0, quantiles=(50, 90, 95, 99)):
+    """Resumo de uma distribuição: contagem, média, min/max e percentis"""
+    if len(values) == 0:
+        return {'count': 0}
+    values = np.asarray(values, dtype=np.float64) * scale
+    summary = {
+        'count': int(len(values)),
+        'mean': round(float(values.mean()), 3),
+        'min': round(float(values.min()), 3),
+        'max': round(float(values.max()), 3)
+    }
+    for q, value in zip(quantiles, np.percentile(values, quantiles)):
+        summary[f'p{q}'] = round(float(value), 3)
+    return summary
+
+
+def compute_mutex_statistics(records):
+    """
+    Estatísticas de mutex a partir dos registros do journal (colunar, O(n log n)).
+
+    - Espera REQUEST -> GRANT: cada GRANT é casado com o último REQUEST anterior
+      via searchsorted (lógica em ticks e wall-clock em ms)
+    - Tempo na CS: cada ENTER_CS é casado com o primeiro EXIT_CS posterior
+    - Vazão: seções críticas por segundo (média e pico em janelas de 1s)
+    """
+    if len(records) == 0:
+        return {}
+    order = np.argsort(records['lamport_ts'], kind='stable')
+    ts = records['lamport_ts'][order].astype(np.int64)
+    wall = records['wall_clock'][order]
+    etype = records['event_type'][order]
+    counts = np.bincount(etype, minlength=max(MutexEventType) + 1)
+    
+    def select(kind):
+        mask = etype == kind
+        return ts[mask], wall[mask]
+    
+    req_ts, req_wall = select(MutexEventType.REQUEST)
+    grant_ts, grant_wall = select(MutexEventType.GRANT)
+    enter_ts, enter_wall = select(MutexEventType.ENTER_CS)
+    exit_ts, exit_wall = select(MutexEventType.EXIT_CS)
+    
+    # REQUEST -> GRANT (último request estritamente anterior ao grant)
+    idx = np.searchsorted(req_ts, grant_ts, side='left') - 1
+    matched = idx >= 0
+    wait_logical = grant_ts[matched] - req_ts[idx[matched]]
+    wait_wall = grant_wall[matched] - req_wall[idx[matched]]
+    
+    # ENTER_CS -> EXIT_CS (primeiro exit posterior ao enter)
+    idx = np.searchsorted(exit_ts, enter_ts, side='right')
+    matched = idx < len(exit_ts)
+    hold_logical = exit_ts[idx[matched]] - enter_ts[matched]
+    hold_wall = exit_wall[idx[matched]] - enter_wall[matched]
+    
+    throughput = {'cs_per_second': 0.0, 'peak_cs_per_second': 0}
+    if len(exit_wall):
+        span = float(wall.max() - wall.min())
+        if span > 0:
+            throughput['cs_per_second'] = round(len(exit_wall) / span, 3)
+        per_second = np.bincount((exit_wall - wall.min()).astype(np.int64))
+        throughput['peak_cs_per_second'] = int(per_second.max())
+    
+    return {
+        'total_events': int(len(records)),
+        'requests': int(counts[MutexEventType.REQUEST]),
+        'grants': int(counts[MutexEventType.GRANT]),
+        'enters': int(counts[MutexEventType.ENTER_CS]),
+        'exits': int(counts[MutexEventType.EXIT_CS]),
+        'releases': int(counts[MutexEventType.RELEASE]),
+        'lease_expired': int(counts[MutexEventType.LEASE_EXPIRED]),
+        'avg_wait_time_logical': float(wait_logical.mean()) if len(wait_logical) else 0,
+        'max_lamport_ts': int(ts[-1]),
+        'wait_time_logical': _distribution(wait_logical),
+        'wait_time_wall_ms': _distribution(wait_wall, scale=1000),
+        'hold_time_logical': _distribution(hold_logical),
+        'hold_time_wall_ms': _distribution(hold_wall, scale=1000),
+        'throughput': throughput
+    }
+
+
 class MutexEventLogger:
     """
     Logger especializado para eventos de exclusão mútua
     Combina relógio lógico com análise de corretude
+    
+    vector_clock: VectorClock opcional (o mesmo usado no transporte RPC).
+    Cada evento de mutex avança o vetor e o guarda em event_vectors, na ordem
+    dos registros do journal (o registro binário de 24 bytes não cabe o vetor).
     """
     
-    def __init__(self, process_id):
+    def __init__(self, process_id, journal_path=None, vector_clock=None):
         self.process_id = process_id
         self.clock = LamportClock(process_id)
-        self.mutex_events = []
+        self.vector_clock = vector_clock
+        self.event_vectors = []  # (tipo do evento, vetor), um por registro do journal
+        # Eventos vão direto para o journal binário (arquivo se journal_path for dado)
+        self.journal = EventJournal(journal_path, process_id)
         self.lock = threading.Lock()
     
+    @property
+    def mutex_events(self):
+        """Eventos em formato dict (gerado sob demanda a partir do journal)"""
+        events = journal_records_to_events(self.journal.records(), {self.journal.pid: str(self.process_id)})
+        if self.vector_clock is not None:
+            for event, (_, vector) in zip(events, self.event_vectors):
+                event['vector_ts'] = vector
+        return events
+    
+    def critical_section_vectors(self):
+        """Pares (vetor do ENTER_CS, vetor do EXIT_CS) deste processo, em ordem"""
+        pairs = []
+        enter = None
+        for event_type, vector in list(self.event_vectors):
+            if event_type == 'ENTER_CS':
+                enter = vector
+            elif event_type == 'EXIT_CS' and enter is not None:
+                pairs.append((enter, vector))
+                enter = None
+        return pairs
+    
     def log_request(self, data=None):
         """Cliente solicita acesso"""
         ts = self.clock.send_event("MUTEX_REQUEST", data)
@@ -195,6 +607,19 @@ class MutexEventLogger:
         self._log_mutex_event("EXIT_CS", ts, {'critical_section': False})
         return ts
     
+    def log_lease_expired(self, client_id, server_timestamp=None):
+        """
+        Coordenador expirou o lease de client_id (o registro leva o hash do cliente).
+        server_timestamp (ms) alinha o relógio com o que os clientes recebem no grant.
+        """
+        with self.lock:
+            if server_timestamp is not None:
+                self.clock.receive_event(server_timestamp, 'LEASE_TIMER')
+            ts = self.clock.tick()
+            self._record_vector('LEASE_EXPIRED')
+            self.journal.append(MutexEventType.LEASE_EXPIRED, ts, time.time(), subject=client_id)
+        return ts
+    
     def log_release(self, data=None):
         """Cliente libera recurso"""
         ts = self.clock.send_event("MUTEX_RELEASE", data)
@@ -202,17 +627,20 @@ class MutexEventLogger:
         return ts
     
     def _log_mutex_event(self, event_type, timestamp, data):
-        """Registra evento de mutex"""
+        """Registra evento de mutex (registro fixo no journal; 'data' não é persistido)"""
         with self.lock:
-            event = {
-                'process_id': self.process_id,
-                'event_type': event_type,
-                'lamport_ts': timestamp,
-                'wall_clock': time.time(),
-                'wall_clock_str': datetime.now().isoformat(),
-                'data': data or {}
-            }
-            self.mutex_events.append(event)
+            self._record_vector(event_type)
+            self.journal.append(MutexEventType[event_type], timestamp, time.time())
+    
+    def _record_vector(self, event_type):
+        """Avança o relógio vetorial (envio em REQUEST/RELEASE) e guarda o vetor do evento"""
+        if self.vector_clock is None:
+            return
+        if event_type in ('REQUEST', 'RELEASE'):
+            vector = self.vector_clock.send_event(f'MUTEX_{event_type}')
+        else:
+            vector = self.vector_clock.tick()
+        self.event_vectors.append((event_type, vector))
     
     def verify_mutex_safety(self):
         """
@@ -231,6 +659,7 @@ class MutexEventLogger:
         
         in_cs = set()
         violations = []
+        lease_expirations = 0
         
         for event in events_sorted:
             pid = event['process_id']
@@ -247,57 +676,39 @@ class MutexEventLogger:
             
             elif etype == "EXIT_CS":
                 in_cs.discard(pid)
+            
+            elif etype == "LEASE_EXPIRED":
+                # O coordenador retomou o slot: o dono deixa de contar como na CS
+                in_cs = {p for p in in_cs if p != pid and str(pid_hash(p)) != pid}
+                lease_expirations += 1
         
         return {
             'safe': len(violations) == 0,
             'violations': violations,
+            'lease_expirations': lease_expirations,
             'total_events': len(events_sorted)
         }
     
     def get_statistics(self):
-        """Retorna estatísticas dos eventos"""
-        with self.lock:
-            events_copy = list(self.mutex_events)
-            process_id = self.process_id
-        
-        return self._calculate_statistics_unlocked(events_copy, process_id)
+        """Retorna estatísticas dos eventos (direto dos registros do journal)"""
+        stats = compute_mutex_statistics(self.journal.records())
+        if stats:
+            stats['process_id'] = self.process_id
+        return stats
     
     def _calculate_statistics_unlocked(self, events, process_id):
-        """Calcula estatísticas SEM usar lock (versão segura)"""
-        if not events:
-            return {}
-        
-        request_count = sum(1 for e in events if e['event_type'] == 'REQUEST')
-        grant_count = sum(1 for e in events if e['event_type'] == 'GRANT')
-        enter_cs_count = sum(1 for e in events if e['event_type'] == 'ENTER_CS')
-        exit_cs_count = sum(1 for e in events if e['event_type'] == 'EXIT_CS')
-        release_count = sum(1 for e in events if e['event_type'] == 'RELEASE')
-        
-        # Calcular tempos de espera (REQUEST -> GRANT)
-        wait_times = []
-        requests = {e['lamport_ts']: e for e in events if e['event_type'] == 'REQUEST'}
-        grants = [e for e in events if e['event_type'] == 'GRANT']
-        
-        for grant in grants:
-            # Encontrar REQUEST correspondente (último antes do GRANT)
-            request_ts = max((ts for ts in requests.keys() if ts < grant['lamport_ts']), default=None)
-            if request_ts:
-                wait_times.append(grant['lamport_ts'] - request_ts)
-        
-        return {
-            'total_events': len(events),
-            'requests': request_count,
-            'grants': grant_count,
-            'enters': enter_cs_count,
-            'exits': exit_cs_count,
-            'releases': release_count,
-            'avg_wait_time_logical': sum(wait_times) / len(wait_times) if wait_times else 0,
-            'max_lamport_ts': max(e['lamport_ts'] for e in events) if events else 0,
-            'process_id': process_id
-        }
+        """Calcula estatísticas SEM usar lock (eventos em dict, ex.: log JSON)"""
+        stats = compute_mutex_statistics(events_to_records(events, process_id))
+        if stats:
+            stats['process_id'] = process_id
+        return stats
+    
+    def close(self):
+        """Fecha o journal (o arquivo fica com o tamanho exato dos registros)"""
+        self.journal.close()
     
     def export_events(self, filename=None):
-        """Exporta eventos para arquivo JSON"""
+        """Exporta eventos para arquivo JSON (sob demanda; o journal já está em disco)"""
         if filename is None:
             filename = f"mutex_events_{self.process_id}_{int(time.time())}.json"
         
@@ -329,43 +740,119 @@ class MutexEventLogger:
             return None
 
 
-def compare_event_logs(log_files):
+def iter_event_log(path, chunk_size=4096, order_by='lamport_ts'):
     """
-    Compara logs de múltiplos processos para verificar consistência global
+    Itera os eventos de um log (journal ou JSON) em ordem de order_by
+    ('lamport_ts' ou 'wall_clock').
+    Journals são lidos em blocos de chunk_size registros (memória limitada);
+    JSON exportado é carregado inteiro, como antes.
     """
-    all_events = []
-    
-    for log_file in log_files:
-        with open(log_file, 'r') as f:
-            data = json.load(f)
-            all_events.extend(data.get('events', []))
-    
-    # Ordenar por timestamp de Lamport
-    all_events.sort(key=lambda e: (e['lamport_ts'], e['process_id']))
+    if is_event_journal(path):
+        process_id, records = read_event_journal(path)
+        names = {pid_hash(process_id): process_id}
+        for start in range(0, len(records), chunk_size):
+            chunk = np.array(records[start:start + chunk_size])
+            # Um processo gera timestamps crescentes; ordena o bloco por garantia
+            chunk = chunk[np.argsort(chunk[order_by], kind='stable')]
+            yield from journal_records_to_events(chunk, names)
+        return
+    _, events = load_event_log(path)
+    yield from sorted(events, key=lambda e: e[order_by])
+
+
+def compare_event_logs(log_files, output_file=None, max_violations=1000, slots=1,
+                       order_by='lamport_ts'):
+    """
+    Compara logs de múltiplos processos para verificar consistência global.
+    Invariante verificado: no máximo `slots` processos na CS ao mesmo tempo
+    (slots=1 é a exclusão mútua clássica).
+    order_by='wall_clock' ordena pelo relógio físico: só é confiável quando
+    todos os processos compartilham o mesmo relógio (ex.: mesma máquina).
+
+    Merge k-way em streaming (heap sobre um iterador por arquivo, ordem
+    (lamport_ts, process_id)): a exclusão mútua é verificada à medida que os
+    eventos saem do heap, sem carregar todos os logs na memória.
+    Se output_file for dado, a ordem global é gravada em JSON Lines.
+
+    Com order_by='wall_clock' também mede o atraso de sincronização: tempo entre
+    um EXIT_CS e o próximo ENTER_CS de um processo que já aguardava (REQUEST
+    anterior ao EXIT) - custo de passar a CS adiante, em ms.
+    """
+    streams = [iter_event_log(path, order_by=order_by) for path in log_files]
+    merged = heapq.merge(*streams, key=lambda e: (e[order_by], e['process_id']))
     
-    # Verificar exclusão mútua global
     in_cs = set()
+    processes = set()
     violations = []
-    
-    for event in all_events:
-        pid = event['process_id']
-        etype = event['event_type']
-        
-        if etype == "ENTER_CS":
-            if in_cs:
-                violations.append({
-                    'timestamp': event['lamport_ts'],
-                    'violation': 'Multiple processes in CS',
-                    'processes': list(in_cs) + [pid]
-                })
-            in_cs.add(pid)
-        elif etype == "EXIT_CS":
-            in_cs.discard(pid)
-    
-    return {
-        'total_events': len(all_events),
-        'processes': list(set(e['process_id'] for e in all_events)),
+    violation_count = 0
+    out_of_order = set()
+    lease_expirations = 0
+    last_ts = {}
+    waiting_since = {}  # processo -> wall_clock do REQUEST pendente
+    last_exit = None
+    sync_delays = []
+    total = 0
+    
+    out = open(output_file, 'w', encoding='utf-8') if output_file else None
+    try:
+        for event in merged:
+            total += 1
+            pid = event['process_id']
+            etype = event['event_type']
+            ts = event[order_by]
+            if etype != "LEASE_EXPIRED":
+                processes.add(pid)
+                
+                # Blocos de um mesmo arquivo fora de ordem entre si invalidam o merge
+                if ts < last_ts.get(pid, 0):
+                    out_of_order.add(pid)
+                last_ts[pid] = ts
+            
+            if etype == "REQUEST":
+                waiting_since.setdefault(pid, event['wall_clock'])
+            elif etype == "ENTER_CS":
+                requested = waiting_since.pop(pid, None)
+                if last_exit is not None and requested is not None and requested <= last_exit:
+                    sync_delays.append(event['wall_clock'] - last_exit)
+                if len(in_cs) >= slots:
+                    violation_count += 1
+                    if len(violations) < max_violations:
+                        violations.append({
+                            'timestamp': event['lamport_ts'],
+                            'wall_clock': event['wall_clock'],
+                            'violation': ('Multiple processes in CS' if slots == 1
+                                          else f'More than {slots} processes in CS'),
+                            'processes': list(in_cs) + [pid]
+                        })
+                in_cs.add(pid)
+            elif etype == "EXIT_CS":
+                in_cs.discard(pid)
+                last_exit = event['wall_clock']
+            elif etype == "LEASE_EXPIRED":
+                # Registro do coordenador: process_id é o cliente (ou o hash dele)
+                in_cs = {p for p in in_cs if p != pid and str(pid_hash(p)) != pid}
+                lease_expirations += 1
+            
+            if out is not None:
+                out.write(json.dumps(event) + '\n')
+    finally:
+        if out is not None:
+            out.close()
+    
+    result = {
+        'total_events': total,
+        'processes': sorted(processes),
+        'slots': slots,
+        'order_by': order_by,
         'violations': violations,
-        'safe': len(violations) == 0,
-        'ordered_events': all_events
-    }
\ No newline at end of file
+        'violation_count': violation_count,
+        'lease_expirations': lease_expirations,
+        'safe': violation_count == 0
+    }
+    if order_by == 'wall_clock':
+        result['sync_delay_ms'] = _distribution(sync_delays, scale=1000)
+    if out_of_order:
+        result['out_of_order_processes'] = sorted(out_of_order)
+    if output_file:
+        result['ordered_events_file'] = output_file
+    return result
@@ -0,0 +1,367 @@
+"""
+Benchmark de carga do servidor RPC
+- Gera tráfego real de predict_image / predict_batch com N clientes simultâneos
+- Malha fechada (cada cliente envia o próximo pedido ao receber a resposta) ou
+  malha aberta (chegadas de Poisson a uma taxa fixa, latência medida a partir
+  do instante programado, sem omissão coordenada)
+- Varia concorrência, tamanho das imagens e tamanho do lote
+- Sobe um servidor local em processo separado com um modelo stub em CPU
+  (não precisa de TensorFlow) ou mede um servidor já em execução
+"""
+
+import io
+import os
+import sys
+import time
+import json
+import uuid
+import random
+import socket
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from rpc_protocol import RPCConnectionPool
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Servidor filho: modelo stub em CPU e logs por predição desligados
+# (o print de cada predição distorceria a medição); sem arquivos de log nem
+# journal do mutex, para não deixar saídas na cópia de trabalho
+SERVER_CHILD = """
+import sys, time
+sys.path.insert(0, {src!r})
+import server_gui
+
+class StubModel:
+    \"\"\"Modelo falso: custo fixo por imagem, score = média dos pixels\"\"\"
+    def predict(self, x, verbose=0):
+        time.sleep({stub_ms} * len(x) / 1000.0)
+        return x.mean(axis=(1, 2, 3)).reshape(-1, 1)
+
+srv = server_gui.IdentyFireRPCServer()
+srv.config['server']['auto_load_default'] = False
+srv.config.setdefault('logging', {{}}).update(save_logs=False, mutex_journal=None)
+if {engine!r}:
+    srv.engine = {engine!r}
+srv.max_connections = max(srv.max_connections, {max_connections})
+srv.cache_enabled = {cache}
+srv.log = lambda message: None
+if {use_stub}:
+    srv.models.publish('stub', StubModel(), replicas=[StubModel() for _ in range(srv.models.replicas - 1)])
+elif {model!r}:
+    srv.config['server']['default_model'] = {model!r}
+    srv.config['server']['auto_load_default'] = True
+srv.start_server_wrapper('127.0.0.1', {port})
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(port, args):
+    code = SERVER_CHILD.format(
+        src=SRC_DIR, port=port, engine=args.engine, stub_ms=args.stub_ms,
+        max_connections=max(args.concurrency) + 16, cache=args.cache,
+        use_stub=not args.model, model=args.model
+    )
+    return subprocess.Popen([sys.executable, '-c', code], cwd=os.path.dirname(SRC_DIR),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(pool, timeout):
+    """Espera o servidor responder com o modelo pronto"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            health = pool.call({'method': 'health_check', 'params': {}}, timeout=2)
+            if health.get('model_status') == 'ready':
+                return health
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("Servidor não ficou pronto a tempo")
+
+
+def start_heartbeat(pool, client_id, lease_seconds):
+    """Renova o lease do lock compartilhado a cada 1/3 da validade (como o client_gui)"""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(lease_seconds / 3.0):
+            try:
+                pool.call({'method': 'mutex_heartbeat', 'params': {'client_id': client_id}},
+                          timeout=lease_seconds / 3.0)
+            except OSError:
+                pass
+
+    threading.Thread(target=beat, daemon=True, name='lease-heartbeat').start()
+    return stop
+
+
+def make_image_pool(size, count, seed=0):
+    """Imagens JPEG de ruído distintas (evita acertos no cache de predições)"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+class LoadClient:
+    """Um cliente simulado: conexão própria e (no modo per-request) id próprio"""
+
+    def __init__(self, host, port, client_id, mutex_mode, images, batch_size, priority=None):
+        self.pool = RPCConnectionPool(host, port, max_size=1, timeout=60)
+        self.client_id = client_id
+        self.priority = priority
+        self.mutex_mode = mutex_mode
+        self.images = images
+        self.batch_size = batch_size
+
+    def _params(self):
+        if self.batch_size == 1:
+            return 'predict_image', {
+                'client_id': self.client_id,
+                'filename': 'bench.jpg',
+                'image_bytes': random.choice(self.images)
+            }
+        return 'predict_batch', {
+            'client_id': self.client_id,
+            'images': [{'filename': f'bench_{i}.jpg', 'image_bytes': random.choice(self.images)}
+                       for i in range(self.batch_size)]
+        }
+
+    def request(self):
+        """Executa uma operação completa; retorna True se a predição deu certo"""
+        if self.mutex_mode == 'per-request':
+            lock = self.pool.call({'method': 'mutex_acquire',
+                                   'params': {'client_id': self.client_id, 'wait': True, 'timeout': 30,
+                                              'priority': self.priority}})
+            if lock.get('status') != 'GRANTED':
+                return False
+        try:
+            method, params = self._params()
+            response = self.pool.call({'method': method, 'params': params})
+            return bool(response.get('success'))
+        finally:
+            if self.mutex_mode == 'per-request':
+                self.pool.call({'method': 'mutex_release', 'params': {'client_id': self.client_id}})
+
+    def close(self):
+        self.pool.close()
+
+
+def run_closed_loop(clients, duration, warmup):
+    """Cada cliente envia o próximo pedido assim que recebe a resposta"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+
+    def worker(client):
+        local_lat, local_err = [], 0
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= stop_at:
+                break
+            try:
+                ok = client.request()
+            except Exception:
+                ok = False
+            t1 = time.perf_counter()
+            if t0 >= start_at:  # descarta o aquecimento
+                local_lat.append(t1 - t0)
+                local_err += 0 if ok else 1
+        with lock:
+            latencies.extend(local_lat)
+            errors[0] += local_err
+
+    threads = [threading.Thread(target=worker, args=(c,), daemon=True) for c in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+
+def run_open_loop(clients, duration, warmup, rate):
+    """
+    Chegadas de Poisson a 'rate' pedidos/s distribuídas entre os clientes.
+    A latência conta a partir do instante programado: se o servidor atrasa,
+    a fila de espera entra na medição.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    idle = list(clients)
+    idle_lock = threading.Lock()
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+
+    def job(scheduled):
+        with idle_lock:
+            client = idle.pop()
+        try:
+            ok = client.request()
+        except Exception:
+            ok = False
+        finally:
+            with idle_lock:
+                idle.append(client)
+        elapsed = time.perf_counter() - scheduled
+        if scheduled >= start_at:
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += 0 if ok else 1
+
+    rng = random.Random(1)
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        next_at = time.perf_counter()
+        while next_at < stop_at:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(job, next_at)
+            next_at += rng.expovariate(rate)
+    return latencies, errors[0]
+
+
+def summarize(latencies, errors, duration, batch_size):
+    completed = len(latencies)
+    result = {
+        'requests': completed,
+        'errors': errors,
+        'requests_per_s': round(completed / duration, 2),
+        'predictions_per_s': round((completed - errors) * batch_size / duration, 2)
+    }
+    if completed:
+        lat_ms = np.asarray(latencies) * 1000
+        p50, p90, p99 = np.percentile(lat_ms, [50, 90, 99])
+        result['latency_ms'] = {
+            'mean': round(float(lat_ms.mean()), 3),
+            'p50': round(float(p50), 3),
+            'p90': round(float(p90), 3),
+            'p99': round(float(p99), 3),
+            'max': round(float(lat_ms.max()), 3)
+        }
+    return result
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark de carga do servidor RPC')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help='Servidor já em execução (senão sobe um local)')
+    parser.add_argument('--model', help='Modelo real no servidor local (padrão: stub em CPU)')
+    parser.add_argument('--stub-ms', type=float, default=2.0, help='Custo do stub por imagem (ms)')
+    parser.add_argument('--engine', choices=['threaded', 'asyncio'], help='Motor do servidor local')
+    parser.add_argument('--cache', action='store_true', help='Mantém o cache de predições do servidor local')
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed', help='Malha fechada ou aberta')
+    parser.add_argument('--rate', type=float, default=200.0, help='Pedidos/s na malha aberta')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200, 1000],
+                        help='Clientes simultâneos')
+    parser.add_argument('--image-sizes', type=int, nargs='+', default=[224], help='Lado das imagens (px)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1],
+                        help='1 = predict_image; >1 = predict_batch com N imagens')
+    parser.add_argument('--mutex', choices=['shared', 'per-request'], default='shared',
+                        help="shared: um lock para todos; per-request: acquire/release a cada pedido")
+    parser.add_argument('--priority', choices=['critical', 'normal', 'bulk'],
+                        help='Classe de prioridade nos mutex_acquire (modo per-request)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Segundos medidos por cenário')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Segundos de aquecimento por cenário')
+    parser.add_argument('--output', default='load_benchmark.json', help='Relatório JSON')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("BENCHMARK DE CARGA DO SERVIDOR RPC")
+    print("=" * 60)
+
+    server = None
+    port = args.port
+    if port is None:
+        port = free_port()
+        server = start_local_server(port, args)
+        print(f"Servidor local: 127.0.0.1:{port} ({'modelo ' + args.model if args.model else f'stub {args.stub_ms} ms/img'})")
+
+    control = RPCConnectionPool(args.host, port, max_size=1)
+    report = {'config': vars(args), 'runs': []}
+    try:
+        health = wait_ready(control, timeout=300 if args.model else 30)
+        report['server'] = {'model': health.get('model_name'), 'capabilities': health.get('capabilities')}
+
+        shared_id = f"bench-{uuid.uuid4().hex[:8]}"
+        heartbeat = None
+        if args.mutex == 'shared':
+            lock = control.call({'method': 'mutex_acquire',
+                                 'params': {'client_id': shared_id, 'wait': True, 'timeout': 30}})
+            if lock.get('status') != 'GRANTED':
+                raise RuntimeError(f"Lock compartilhado não concedido: {lock.get('error', lock.get('status'))}")
+            # Cenários mais longos que o lease perderiam o lock no meio da medição
+            if lock.get('lease_seconds'):
+                heartbeat = start_heartbeat(control, shared_id, lock['lease_seconds'])
+
+        for size in args.image_sizes:
+            images = make_image_pool(size, 64)
+            for batch_size in args.batch_sizes:
+                for concurrency in args.concurrency:
+                    clients = [
+                        LoadClient(args.host, port,
+                                   shared_id if args.mutex == 'shared' else f"{shared_id}-{i}",
+                                   args.mutex, images, batch_size, args.priority)
+                        for i in range(concurrency)
+                    ]
+                    try:
+                        if args.mode == 'open':
+                            latencies, errors = run_open_loop(clients, args.duration, args.warmup, args.rate)
+                        else:
+                            latencies, errors = run_closed_loop(clients, args.duration, args.warmup)
+                    finally:
+                        for client in clients:
+                            client.close()
+
+                    run = {'mode': args.mode, 'concurrency': concurrency,
+                           'image_size': size, 'batch_size': batch_size}
+                    run.update(summarize(latencies, errors, args.duration, batch_size))
+                    report['runs'].append(run)
+
+                    lat = run.get('latency_ms', {})
+                    print(f"\n[{size}px | lote {batch_size} | {concurrency} clientes]")
+                    print(f"  {run['requests_per_s']:>10,.1f} req/s | {run['predictions_per_s']:>10,.1f} pred/s "
+                          f"| erros: {errors}")
+                    if lat:
+                        print(f"  latência (ms): p50={lat['p50']:.1f} | p90={lat['p90']:.1f} "
+                              f"| p99={lat['p99']:.1f} | max={lat['max']:.1f}")
+                    sys.stdout.flush()
+
+        if heartbeat is not None:
+            heartbeat.set()
+        if args.mutex == 'shared':
+            control.call({'method': 'mutex_release', 'params': {'client_id': shared_id}})
+        metrics = control.call({'method': 'get_metrics', 'params': {}})
+        report['server']['metrics'] = metrics
+    finally:
+        control.close()
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Relatório salvo em: {args.output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,25 +17,61 @@ import matplotlib
 matplotlib.use('Agg')  # Backend nao-interativo
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+import numpy as np
 from datetime import datetime
 
+from lamport_clock import (
+    is_event_journal, read_event_journal, events_to_records, pid_hash,
+    MutexEventType, EVENT_RECORD_DTYPE
+)
+
+
+def _pair_sequential(starts, ends):
+    """
+    Casa cada fim com o ultimo inicio anterior a ele, usando cada inicio uma
+    vez (mesmo resultado da varredura ENTER->EXIT / REQUEST->GRANT em ordem).
+    starts/ends: instantes ordenados. Retorna (indices de inicio, indices de fim).
+    """
+    idx = np.searchsorted(starts, ends, side='right') - 1
+    valid = idx >= 0
+    valid[1:] &= idx[1:] != idx[:-1]
+    return idx[valid], np.nonzero(valid)[0]
+
 
 class MutexLogVisualizer:
     """
-    Visualiza logs de exclusao mutua usando relogios logicos
+    Visualiza logs de exclusao mutua usando relogios logicos.
+    Os eventos ficam em colunas NumPy (ordenadas por wall clock), sem um dict
+    por evento: so as linhas anotadas nos graficos viram objetos Python.
     """
     
     def __init__(self, log_files):
         self.log_files = log_files if isinstance(log_files, list) else [log_files]
-        self.all_events = []
+        self.process_names = {}  # crc32 do process_id -> nome
         self.processes = []
         self.load_logs()
     
+    @property
+    def event_count(self):
+        return len(self.wall_clock)
+    
     def load_logs(self):
         """Carrega todos os arquivos de log com tratamento robusto de encoding"""
+        chunks = []
         for log_file in self.log_files:
             success = False
             
+            # Journal binario (.evj): registros lidos direto do memmap
+            if is_event_journal(log_file):
+                try:
+                    pid, records = read_event_journal(log_file)
+                    self.process_names.setdefault(pid_hash(pid), pid)
+                    chunks.append(records)
+                    print(f"[OK] Carregado (journal): {log_file} ({len(records)} eventos)")
+                except Exception as e:
+                    print(f"[ERRO] Journal invalido {log_file}: {e}")
+                continue
+            
             # Tenta multiplos encodings
             encodings_to_try = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
             
@@ -46,12 +82,12 @@ class MutexLogVisualizer:
                         
                         events = data.get('events', [])
                         if events:
-                            self.all_events.extend(events)
-                            
-                            # Extrai process_id
+                            # Extrai process_id (o dos eventos prevalece, como no grafico)
                             pid = data.get('process_id', events[0].get('process_id', 'unknown'))
-                            if pid not in self.processes:
-                                self.processes.append(pid)
+                            for name in {e.get('process_id', pid) for e in events}:
+                                self.process_names.setdefault(pid_hash(name), name)
+                            chunks.append(events_to_records(
+                                [dict(e, process_id=e.get('process_id', pid)) for e in events]))
                             
                             print(f"[OK] Carregado ({encoding}): {log_file} ({len(events)} eventos)")
                             success = True
@@ -65,22 +101,59 @@ class MutexLogVisualizer:
             
             if not success:
                 print(f"[ERRO] Nao foi possivel carregar {log_file} com nenhum encoding")
+        
+        if len(chunks) == 1:
+            records = chunks[0]
+        elif chunks:
+            records = np.concatenate(chunks)
+        else:
+            records = np.zeros(0, dtype=EVENT_RECORD_DTYPE)
+        
+        # Colunas ordenadas por wall clock; processo = indice em self.processes
+        order = np.argsort(records['wall_clock'], kind='stable')
+        self.wall_clock = records['wall_clock'][order]
+        self.lamport_ts = records['lamport_ts'][order].astype(np.int64)
+        self.event_type = records['event_type'][order]
+        pids, self.process_index = np.unique(records['pid'][order], return_inverse=True)
+        self.processes = [self.process_names.get(int(p), str(int(p))) for p in pids]
+    
+    def _process_rank(self):
+        """Linha do eixo Y de cada processo (ordem alfabetica)"""
+        return np.argsort(np.argsort(self.processes, kind='stable'))
+    
+    def _time_offsets(self):
+        """Segundos desde o primeiro evento"""
+        return self.wall_clock - self.wall_clock.min()
+    
+    def _cs_periods(self, offsets):
+        """Periodos de CS por processo: (indices de processo, inicios, fins)"""
+        enter_mask = self.event_type == MutexEventType.ENTER_CS
+        exit_mask = self.event_type == MutexEventType.EXIT_CS
+        procs, starts, ends = [], [], []
+        for p in range(len(self.processes)):
+            mine = self.process_index == p
+            enters = offsets[mine & enter_mask]
+            exits = offsets[mine & exit_mask]
+            s_idx, e_idx = _pair_sequential(enters, exits)
+            procs.append(np.full(len(s_idx), p))
+            starts.append(enters[s_idx])
+            ends.append(exits[e_idx])
+        if not procs:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+        return np.concatenate(procs), np.concatenate(starts), np.concatenate(ends)
     
     def generate_space_time_diagram(self, output_file='mutex_spacetime.png'):
         """
         Gera diagrama espaco-tempo usando wall clock time
         """
-        if not self.all_events:
+        if not self.event_count:
             print("[AVISO] Nenhum evento para visualizar")
             return False
         
         try:
-            # Use wall_clock for X axis (real time)
-            min_time = min(e['wall_clock'] for e in self.all_events)
-            
-            # Normalize to start at 0 (seconds from first event)
-            for event in self.all_events:
-                event['time_offset'] = event['wall_clock'] - min_time
+            # Use wall_clock for X axis (real time), normalized to start at 0
+            offsets = self._time_offsets()
+            rows = self._process_rank()[self.process_index]
             
             fig, ax = plt.subplots(figsize=(16, 8))
             
@@ -90,82 +163,59 @@ class MutexLogVisualizer:
                 'GRANT': '#66BB6A',      # Verde
                 'ENTER_CS': '#42A5F5',   # Azul
                 'EXIT_CS': '#AB47BC',    # Roxo
-                'RELEASE': '#EF5350'     # Vermelho
+                'RELEASE': '#EF5350',    # Vermelho
+                'LEASE_EXPIRED': '#212121'  # Preto (revogado pelo servidor)
+            }
+            # Marcador e tamanho por tipo (padrao: circulo 100)
+            markers = {
+                'ENTER_CS': ('s', 150),
+                'EXIT_CS': ('s', 150),
+                'REQUEST': ('o', 120),
+                'GRANT': ('^', 120)
             }
             
-            # Mapeia processos para linhas do eixo Y
-            process_map = {pid: idx for idx, pid in enumerate(sorted(self.processes))}
-            
-            # Plota eventos
-            for event in self.all_events:
-                pid = event['process_id']
-                y = process_map[pid]
-                x = event['time_offset']
-                etype = event['event_type']
-                
-                color = colors.get(etype, '#757575')
-                
-                if etype in ['ENTER_CS', 'EXIT_CS']:
-                    marker = 's'
-                    size = 150
-                elif etype == 'REQUEST':
-                    marker = 'o'
-                    size = 120
-                elif etype == 'GRANT':
-                    marker = '^'
-                    size = 120
-                else:
-                    marker = 'o'
-                    size = 100
-                
-                ax.scatter(x, y, c=color, marker=marker, s=size, 
-                        edgecolors='black', linewidths=1.5, zorder=3, alpha=0.8)
+            # Plota eventos: um scatter por tipo sobre as colunas
+            for etype in MutexEventType:
+                mask = self.event_type == etype
+                if not mask.any():
+                    continue
+                marker, size = markers.get(etype.name, ('o', 100))
+                ax.scatter(offsets[mask], rows[mask], c=colors.get(etype.name, '#757575'),
+                        marker=marker, s=size, edgecolors='black', linewidths=1.5,
+                        zorder=3, alpha=0.8)
                 
-                # Anotacao para eventos criticos
-                if etype in ['ENTER_CS', 'EXIT_CS']:
-                    label = 'ENTER' if etype == 'ENTER_CS' else 'EXIT'
-                    ax.annotate(label, 
-                            xy=(x, y), xytext=(0, 10), 
-                            textcoords='offset points',
-                            fontsize=8, fontweight='bold',
-                            ha='center')
+                # Anotacao para eventos criticos (so estas linhas viram objetos Python)
+                if etype in (MutexEventType.ENTER_CS, MutexEventType.EXIT_CS):
+                    label = 'ENTER' if etype == MutexEventType.ENTER_CS else 'EXIT'
+                    for x, y in zip(offsets[mask].tolist(), rows[mask].tolist()):
+                        ax.annotate(label, 
+                                xy=(x, y), xytext=(0, 10), 
+                                textcoords='offset points',
+                                fontsize=8, fontweight='bold',
+                                ha='center')
             
             # Conecta eventos do mesmo processo com linhas
-            for pid in self.processes:
-                process_events = [e for e in self.all_events if e['process_id'] == pid]
-                process_events.sort(key=lambda e: e['time_offset'])
-                
-                y = process_map[pid]
-                times = [e['time_offset'] for e in process_events]
-                
-                ax.plot(times, [y]*len(times), 
+            for p in range(len(self.processes)):
+                mine = self.process_index == p
+                times = offsets[mine]
+                ax.plot(times, rows[mine], 
                     color='gray', linestyle='-', linewidth=1.5, alpha=0.4, zorder=1)
             
             # Destacar periodos de CS com retangulos
-            for pid in self.processes:
-                process_events = [e for e in self.all_events if e['process_id'] == pid]
-                process_events.sort(key=lambda e: e['time_offset'])
+            procs, starts, ends = self._cs_periods(offsets)
+            period_rows = self._process_rank()[procs]
+            for y, enter_time, exit_time in zip(period_rows.tolist(), starts.tolist(), ends.tolist()):
+                width = exit_time - enter_time
                 
-                y = process_map[pid]
-                enter_time = None
+                rect = plt.Rectangle((enter_time, y - 0.3), width, 0.6,
+                                    facecolor='yellow', alpha=0.3, 
+                                    edgecolor='orange', linewidth=2, zorder=0)
+                ax.add_patch(rect)
                 
-                for event in process_events:
-                    if event['event_type'] == 'ENTER_CS':
-                        enter_time = event['time_offset']
-                    elif event['event_type'] == 'EXIT_CS' and enter_time:
-                        exit_time = event['time_offset']
-                        width = exit_time - enter_time
-                        
-                        rect = plt.Rectangle((enter_time, y - 0.3), width, 0.6,
-                                            facecolor='yellow', alpha=0.3, 
-                                            edgecolor='orange', linewidth=2, zorder=0)
-                        ax.add_patch(rect)
-                        
-                        # Anotacao da duracao
-                        mid = enter_time + width / 2
-                        ax.text(mid, y, f'{width:.2f}s', ha='center', va='center',
-                            fontsize=8, fontweight='bold', color='darkred')
-                        enter_time = None
+                # Anotacao da duracao
+                mid = enter_time + width / 2
+                ax.text(mid, y, f'{width:.2f}s', ha='center', va='center',
+                    fontsize=8, fontweight='bold', color='darkred')
             
             # Configuracao dos eixos
             ax.set_xlabel('Time (seconds from start)', fontsize=13, fontweight='bold')
@@ -182,6 +232,7 @@ class MutexLogVisualizer:
                 mpatches.Patch(color=colors['ENTER_CS'], label='ENTER CS'),
                 mpatches.Patch(color=colors['EXIT_CS'], label='EXIT CS'),
                 mpatches.Patch(color=colors['RELEASE'], label='RELEASE'),
+                mpatches.Patch(color=colors['LEASE_EXPIRED'], label='LEASE EXPIRED'),
                 mpatches.Patch(facecolor='yellow', alpha=0.3, edgecolor='orange', 
                             linewidth=2, label='Critical Section')
             ]
@@ -207,32 +258,14 @@ class MutexLogVisualizer:
         Gera linha do tempo das secoes criticas usando wall clock
         """
         try:
-            # Use wall_clock for time axis
-            min_time = min(e['wall_clock'] for e in self.all_events)
-            
-            # Normalize to start at 0
-            for event in self.all_events:
-                if 'time_offset' not in event:
-                    event['time_offset'] = event['wall_clock'] - min_time
-            
-            # Extrai periodos de CS
-            cs_periods = []
+            if not self.event_count:
+                print("[AVISO] Nenhum evento para visualizar")
+                return False
             
-            for pid in self.processes:
-                process_events = [e for e in self.all_events if e['process_id'] == pid]
-                process_events.sort(key=lambda e: e['time_offset'])
-                
-                enter_time = None
-                for event in process_events:
-                    if event['event_type'] == 'ENTER_CS':
-                        enter_time = event['time_offset']
-                    elif event['event_type'] == 'EXIT_CS' and enter_time is not None:
-                        cs_periods.append({
-                            'process': pid,
-                            'start': enter_time,
-                            'end': event['time_offset']
-                        })
-                        enter_time = None
+            # Extrai periodos de CS (wall clock normalizado para comecar em 0)
+            procs, starts, ends = self._cs_periods(self._time_offsets())
+            cs_periods = [{'process': self.processes[p], 'start': start, 'end': end}
+                          for p, start, end in zip(procs.tolist(), starts.tolist(), ends.tolist())]
             
             if not cs_periods:
                 print("[AVISO] Nenhum periodo de CS encontrado")
@@ -260,11 +293,16 @@ class MutexLogVisualizer:
                     bbox=dict(boxstyle='round,pad=0.3', facecolor='black', alpha=0.5))
             
             # Verificacao de sobreposicao (violacoes)
+            # (varredura por inicio: so compara periodos que comecam antes do fim do atual)
             violations = []
+            cs_periods.sort(key=lambda period: period['start'])
             for i, p1 in enumerate(cs_periods):
-                for p2 in cs_periods[i+1:]:
+                j = i + 1
+                while j < len(cs_periods) and cs_periods[j]['start'] < p1['end']:
+                    p2 = cs_periods[j]
+                    j += 1
                     # Checa se ha sobreposicao
-                    if not (p1['end'] <= p2['start'] or p2['end'] <= p1['start']):
+                    if p2['end'] > p1['start']:
                         if p1['process'] != p2['process']:
                             violations.append((p1, p2))
                             
@@ -315,17 +353,15 @@ class MutexLogVisualizer:
             report.append("RELATORIO DE ANALISE DE EXCLUSAO MUTUA")
             report.append("="*60)
             report.append(f"Data/Hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            report.append(f"Total de Eventos: {len(self.all_events)}")
+            report.append(f"Total de Eventos: {self.event_count}")
             report.append(f"Processos: {len(self.processes)}")
             report.append(f"Processos IDs: {', '.join(sorted(self.processes))}")
             report.append("")
             
-            # Estatisticas por tipo de evento
+            # Estatisticas por tipo de evento (contagem direto na coluna)
             report.append("--- Eventos por Tipo ---")
-            event_types = {}
-            for event in self.all_events:
-                etype = event['event_type']
-                event_types[etype] = event_types.get(etype, 0) + 1
+            counts = np.bincount(self.event_type, minlength=max(MutexEventType) + 1)
+            event_types = {etype.name: int(counts[etype]) for etype in MutexEventType if counts[etype]}
             
             for etype, count in sorted(event_types.items()):
                 report.append(f"  {etype}: {count}")
@@ -333,34 +369,34 @@ class MutexLogVisualizer:
             
             # Estatisticas por processo
             report.append("--- Estatisticas por Processo ---")
-            for pid in sorted(self.processes):
-                process_events = [e for e in self.all_events if e['process_id'] == pid]
+            for p in np.argsort(self.processes, kind='stable').tolist():
+                mine = self.process_index == p
+                process_types = self.event_type[mine]
                 
-                enters = sum(1 for e in process_events if e['event_type'] == 'ENTER_CS')
-                exits = sum(1 for e in process_events if e['event_type'] == 'EXIT_CS')
-                requests = sum(1 for e in process_events if e['event_type'] == 'REQUEST')
-                grants = sum(1 for e in process_events if e['event_type'] == 'GRANT')
+                enters = int(np.count_nonzero(process_types == MutexEventType.ENTER_CS))
+                exits = int(np.count_nonzero(process_types == MutexEventType.EXIT_CS))
+                requests = int(np.count_nonzero(process_types == MutexEventType.REQUEST))
+                grants = int(np.count_nonzero(process_types == MutexEventType.GRANT))
                 
-                report.append(f"\n{pid}:")
-                report.append(f"  Total de eventos: {len(process_events)}")
+                report.append(f"\n{self.processes[p]}:")
+                report.append(f"  Total de eventos: {len(process_types)}")
                 report.append(f"  Requests: {requests}")
                 report.append(f"  Grants: {grants}")
                 report.append(f"  CS Entries: {enters}")
                 report.append(f"  CS Exits: {exits}")
                 
-                # Calcula tempos de espera
-                wait_times = []
-                req_ts = None
-                for e in sorted(process_events, key=lambda x: x['lamport_ts']):
-                    if e['event_type'] == 'REQUEST':
-                        req_ts = e['lamport_ts']
-                    elif e['event_type'] == 'GRANT' and req_ts is not None:
-                        wait_times.append(e['lamport_ts'] - req_ts)
-                        req_ts = None
+                # Calcula tempos de espera (REQUEST -> GRANT em ordem de Lamport)
+                order = np.argsort(self.lamport_ts[mine], kind='stable')
+                lamport = self.lamport_ts[mine][order]
+                process_types = process_types[order]
+                req_ts = lamport[process_types == MutexEventType.REQUEST]
+                grant_ts = lamport[process_types == MutexEventType.GRANT]
+                req_idx, grant_idx = _pair_sequential(req_ts, grant_ts)
+                wait_times = grant_ts[grant_idx] - req_ts[req_idx]
                 
-                if wait_times:
-                    avg_wait = sum(wait_times) / len(wait_times)
-                    max_wait = max(wait_times)
+                if len(wait_times):
+                    avg_wait = float(wait_times.mean())
+                    max_wait = int(wait_times.max())
                     report.append(f"  Tempo medio de espera (logico): {avg_wait:.2f} ticks")
                     report.append(f"  Tempo maximo de espera (logico): {max_wait} ticks")
             
@@ -416,7 +452,7 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Visualizador de Logs de Exclusao Mutua')
-    parser.add_argument('log_files', nargs='+', help='Arquivos de log JSON')
+    parser.add_argument('log_files', nargs='+', help='Arquivos de log (journal .evj ou JSON)')
     parser.add_argument('--output-prefix', default='mutex_analysis', 
                        help='Prefixo para arquivos de saida')
     
@@ -430,7 +466,7 @@ def main():
     
     visualizer = MutexLogVisualizer(args.log_files)
     
-    if not visualizer.all_events:
+    if not visualizer.event_count:
         print("[ERRO] Nenhum evento carregado. Verifique os arquivos de log.")
         sys.exit(1)
     
@@ -0,0 +1,159 @@
+"""
+Benchmark do MutexManager com milhares de clientes na fila
+Mede a vazão de polls (clientes enfileirados) e de ciclos acquire/release,
+comparando com a implementação antiga baseada em deque + list.index
+"""
+
+import sys
+import time
+import json
+import threading
+from collections import deque
+
+from utils import MutexManager
+
+
+class LegacyMutexManager:
+    """Implementação anterior (deque, pertinência e posição em O(n), sem lock)"""
+
+    def __init__(self, timeout_seconds=30):
+        self.locked = False
+        self.owner_id = None
+        self.queue = deque()
+        self.last_activity = 0
+        self.TIMEOUT_SECONDS = timeout_seconds
+
+    def request_access(self, client_id):
+        current_time = time.time()
+        if not self.locked:
+            if not self.queue or self.queue[0] == client_id:
+                if self.queue and self.queue[0] == client_id:
+                    self.queue.popleft()
+                self.locked = True
+                self.owner_id = client_id
+                self.last_activity = current_time
+                return True, "GRANTED", 0
+            if client_id not in self.queue:
+                self.queue.append(client_id)
+            return False, "QUEUED", list(self.queue).index(client_id) + 1
+        if self.owner_id == client_id:
+            self.last_activity = current_time
+            return True, "GRANTED", 0
+        if client_id not in self.queue:
+            self.queue.append(client_id)
+        return False, "QUEUED", list(self.queue).index(client_id) + 1
+
+    def release(self, client_id):
+        if self.owner_id == client_id:
+            self.locked = False
+            self.owner_id = None
+            return True
+        return False
+
+
+def build_manager(kind):
+    if kind == 'legacy':
+        return LegacyMutexManager()
+    return MutexManager(verbose=False)
+
+
+def bench_polls(kind, queued, polls):
+    """Clientes enfileirados consultando a posição (padrão de polling)"""
+    mutex = build_manager(kind)
+    mutex.request_access("owner")
+    clients = [f"client_{i}" for i in range(queued)]
+    for cid in clients:
+        mutex.request_access(cid)
+
+    start = time.perf_counter()
+    for i in range(polls):
+        mutex.request_access(clients[(i * 7919) % queued])
+    elapsed = time.perf_counter() - start
+    return polls / elapsed
+
+
+def bench_handoff(kind, queued, cycles):
+    """Ciclos release -> acquire pela cabeça da fila, com a fila sempre cheia"""
+    mutex = build_manager(kind)
+    clients = [f"client_{i}" for i in range(queued)]
+    for cid in clients:
+        mutex.request_access(cid)
+
+    start = time.perf_counter()
+    for i in range(cycles):
+        owner = clients[i % queued]
+        mutex.release(owner)
+        nxt = clients[(i + 1) % queued]
+        mutex.request_access(nxt)   # cabeça da fila assume o lock
+        mutex.request_access(owner)  # dono anterior volta para o fim da fila
+    elapsed = time.perf_counter() - start
+    return cycles / elapsed
+
+
+def bench_threads(queued, threads, ops_per_thread):
+    """Vazão com várias threads concorrentes (apenas o MutexManager thread-safe)"""
+    mutex = MutexManager(verbose=False)
+    mutex.request_access("owner")
+    for i in range(queued):
+        mutex.request_access(f"client_{i}")
+
+    def worker(tid):
+        for i in range(ops_per_thread):
+            mutex.request_access(f"client_{(tid * ops_per_thread + i) % queued}")
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return (threads * ops_per_thread) / elapsed
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark do MutexManager')
+    parser.add_argument('--queued', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='Tamanhos de fila a testar')
+    parser.add_argument('--ops', type=int, default=20000, help='Operações por medição')
+    parser.add_argument('--threads', type=int, default=8, help='Threads no teste concorrente')
+    parser.add_argument('--skip-legacy', action='store_true', help='Não mede a implementação antiga')
+    parser.add_argument('--output', help='Salva resultados em JSON')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("BENCHMARK DO MUTEXMANAGER")
+    print("=" * 60)
+
+    results = []
+    kinds = ['current'] if args.skip_legacy else ['current', 'legacy']
+
+    for queued in args.queued:
+        row = {'queued': queued}
+        for kind in kinds:
+            # A versão antiga é O(n) por operação: limita para não demorar demais
+            ops = args.ops if kind == 'current' else max(100, min(args.ops, 2_000_000 // queued))
+            row[f'{kind}_polls_per_s'] = bench_polls(kind, queued, ops)
+            row[f'{kind}_handoffs_per_s'] = bench_handoff(kind, queued, ops)
+        row['threaded_polls_per_s'] = bench_threads(queued, args.threads, args.ops // args.threads)
+        results.append(row)
+
+        print(f"\nFila com {queued} clientes:")
+        for kind in kinds:
+            print(f"  [{kind:>7}] polls: {row[f'{kind}_polls_per_s']:>12,.0f}/s | "
+                  f"acquire/release: {row[f'{kind}_handoffs_per_s']:>12,.0f}/s")
+        print(f"  [threads] polls ({args.threads} threads): {row['threaded_polls_per_s']:>12,.0f}/s")
+        sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Resultados salvos em: {args.output}")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
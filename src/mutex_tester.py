@@ -17,14 +17,13 @@ if sys.platform == 'win32':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
 try:
-    from lamport_clock import MutexEventLogger, compare_event_logs
-    from rpc_protocol import send_rpc_message, receive_rpc_message
+    from lamport_clock import MutexEventLogger, VectorClock, compare_event_logs, concurrent_critical_sections
+    from rpc_protocol import RPCConnectionPool
+    from ricart_agrawala import start_local_peers
 except ImportError:
-    print("Erro: Certifique-se de que lamport_clock.py e rpc_protocol.py estão no mesmo diretório")
+    print("Erro: Certifique-se de que lamport_clock.py, rpc_protocol.py e ricart_agrawala.py estão no mesmo diretório")
     sys.exit(1)
 
-import socket
-
 
 class MutexTestClient:
     """
@@ -32,43 +31,38 @@ class MutexTestClient:
     Inclui logging com relógio de Lamport
     """
     
-    def __init__(self, client_id, host="127.0.0.1", port=5000, logger=None):
+    def __init__(self, client_id, host="127.0.0.1", port=5000, logger=None, pool=None):
         self.client_id = client_id
         self.host = host
         self.port = port
         self.logger = logger or MutexEventLogger(client_id)
         self.results = []
+        # Conexões persistentes (mesmo pool usado pelo FireDetectionClient)
+        self._owns_pool = pool is None
+        self.pool = pool or RPCConnectionPool(host, port, max_size=2)
+        # Mensagens de controle do mutex (cada RPC = pedido + resposta)
+        self.messages = 0
     
-    def _send_request(self, method, params=None):
+    def _send_request(self, method, params=None, timeout=None):
         """Envia requisição RPC com logging"""
         if params is None:
             params = {}
         
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(10)
+        message = {
+            "method": method,
+            "params": params
+        }
         
+        if method.startswith('mutex_'):
+            self.messages += 2
         try:
-            sock.connect((self.host, self.port))
-            
-            message = {
-                "method": method,
-                "params": params
-            }
-            
-            send_rpc_message(sock, message)
-            response = receive_rpc_message(sock)
-            
+            response = self.pool.call(message, timeout=timeout)
             return True, response
         except Exception as e:
             return False, f"Erro RPC: {str(e)}"
-        finally:
-            try:
-                sock.close()
-            except:
-                pass
     
     def acquire_lock_with_logging(self, timeout=30):
-        """Adquire lock com logging de eventos e timeout"""
+        """Adquire lock com logging de eventos e timeout (long-poll no servidor)"""
         # Log da solicitação
         self.logger.log_request({'client_id': self.client_id})
         
@@ -76,7 +70,9 @@ class MutexTestClient:
         
         while (time.time() - start_time) < timeout:
             try:
-                success, response = self._send_request("mutex_acquire", {"client_id": self.client_id})
+                remaining = max(0.1, timeout - (time.time() - start_time))
+                params = {"client_id": self.client_id, "wait": True, "timeout": remaining}
+                success, response = self._send_request("mutex_acquire", params, timeout=remaining + 5)
                 
                 if success and response:
                     if response.get('success') and response.get('status') == 'GRANTED':
@@ -92,9 +88,11 @@ class MutexTestClient:
                         self.logger.log_grant(data={'queue_wait': False})
                         return True
                     
-                    pos = response.get('queue_position', 1)
-                    wait_time = min(1.0 + (pos * 0.5), 3.0)
-                    time.sleep(wait_time)
+                    # Servidor sem long-poll: mantém o polling antigo
+                    if not response.get('long_poll'):
+                        pos = response.get('queue_position', 1)
+                        wait_time = min(1.0 + (pos * 0.5), 3.0)
+                        time.sleep(wait_time)
                 else:
                     time.sleep(2)
             except KeyboardInterrupt:
@@ -189,7 +187,39 @@ class MutexTestClient:
                 })
         
         print(f"[Client {self.client_id}] Concluído!")
+        self.close()
         return self.results
+    
+    def message_count(self):
+        """Mensagens trocadas para coordenar o acesso (comparação entre modos)"""
+        return self.messages
+    
+    def close(self):
+        """Fecha as conexões do pool (apenas se o pool pertencer a este cliente)"""
+        if self._owns_pool:
+            self.pool.close()
+
+
+class DistributedMutexTestClient(MutexTestClient):
+    """
+    Cliente de teste sem coordenador: o acesso é negociado entre os pares
+    (Ricart-Agrawala) e o servidor fica fora do caminho de controle
+    """
+    
+    def __init__(self, client_id, peer, host="127.0.0.1", port=5000):
+        super().__init__(client_id, host, port, logger=peer.logger)
+        self.peer = peer
+    
+    def acquire_lock_with_logging(self, timeout=30):
+        """REQUEST a todos os pares; retorna quando todos responderem"""
+        return self.peer.acquire(timeout)
+    
+    def release_lock_with_logging(self):
+        """Sai da CS e libera as respostas adiadas"""
+        self.peer.release()
+    
+    def message_count(self):
+        return self.peer.message_count()
 
 
 class MutexTestSuite:
@@ -197,30 +227,80 @@ class MutexTestSuite:
     Suite de testes para exclusão mútua distribuída
     """
     
-    def __init__(self, host="127.0.0.1", port=5000, num_clients=3, num_accesses=5):
+    def __init__(self, host="127.0.0.1", port=5000, num_clients=3, num_accesses=5, export_json=False,
+                 slots=None, server_journal=None, mode='centralized', peer_base_port=6100):
         self.host = host
+        # 'centralized' (MutexManager no servidor) ou 'distributed' (Ricart-Agrawala entre pares)
+        self.mode = mode
+        self.peer_base_port = peer_base_port
+        self.peers = []
+        self.last_report = None
+        # Journal do coordenador (leases expirados) entra na análise global, se existir
+        self.server_journal = server_journal
+        # Máximo de clientes simultâneos na CS (None = pergunta ao servidor)
+        self.slots = slots
+        # Eventos vão para journals binários em tests/; JSON só se pedido
+        self.export_json = export_json
         self.port = port
         self.num_clients = num_clients  # Store parameters
         self.num_accesses = num_accesses  # Store parameters
         self.clients = []
         self.threads = []
     
+    def resolve_slots(self):
+        """Número de slots do servidor (health_check), se não foi informado"""
+        if self.slots is None and self.mode == 'distributed':
+            self.slots = 1  # Ricart-Agrawala: exclusão mútua clássica
+        if self.slots is None:
+            client = MutexTestClient("slots_probe", self.host, self.port)
+            success, response = client._send_request("health_check", timeout=5)
+            client.close()
+            self.slots = response.get('mutex_slots', 1) if success and isinstance(response, dict) else 1
+        return self.slots
+    
+    def resolve_server_journal(self):
+        """Journal desta execução do servidor (health_check), se estiver nesta máquina"""
+        client = MutexTestClient("journal_probe", self.host, self.port)
+        success, response = client._send_request("health_check", timeout=5)
+        client.close()
+        if success and isinstance(response, dict):
+            return response.get('mutex_journal')
+        return None
+    
+    def _create_clients(self, loggers):
+        """Clientes do modo atual (no modo distribuído, um par RA por cliente)"""
+        if self.mode != 'distributed':
+            return [MutexTestClient(client_id, self.host, self.port, logger=logger)
+                    for client_id, logger in loggers.items()]
+        self.peers = start_local_peers(list(loggers), base_port=self.peer_base_port, loggers=loggers)
+        return [DistributedMutexTestClient(peer.process_id, peer, self.host, self.port)
+                for peer in self.peers]
+    
+    def _stop_peers(self):
+        for peer in self.peers:
+            peer.stop()
+        self.peers = []
+    
     def test_single_client(self, num_accesses=5):
         """Teste com um único cliente"""
         print("\n" + "="*60)
         print("TESTE 1: Cliente Único")
         print("="*60)
         
-        client = MutexTestClient("test_single", self.host, self.port)
+        logger = MutexEventLogger("test_single", journal_path="tests/test_single_client.evj")
         
         try:
+            client = self._create_clients({"test_single": logger})[0]
             results = client.run_test_cycle(num_accesses)
+            self._stop_peers()
             
-            # Exporta log
-            print("\n--- Exportando logs ---")
-            os.makedirs('tests', exist_ok=True)
-            log_file = client.logger.export_events("tests/test_single_client.json")
-            print(f"✓ Log exportado: {log_file}")
+            # Journal já está em disco; JSON apenas sob demanda
+            print("\n--- Logs ---")
+            logger.close()
+            print(f"✓ Journal: {logger.journal.path}")
+            if self.export_json:
+                log_file = logger.export_events("tests/test_single_client.json")
+                print(f"✓ Log exportado: {log_file}")
             
             # Verifica
             print("\n--- Verificação ---")
@@ -236,10 +316,14 @@ class MutexTestSuite:
                 print(f"Requests: {stats.get('requests', 0)}")
                 print(f"Enters: {stats.get('enters', 0)}")
                 print(f"Exits: {stats.get('exits', 0)}")
+                wait = stats.get('wait_time_wall_ms', {})
+                if wait.get('count'):
+                    print(f"Espera (ms): p50={wait['p50']:.2f} | p95={wait['p95']:.2f} | p99={wait['p99']:.2f}")
             
             return verification['safe']
             
         except Exception as e:
+            self._stop_peers()
             print(f"\n✗ Erro durante teste: {e}")
             import traceback
             traceback.print_exc()
@@ -248,16 +332,26 @@ class MutexTestSuite:
     def test_concurrent_clients(self, num_clients=3, num_accesses=5):
         """Teste com múltiplos clientes concorrentes"""
         print("\n" + "="*60)
-        print(f"TESTE 2: {num_clients} Clientes Concorrentes")
+        print(f"TESTE 2: {num_clients} Clientes Concorrentes (modo {self.mode})")
         print("="*60)
         
         self.clients = []
         self.threads = []
         
-        # Cria clientes
+        # Cria clientes (cada um com seu journal de eventos em tests/)
+        os.makedirs('tests', exist_ok=True)
+        loggers = {}
         for i in range(num_clients):
-            client = MutexTestClient(f"client_{i}", self.host, self.port)
-            self.clients.append(client)
+            client_id = f"client_{i}"
+            # Modo distribuído: relógio vetorial nos eventos e nas mensagens entre pares
+            vector_clock = VectorClock(client_id) if self.mode == 'distributed' else None
+            loggers[client_id] = MutexEventLogger(client_id, journal_path=f"tests/test_concurrent_{client_id}.evj",
+                                                  vector_clock=vector_clock)
+        try:
+            self.clients = self._create_clients(loggers)
+        except (RuntimeError, OSError) as e:
+            print(f"✗ Erro ao iniciar os pares: {e}")
+            return False
         
         # Inicia threads
         start_time = time.time()
@@ -297,17 +391,20 @@ class MutexTestSuite:
             print(f"⚠ Timeout! {alive_count} thread(s) ainda ativa(s)")
         
         end_time = time.time()
+        self._stop_peers()
         
-        # Exporta logs
+        # Fecha os journals (já gravados incrementalmente durante o teste)
         log_files = []
-        os.makedirs('tests', exist_ok=True)
         for client in self.clients:
             try:
-                log_file = client.logger.export_events(f"tests/test_concurrent_{client.client_id}.json")
-                log_files.append(log_file)
-                print(f"✓ Log exportado: {log_file}")
+                client.logger.close()
+                log_files.append(client.logger.journal.path)
+                if self.export_json:
+                    log_file = client.logger.export_events(f"tests/test_concurrent_{client.client_id}.json")
+                    print(f"✓ Log exportado: {log_file}")
             except Exception as e:
-                print(f"✗ Erro ao exportar log de {client.client_id}: {e}")
+                print(f"✗ Erro ao fechar log de {client.client_id}: {e}")
+        print(f"✓ {len(log_files)} journal(s) em tests/")
         
         if not log_files:
             print("✗ Nenhum log exportado - teste falhou")
@@ -316,18 +413,79 @@ class MutexTestSuite:
         # Análise global
         print("\n--- Análise Global ---")
         try:
-            global_analysis = compare_event_logs(log_files)
+            # Merge em streaming; ordem global em disco só quando exportando JSON
+            ordered_file = 'tests/test_concurrent_ordered.jsonl' if self.export_json else None
+            slots = self.resolve_slots()
+            if self.server_journal == 'auto':
+                self.server_journal = self.resolve_server_journal()
+            if self.server_journal and os.path.exists(self.server_journal):
+                log_files = log_files + [self.server_journal]
+            global_analysis = compare_event_logs(log_files, output_file=ordered_file, slots=slots)
+            # Todos os clientes rodam neste processo: o relógio físico é comum
+            # e mostra sobreposições reais de CS que a ordem de Lamport não vê
+            physical_analysis = compare_event_logs(log_files, slots=slots, order_by='wall_clock')
+            global_analysis['physical'] = physical_analysis
+            safe = global_analysis['safe'] and physical_analysis['safe']
+            
+            # Ricart-Agrawala: toda dupla de CS deve estar ordenada causalmente
+            # (só há caminho causal entre os pares; o servidor não tem relógio vetorial)
+            causal_violations = None
+            if self.mode == 'distributed':
+                causal_violations = concurrent_critical_sections(
+                    {c.client_id: c.logger.critical_section_vectors() for c in self.clients})
+                global_analysis['causal'] = {
+                    'safe': not causal_violations,
+                    'concurrent_critical_sections': len(causal_violations),
+                    'violations': causal_violations[:100]
+                }
+                safe = safe and not causal_violations
+            
+            # Custo de coordenação: mensagens por CS e atraso de sincronização
+            cs_count = sum(1 for c in self.clients for r in c.results if r['success'])
+            messages = sum(c.message_count() for c in self.clients)
+            sync_delay = physical_analysis.get('sync_delay_ms', {})
+            global_analysis['mode'] = self.mode
+            global_analysis['messages'] = {
+                'total': messages,
+                'critical_sections': cs_count,
+                'per_cs': round(messages / cs_count, 2) if cs_count else None
+            }
+            self.last_report = {
+                'mode': self.mode,
+                'clients': len(self.clients),
+                'critical_sections': cs_count,
+                'messages_total': messages,
+                'messages_per_cs': global_analysis['messages']['per_cs'],
+                'sync_delay_ms': sync_delay,
+                'elapsed_seconds': round(end_time - start_time, 3),
+                'safe': safe
+            }
             
             print(f"Total de eventos: {global_analysis['total_events']}")
             print(f"Processos: {global_analysis['processes']}")
+            print(f"Invariante: no máximo {slots} cliente(s) na CS")
+            if global_analysis['lease_expirations']:
+                print(f"Leases expirados pelo servidor: {global_analysis['lease_expirations']}")
             print(f"Tempo total: {end_time - start_time:.2f}s")
-            print(f"Verificação: {'✓ SEGURO' if global_analysis['safe'] else '✗ VIOLAÇÕES DETECTADAS'}")
+            print(f"Mensagens de controle: {messages} ({global_analysis['messages']['per_cs']} por CS)")
+            if sync_delay.get('count'):
+                print(f"Atraso de sincronização (ms): p50={sync_delay['p50']:.2f} | "
+                      f"p95={sync_delay['p95']:.2f} | max={sync_delay['max']:.2f}")
+            print(f"Verificação (Lamport): {'✓ SEGURO' if global_analysis['safe'] else '✗ VIOLAÇÕES DETECTADAS'}")
+            print(f"Verificação (relógio físico): {'✓ SEGURO' if physical_analysis['safe'] else '✗ VIOLAÇÕES DETECTADAS'}")
+            if causal_violations is not None:
+                print(f"Verificação (relógio vetorial): "
+                      f"{'✓ SEGURO' if not causal_violations else f'✗ {len(causal_violations)} PARES DE CS CONCORRENTES'}")
             
-            if global_analysis['violations']:
-                print("\n⚠ VIOLAÇÕES DETECTADAS:")
-                for v in global_analysis['violations']:
-                    print(f"  - Timestamp {v['timestamp']}: {v['violation']}")
-                    print(f"    Processos: {v['processes']}")
+            if ordered_file:
+                print(f"Ordem global: {ordered_file}")
+            
+            for analysis in (global_analysis, physical_analysis):
+                if analysis['violations']:
+                    print(f"\n⚠ VIOLAÇÕES DETECTADAS ({analysis['order_by']}: {analysis['violation_count']}):")
+                    for v in analysis['violations']:
+                        print(f"  - Timestamp {v['timestamp']}: {v['violation']}")
+                        print(f"    Processos: {v['processes']}")
             
             # Estatísticas individuais
             print("\n--- Estatísticas por Cliente ---")
@@ -340,6 +498,12 @@ class MutexTestSuite:
                     print(f"  Exits: {stats.get('exits', 0)}")
                     if stats.get('avg_wait_time_logical', 0) > 0:
                         print(f"  Avg Wait (logical): {stats['avg_wait_time_logical']:.2f} ticks")
+                    wait = stats.get('wait_time_wall_ms', {})
+                    hold = stats.get('hold_time_wall_ms', {})
+                    if wait.get('count'):
+                        print(f"  Espera (ms): p50={wait['p50']:.2f} | p95={wait['p95']:.2f} | p99={wait['p99']:.2f}")
+                    if hold.get('count'):
+                        print(f"  Na CS (ms): p50={hold['p50']:.2f} | p99={hold['p99']:.2f}")
                 except Exception as e:
                     print(f"  Erro ao obter stats: {e}")
             
@@ -349,7 +513,7 @@ class MutexTestSuite:
             
             print("\n✓ Análise global salva em: tests/test_concurrent_global_analysis.json")
             
-            return global_analysis['safe']
+            return safe
             
         except Exception as e:
             print(f"✗ Erro na análise global: {e}")
@@ -365,6 +529,36 @@ class MutexTestSuite:
         
         return self.test_concurrent_clients(num_clients, num_accesses)
     
+    def compare_modes(self, num_clients=3, num_accesses=5):
+        """Mesmo teste concorrente nos modos centralizado e distribuído, lado a lado"""
+        reports = []
+        for mode in ('centralized', 'distributed'):
+            self.mode = mode
+            self.slots = None
+            self.last_report = None
+            self.test_concurrent_clients(num_clients, num_accesses)
+            if self.last_report:
+                reports.append(self.last_report)
+            time.sleep(1)
+        
+        print("\n" + "="*60)
+        print("COMPARAÇÃO: CENTRALIZADO x DISTRIBUÍDO (RICART-AGRAWALA)")
+        print("="*60)
+        print(f"{'Modo':<13} {'CS':>4} {'Msgs':>6} {'Msgs/CS':>8} {'Sync p50':>9} {'Sync p95':>9} {'Tempo':>7}")
+        for r in reports:
+            sync = r['sync_delay_ms']
+            p50 = f"{sync['p50']:.1f}" if sync.get('count') else '-'
+            p95 = f"{sync['p95']:.1f}" if sync.get('count') else '-'
+            print(f"{r['mode']:<13} {r['critical_sections']:>4} {r['messages_total']:>6} "
+                  f"{r['messages_per_cs'] or 0:>8} {p50:>9} {p95:>9} {r['elapsed_seconds']:>6.1f}s")
+        print(f"Ricart-Agrawala esperado: 2(N-1) = {2 * (num_clients - 1)} mensagens por CS")
+        
+        with open('tests/mutex_mode_comparison.json', 'w') as f:
+            json.dump(reports, f, indent=2)
+        print("\n✓ Comparação salva em: tests/mutex_mode_comparison.json")
+        
+        return len(reports) == 2 and all(r['safe'] for r in reports)
+    
     def run_all_tests(self):
         """Executa todos os testes"""
         results = {}
@@ -459,6 +653,17 @@ def main():
                        default='all', help='Teste a executar')
     parser.add_argument('--clients', type=int, default=3, help='Número de clientes (concurrent/stress)')
     parser.add_argument('--accesses', type=int, default=5, help='Número de acessos por cliente')
+    parser.add_argument('--slots', type=int, default=None,
+                        help='Clientes simultâneos permitidos na CS (padrão: valor do servidor)')
+    parser.add_argument('--server-journal', default=None,
+                        help='Journal de eventos do servidor para considerar leases expirados '
+                             '("auto": caminho informado pelo health_check)')
+    parser.add_argument('--mode', choices=['centralized', 'distributed', 'compare'], default='centralized',
+                        help='Coordenador central, Ricart-Agrawala entre pares, ou ambos comparados')
+    parser.add_argument('--peer-base-port', type=int, default=6100,
+                        help='Primeira porta dos pares no modo distribuído (uma por cliente)')
+    parser.add_argument('--export-json', action='store_true',
+                        help='Também exporta os eventos em JSON (além dos journals .evj)')
     
     args = parser.parse_args()
     
@@ -466,15 +671,20 @@ def main():
     print("TESTADOR DE EXCLUSÃO MÚTUA - RELÓGIO LÓGICO DE LAMPORT")
     print("="*60)
     print(f"Servidor: {args.host}:{args.port}")
+    print(f"Modo: {args.mode}")
     print(f"Pressione Ctrl+C para interromper")
     print("="*60)
     sys.stdout.flush()
     
-    suite = MutexTestSuite(args.host, args.port, args.clients, args.accesses)
+    mode = 'centralized' if args.mode == 'compare' else args.mode
+    suite = MutexTestSuite(args.host, args.port, args.clients, args.accesses, args.export_json, args.slots,
+                           args.server_journal, mode, args.peer_base_port)
     result = False
     
     try:
-        if args.test == 'single':
+        if args.mode == 'compare':
+            result = suite.compare_modes(args.clients, args.accesses)
+        elif args.test == 'single':
             result = suite.test_single_client(args.accesses)
         elif args.test == 'concurrent':
             result = suite.test_concurrent_clients(args.clients, args.accesses)
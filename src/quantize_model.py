@@ -0,0 +1,206 @@
+"""
+Quantização pós-treinamento int8 dos modelos IdentyFIRE
+- Calibra com uma amostra do split 'valid' (o mesmo usado por main.py)
+- Gera um .tflite int8 em models/ (carregável pelo servidor)
+- Compara a acurácia com o modelo float32 e com o <modelo>_results.json
+
+Uso:
+    python quantize_model.py ../models/IdentyFIRE_2064_best.h5 --dataset C:/Dataset/archive
+"""
+
+import os
+import sys
+import time
+import json
+import random
+
+import numpy as np
+
+from utils import load_config, preprocess_images_batch, TFLiteBackend, TF_AVAILABLE
+from export_model import convert_to_tflite
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def list_split(dataset_dir, split):
+    """
+    Lista (caminho, rótulo) de um split no layout do flow_from_directory:
+    uma subpasta por classe, rótulos pela ordem alfabética das pastas.
+    """
+    split_dir = os.path.join(dataset_dir, split)
+    classes = sorted(d for d in os.listdir(split_dir)
+                     if os.path.isdir(os.path.join(split_dir, d)))
+    samples = []
+    for label, class_name in enumerate(classes):
+        class_dir = os.path.join(split_dir, class_name)
+        for f in sorted(os.listdir(class_dir)):
+            if f.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(class_dir, f), label))
+    return samples, classes
+
+
+def load_images(paths, img_height, img_width):
+    """Decodifica com o mesmo pré-processamento do servidor"""
+    images_bytes = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images_bytes.append(f.read())
+    batch, valid_indices, _ = preprocess_images_batch(images_bytes, img_width, img_height)
+    return batch, valid_indices
+
+
+def representative_dataset(samples, img_height, img_width):
+    """Gerador de calibração para o conversor TFLite (uma imagem por passo)"""
+    def generator():
+        for path, _ in samples:
+            batch, valid = load_images([path], img_height, img_width)
+            if valid:
+                yield [batch]
+    return generator
+
+
+def int8_converter_setup(calibration, integer_io=True):
+    import tensorflow as tf
+
+    def setup(converter):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = calibration
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        if integer_io:
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+    return setup
+
+
+def evaluate(models, samples, img_height, img_width, threshold=0.5, batch_size=32):
+    """Acurácia de cada modelo e concordância entre eles sobre as mesmas imagens"""
+    predictions = {name: [] for name in models}
+    labels = []
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        batch, valid = load_images([p for p, _ in chunk], img_height, img_width)
+        if not valid:
+            continue
+        labels.extend(chunk[i][1] for i in valid)
+        for name, model in models.items():
+            scores = np.asarray(model.predict(batch, verbose=0)).reshape(-1)
+            predictions[name].append(scores > threshold)
+
+    labels = np.array(labels, dtype=bool)
+    metrics = {}
+    for name, preds in predictions.items():
+        preds = np.concatenate(preds) if preds else np.array([], dtype=bool)
+        metrics[name] = {'accuracy': float((preds == labels).mean()) if len(labels) else 0.0}
+        predictions[name] = preds
+    names = list(models)
+    if len(names) == 2 and len(labels):
+        metrics['agreement'] = float((predictions[names[0]] == predictions[names[1]]).mean())
+    metrics['samples'] = int(len(labels))
+    return metrics
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Quantização int8 pós-treinamento (TFLite)')
+    parser.add_argument('model', help='Arquivo .h5 treinado')
+    parser.add_argument('--dataset', required=True, help='Diretório do dataset (train/valid/test)')
+    parser.add_argument('--calibration-samples', type=int, default=300,
+                        help='Imagens do split valid usadas na calibração')
+    parser.add_argument('--eval-split', default='test', help='Split usado na comparação de acurácia')
+    parser.add_argument('--eval-samples', type=int, default=0, help='Limite de imagens na avaliação (0 = todas)')
+    parser.add_argument('--float-io', action='store_true',
+                        help='Mantém entrada/saída float32 (só os pesos/ativações internas em int8)')
+    parser.add_argument('--results', help='JSON de referência (padrão: <modelo>_results.json)')
+    parser.add_argument('--output', help='Arquivo .tflite de saída (padrão: <modelo>_int8.tflite)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--config', default='config.json', help='Arquivo de configuração')
+    args = parser.parse_args()
+
+    if not TF_AVAILABLE:
+        print("✗ TensorFlow não encontrado")
+        sys.exit(1)
+    import tensorflow as tf
+
+    config = load_config(args.config)
+    img_height, img_width = config['model']['img_height'], config['model']['img_width']
+    threshold = config['model'].get('prediction_threshold', 0.5)
+
+    stem = os.path.splitext(args.model)[0]
+    output_path = args.output or f"{stem}_int8.tflite"
+    results_path = args.results or f"{stem.replace('_best', '')}_results.json"
+    rng = random.Random(args.seed)
+
+    print("=" * 60)
+    print("QUANTIZAÇÃO INT8 PÓS-TREINAMENTO")
+    print("=" * 60)
+
+    # Calibração
+    valid_samples, classes = list_split(args.dataset, 'valid')
+    calibration = rng.sample(valid_samples, min(args.calibration_samples, len(valid_samples)))
+    print(f"✓ Classes: {classes}")
+    print(f"✓ Calibração: {len(calibration)} de {len(valid_samples)} imagens do split 'valid'")
+
+    model = tf.keras.models.load_model(args.model)
+    start = time.time()
+    tflite_model = convert_to_tflite(
+        model,
+        int8_converter_setup(representative_dataset(calibration, img_height, img_width),
+                             integer_io=not args.float_io)
+    )
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+
+    float_mb = os.path.getsize(args.model) / (1024 * 1024)
+    int8_mb = len(tflite_model) / (1024 * 1024)
+    print(f"✓ Modelo int8 salvo: {output_path} ({int8_mb:.2f} MB, float32 .h5: {float_mb:.2f} MB, "
+          f"{time.time() - start:.1f}s)")
+
+    # Avaliação: float32 x int8 nas mesmas imagens
+    eval_samples, _ = list_split(args.dataset, args.eval_split)
+    if args.eval_samples and args.eval_samples < len(eval_samples):
+        eval_samples = rng.sample(eval_samples, args.eval_samples)
+    print(f"\n=== Avaliação no split '{args.eval_split}' ({len(eval_samples)} imagens) ===")
+
+    metrics = evaluate({'float32': model, 'int8': TFLiteBackend(model_content=tflite_model)},
+                       eval_samples, img_height, img_width, threshold)
+    delta = metrics['int8']['accuracy'] - metrics['float32']['accuracy']
+    print(f"  Acurácia float32: {metrics['float32']['accuracy'] * 100:.2f}%")
+    print(f"  Acurácia int8:    {metrics['int8']['accuracy'] * 100:.2f}%  (Δ {delta * 100:+.2f} p.p.)")
+    if 'agreement' in metrics:
+        print(f"  Concordância:     {metrics['agreement'] * 100:.2f}%")
+
+    report = {
+        'model_name': os.path.basename(output_path),
+        'source_model': os.path.basename(args.model),
+        'quantization': 'int8' if not args.float_io else 'int8 (float io)',
+        'calibration_samples': len(calibration),
+        'eval_split': args.eval_split,
+        'eval_samples': metrics['samples'],
+        'float32_accuracy': metrics['float32']['accuracy'],
+        'test_accuracy': metrics['int8']['accuracy'],
+        'accuracy_delta': delta,
+        'agreement': metrics.get('agreement'),
+        'size_mb': round(int8_mb, 3)
+    }
+
+    # Referência registrada no treinamento (main.py)
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            reference = json.load(f)
+        reported = reference.get('test_accuracy')
+        if reported is not None:
+            report['reported_test_accuracy'] = reported
+            report['delta_vs_reported'] = metrics['int8']['accuracy'] - reported
+            print(f"  Referência ({os.path.basename(results_path)}): {reported * 100:.2f}% "
+                  f"(Δ {report['delta_vs_reported'] * 100:+.2f} p.p.)")
+
+    report_path = os.path.splitext(output_path)[0] + '_results.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\n✓ Relatório salvo: {report_path}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
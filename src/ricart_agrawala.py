@@ -0,0 +1,316 @@
+"""
+Exclusão Mútua Distribuída - Ricart-Agrawala sobre o protocolo RPC
+Os pares coordenam o acesso ao recurso compartilhado (ex.: o nó de inferência)
+sem o coordenador central (MutexManager) no caminho de controle.
+
+Algoritmo (N pares, 2(N-1) mensagens por seção crítica):
+1. Para entrar: marca o pedido com o relógio de Lamport e envia REQUEST a todos
+2. Ao receber REQUEST: responde na hora se não quer a CS ou se o pedido recebido
+   tem prioridade ((timestamp, process_id) menor); senão adia a resposta
+3. Entra na CS após receber REPLY de todos os pares
+4. Ao sair: libera as respostas adiadas
+
+Cada REQUEST é um RPC 'ra_request' e o REPLY é a própria resposta do RPC:
+responder depois = o handler aguarda (long-poll, como o mutex_acquire).
+"""
+
+import time
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+from lamport_clock import MutexEventLogger, VectorClock
+from rpc_protocol import RPCServerBase, RPCConnectionPool
+
+
+RELEASED = 'RELEASED'
+WANTED = 'WANTED'
+HELD = 'HELD'
+
+
+class RicartAgrawalaPeer:
+    """
+    Par do algoritmo de Ricart-Agrawala.
+    Escuta pedidos dos outros pares em (host, port) e usa o relógio de Lamport
+    do MutexEventLogger tanto no transporte RPC quanto nos eventos de mutex.
+    O relógio vetorial do logger (criado aqui se o logger não tiver um) também
+    viaja nos REQUEST/REPLY: o EXIT_CS de quem adiou a resposta precede
+    causalmente o ENTER_CS de quem a recebeu.
+    """
+
+    def __init__(self, process_id, host="127.0.0.1", port=6100, logger=None, engine='threaded',
+                 request_timeout=60):
+        self.process_id = process_id
+        self.host = host
+        self.port = port
+        self.logger = logger or MutexEventLogger(process_id)
+        if self.logger.vector_clock is None:
+            self.logger.vector_clock = VectorClock(process_id)
+        self.clock = self.logger.clock
+        self.vector_clock = self.logger.vector_clock
+        self.request_timeout = request_timeout
+
+        self.server = RPCServerBase(host, port, lamport_clock=self.clock, engine=engine,
+                                    vector_clock=self.vector_clock)
+        self.server.register_method('ra_request', self.rpc_ra_request)
+        self.server.register_method('ra_status', self.rpc_ra_status)
+        self._server_thread = None
+
+        self.peers = {}  # peer_id -> RPCConnectionPool
+        self._executor = None
+
+        # Estado do algoritmo (protegido pela condição)
+        self.cond = threading.Condition()
+        self.state = RELEASED
+        self.request_ts = None
+        self.running = False
+
+        # Mensagens do protocolo (REQUEST enviados/recebidos, REPLY enviados/recebidos)
+        self.messages = {'requests_sent': 0, 'replies_received': 0,
+                         'requests_received': 0, 'replies_sent': 0, 'replies_deferred': 0}
+        self.cs_entries = 0
+
+    # ====================================================================
+    # CICLO DE VIDA
+    # ====================================================================
+
+    def start(self, ready_timeout=5):
+        """Inicia o servidor RPC do par em segundo plano e aguarda o listen"""
+        self.running = True
+        self._server_thread = threading.Thread(target=self.server.start, daemon=True)
+        self._server_thread.start()
+        deadline = time.time() + ready_timeout
+        while not self.server.running:
+            if time.time() > deadline or not self._server_thread.is_alive():
+                raise RuntimeError(f"Par {self.process_id} não iniciou em {self.host}:{self.port}")
+            time.sleep(0.01)
+        return self
+
+    def connect(self, peers):
+        """peers: {peer_id: (host, port)} dos demais participantes"""
+        for peer_id, (host, port) in peers.items():
+            if peer_id != self.process_id:
+                self.peers[peer_id] = RPCConnectionPool(host, port, max_size=2,
+                                                        timeout=self.request_timeout)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.peers)),
+                                            thread_name_prefix=f'ra-{self.process_id}')
+
+    def stop(self):
+        """Encerra o par (pedidos adiados recebem erro e as conexões são fechadas)"""
+        with self.cond:
+            self.running = False
+            self.state = RELEASED
+            self.cond.notify_all()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        for pool in self.peers.values():
+            pool.close()
+        self.server.stop()
+
+    # ====================================================================
+    # MÉTODOS RPC (recebidos dos outros pares)
+    # ====================================================================
+
+    def _defers(self, timestamp, sender):
+        """Adia a resposta? (estou na CS ou meu pedido tem prioridade)"""
+        if self.state == HELD:
+            return True
+        return self.state == WANTED and (self.request_ts, self.process_id) < (timestamp, sender)
+
+    def rpc_ra_request(self, params):
+        """REQUEST de outro par; o retorno deste método é o REPLY"""
+        sender = params.get('process_id')
+        timestamp = params.get('timestamp')
+        if sender is None or timestamp is None:
+            return {'success': False, 'error': 'process_id e timestamp são obrigatórios'}
+
+        with self.cond:
+            self.messages['requests_received'] += 1
+            if self._defers(timestamp, sender):
+                self.messages['replies_deferred'] += 1
+                while self.running and self._defers(timestamp, sender):
+                    self.cond.wait()
+            if not self.running:
+                return {'success': False, 'error': 'Peer stopped'}
+            self.messages['replies_sent'] += 1
+
+        return {'success': True, 'process_id': self.process_id, 'reply': 'OK'}
+
+    def rpc_ra_status(self, params):
+        with self.cond:
+            return {
+                'success': True,
+                'process_id': self.process_id,
+                'state': self.state,
+                'request_ts': self.request_ts,
+                'peers': sorted(self.peers),
+                'messages': dict(self.messages)
+            }
+
+    # ====================================================================
+    # API DO PAR (mesmo papel de mutex_acquire / mutex_release)
+    # ====================================================================
+
+    def _send_request(self, peer_id, timestamp, timeout):
+        message = {
+            'method': 'ra_request',
+            'params': {'process_id': self.process_id, 'timestamp': timestamp}
+        }
+        response = self.peers[peer_id].call(message, lamport_clock=self.clock, timeout=timeout,
+                                            vector_clock=self.vector_clock)
+        if not response.get('success'):
+            raise ConnectionError(f"{peer_id}: {response.get('error', 'REPLY negado')}")
+        return response
+
+    def acquire(self, timeout=None):
+        """
+        Solicita a CS a todos os pares e bloqueia até receber todas as respostas.
+        Retorna True ao entrar (estado HELD) ou False em timeout/falha de um par.
+        """
+        timeout = timeout or self.request_timeout
+        with self.cond:
+            if self.state == HELD:
+                return True
+            # O timestamp do pedido é o do evento REQUEST (mesmo relógio)
+            self.request_ts = self.logger.log_request({'algorithm': 'ricart_agrawala'})
+            self.state = WANTED
+            request_ts = self.request_ts
+
+        futures = {}
+        for peer_id in self.peers:
+            futures[self._executor.submit(self._send_request, peer_id, request_ts, timeout)] = peer_id
+        with self.cond:
+            self.messages['requests_sent'] += len(futures)
+
+        done, pending = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+        failed = [futures[f] for f in done if f.exception() is not None]
+
+        with self.cond:
+            self.messages['replies_received'] += len(done) - len(failed)
+            if failed or pending:
+                # Desiste do pedido: libera quem estava aguardando a minha resposta
+                self.state = RELEASED
+                self.request_ts = None
+                self.cond.notify_all()
+                reason = 'falha' if failed else 'timeout'
+                print(f"[RA {self.process_id}] ✗ Pedido abandonado ({reason}: "
+                      f"{', '.join(failed or [futures[f] for f in pending])})")
+                return False
+            self.state = HELD
+            self.cs_entries += 1
+
+        self.logger.log_grant(data={'replies': len(futures)})
+        return True
+
+    def release(self):
+        """Sai da CS e envia as respostas adiadas (handlers em espera)"""
+        with self.cond:
+            if self.state != HELD:
+                return False
+            self.logger.log_release({'algorithm': 'ricart_agrawala'})
+            self.state = RELEASED
+            self.request_ts = None
+            self.cond.notify_all()
+        return True
+
+    def grant_token(self):
+        """
+        Prova da concessão para o nó de inferência ('ra_grant' nas predições),
+        ou None fora da CS. O servidor recusa concessões mais antigas que a última usada.
+        """
+        with self.cond:
+            if self.state != HELD:
+                return None
+            return {'peer': self.process_id, 'request_ts': self.request_ts}
+
+    def message_count(self):
+        """Mensagens geradas por este par (REQUEST enviados + REPLY enviados)"""
+        with self.cond:
+            return self.messages['requests_sent'] + self.messages['replies_sent']
+
+
+def start_local_peers(process_ids, host="127.0.0.1", base_port=6100, loggers=None, request_timeout=60):
+    """
+    Cria e conecta um par por process_id em portas consecutivas (mesma máquina).
+    loggers: {process_id: MutexEventLogger} opcional (ex.: journals em tests/)
+    """
+    loggers = loggers or {}
+    peers = []
+    for i, process_id in enumerate(process_ids):
+        peer = RicartAgrawalaPeer(process_id, host, base_port + i, logger=loggers.get(process_id),
+                                  request_timeout=request_timeout)
+        try:
+            peer.start()
+        except (RuntimeError, OSError):
+            for started in peers:
+                started.stop()
+            raise
+        peers.append(peer)
+
+    addresses = {peer.process_id: (host, peer.port) for peer in peers}
+    for peer in peers:
+        peer.connect(addresses)
+    return peers
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Par Ricart-Agrawala (exclusão mútua sem coordenador)')
+    parser.add_argument('--id', required=True, help='Identificador deste par')
+    parser.add_argument('--host', default='127.0.0.1', help='Endereço de escuta')
+    parser.add_argument('--port', type=int, default=6100, help='Porta de escuta')
+    parser.add_argument('--peer', action='append', default=[],
+                        help='Outro par no formato id=host:porta (repetir para cada par)')
+    parser.add_argument('--accesses', type=int, default=5, help='Acessos à seção crítica')
+    parser.add_argument('--work', type=float, default=0.2, help='Segundos dentro da CS')
+    parser.add_argument('--journal', default=None, help='Journal de eventos (.evj)')
+    args = parser.parse_args()
+
+    peers = {}
+    for spec in args.peer:
+        peer_id, _, address = spec.partition('=')
+        peer_host, _, peer_port = address.rpartition(':')
+        peers[peer_id] = (peer_host, int(peer_port))
+
+    print("=" * 60)
+    print(f"PAR RICART-AGRAWALA: {args.id} ({args.host}:{args.port})")
+    print(f"Pares: {', '.join(peers) or 'nenhum'}")
+    print("=" * 60)
+
+    logger = MutexEventLogger(args.id, journal_path=args.journal)
+    peer = RicartAgrawalaPeer(args.id, args.host, args.port, logger=logger).start()
+    peer.connect(peers)
+
+    # Aguarda os demais pares subirem antes de competir pela CS
+    for peer_id, pool in peer.peers.items():
+        while True:
+            try:
+                pool.call({'method': 'ra_status', 'params': {}}, timeout=2)
+                break
+            except (OSError, socket.timeout):
+                print(f"⏳ Aguardando par {peer_id}...")
+                time.sleep(1)
+
+    try:
+        for i in range(args.accesses):
+            if not peer.acquire():
+                print(f"✗ Acesso {i + 1}: não foi possível entrar na CS")
+                continue
+            logger.log_enter_cs()
+            print(f"🔒 Acesso {i + 1}/{args.accesses} na CS")
+            time.sleep(args.work)
+            logger.log_exit_cs()
+            peer.release()
+        print(f"\n✓ Mensagens enviadas: {peer.message_count()} ({peer.messages})")
+        # Continua respondendo enquanto os outros pares terminam
+        input("Pressione Enter para encerrar o par...")
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        peer.stop()
+        logger.close()
+
+
+if __name__ == "__main__":
+    main()
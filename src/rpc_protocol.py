@@ -1,67 +1,176 @@
 import json
+import time
+import queue
+import asyncio
+import select
 import struct
 import socket
 import base64
 import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 # ============================================================================
 # PROTOCOLO RPC MANUAL (Substitui HTTP/Flask)
 # Estrutura do Pacote: [TAMANHO (4 bytes big-endian)] + [DADOS (JSON utf-8)]
+#
+# Quadro binário (negociado via capability "binary_frames"):
+#   [TAMANHO | BINARY_FRAME_FLAG (4 bytes)] + [TAM_JSON (4 bytes)] + [JSON]
+#   + [N_ANEXOS (4 bytes)] + N x ([TAM_ANEXO (4 bytes)] + [BYTES])
+# Valores bytes dentro da mensagem viram anexos e são substituídos no JSON por
+# {"__attachment__": indice}; o receptor restaura os bytes no mesmo lugar.
 # ============================================================================
 
-def send_rpc_message(sock, message_dict, lamport_clock=None):
+BINARY_FRAME_FLAG = 0x80000000
+FRAME_LENGTH_MASK = 0x7FFFFFFF
+ATTACHMENT_KEY = '__attachment__'
+
+# Capacidades anunciadas pelo servidor no health_check
+PROTOCOL_CAPABILITIES = ['binary_frames']
+
+
+def _extract_attachments(obj, attachments):
+    """Substitui valores bytes por marcadores e acumula os anexos"""
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        attachments.append(obj)
+        return {ATTACHMENT_KEY: len(attachments) - 1}
+    if isinstance(obj, dict):
+        return {k: _extract_attachments(v, attachments) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_extract_attachments(v, attachments) for v in obj]
+    return obj
+
+
+def _restore_attachments(obj, attachments):
+    """Troca marcadores {"__attachment__": i} pelos bytes recebidos"""
+    if isinstance(obj, dict):
+        if len(obj) == 1 and ATTACHMENT_KEY in obj:
+            return attachments[obj[ATTACHMENT_KEY]]
+        return {k: _restore_attachments(v, attachments) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_restore_attachments(v, attachments) for v in obj]
+    return obj
+
+
+def encode_rpc_message(message_dict, lamport_clock=None, vector_clock=None):
+    """
+    Serializa a mensagem em um quadro pronto para envio.
+    Usa o quadro binário apenas se a mensagem contiver valores bytes.
+    """
+    # Adiciona timestamp de Lamport se disponível
+    if lamport_clock:
+        ts = lamport_clock.send_event(
+            message_dict.get('method', 'UNKNOWN'),
+            {'params': message_dict.get('params')}
+        )
+        message_dict['lamport_ts'] = ts
+    
+    # Alternativa/complemento: vetor esparso {process_id: contador}
+    if vector_clock:
+        message_dict['vector_ts'] = vector_clock.send_event(message_dict.get('method', 'UNKNOWN'))
+
+    attachments = []
+    payload = _extract_attachments(message_dict, attachments)
+    json_data = json.dumps(payload).encode('utf-8')
+
+    if not attachments:
+        return struct.pack('>I', len(json_data)) + json_data
+
+    parts = [struct.pack('>I', len(json_data)), json_data, struct.pack('>I', len(attachments))]
+    for blob in attachments:
+        parts.append(struct.pack('>I', len(blob)))
+        parts.append(blob)
+
+    body_len = sum(len(p) for p in parts)
+    if body_len > FRAME_LENGTH_MASK:
+        raise ValueError("Mensagem excede o tamanho máximo do quadro binário")
+    return b''.join([struct.pack('>I', body_len | BINARY_FRAME_FLAG)] + parts)
+
+
+def decode_rpc_body(data, binary=False):
+    """Desserializa o corpo de um quadro (JSON puro ou binário com anexos)"""
+    if not binary:
+        return json.loads(data.decode('utf-8'))
+
+    view = memoryview(data)
+    json_len = struct.unpack_from('>I', view, 0)[0]
+    offset = 4
+    message = json.loads(bytes(view[offset:offset + json_len]).decode('utf-8'))
+    offset += json_len
+
+    count = struct.unpack_from('>I', view, offset)[0]
+    offset += 4
+    attachments = []
+    for _ in range(count):
+        blob_len = struct.unpack_from('>I', view, offset)[0]
+        offset += 4
+        attachments.append(bytes(view[offset:offset + blob_len]))
+        offset += blob_len
+
+    return _restore_attachments(message, attachments)
+
+
+def parse_frame_header(raw_header):
+    """Retorna (tamanho_do_corpo, is_binary) a partir dos 4 bytes de cabeçalho"""
+    value = struct.unpack('>I', raw_header)[0]
+    return value & FRAME_LENGTH_MASK, bool(value & BINARY_FRAME_FLAG)
+
+
+def apply_received_timestamp(message, lamport_clock=None, vector_clock=None):
+    """Atualiza relógio com o timestamp recebido, se disponível"""
+    if lamport_clock and 'lamport_ts' in message:
+        received_ts = message['lamport_ts']
+        lamport_clock.receive_event(
+            received_ts,
+            message.get('method', 'RESPONSE'),
+            message.get('params') or message.get('result')
+        )
+    if vector_clock and 'vector_ts' in message:
+        vector_clock.receive_event(message['vector_ts'], message.get('method', 'RESPONSE'))
+
+
+def send_rpc_message(sock, message_dict, lamport_clock=None, vector_clock=None):
     """
     Serializa dict para JSON e envia com cabeçalho de tamanho
     Se lamport_clock fornecido, adiciona timestamp
+    Se vector_clock fornecido, adiciona o vetor esparso ('vector_ts')
+    Valores bytes na mensagem são enviados como anexos de um quadro binário
     """
     try:
-        # Adiciona timestamp de Lamport se disponível
-        if lamport_clock:
-            ts = lamport_clock.send_event(
-                message_dict.get('method', 'UNKNOWN'),
-                {'params': message_dict.get('params')}
-            )
-            message_dict['lamport_ts'] = ts
-        
-        json_data = json.dumps(message_dict).encode('utf-8')
-        header = struct.pack('>I', len(json_data))
-        sock.sendall(header + json_data)
+        sock.sendall(encode_rpc_message(message_dict, lamport_clock, vector_clock))
         
     except Exception as e:
         print(f"[RPC Protocol] Erro ao enviar: {e}")
         raise
 
 
-def receive_rpc_message(sock, lamport_clock=None):
+def receive_rpc_message(sock, lamport_clock=None, vector_clock=None):
     """
     Lê 4 bytes de tamanho e depois o corpo da mensagem
-    Se lamport_clock fornecido, atualiza com timestamp recebido
+    Se lamport_clock/vector_clock fornecidos, atualiza com o timestamp recebido
     """
     try:
         # 1. Ler o cabeçalho (4 bytes)
         raw_msglen = recvall(sock, 4)
         if not raw_msglen:
             return None
-        msglen = struct.unpack('>I', raw_msglen)[0]
+        msglen, binary = parse_frame_header(raw_msglen)
         
         # 2. Ler o corpo da mensagem
         data = recvall(sock, msglen)
         if not data:
             return None
         
-        message = json.loads(data.decode('utf-8'))
+        message = decode_rpc_body(data, binary)
         
         # Atualiza relógio se disponível
-        if lamport_clock and 'lamport_ts' in message:
-            received_ts = message['lamport_ts']
-            lamport_clock.receive_event(
-                received_ts,
-                message.get('method', 'RESPONSE'),
-                message.get('params') or message.get('result')
-            )
+        apply_received_timestamp(message, lamport_clock, vector_clock)
         
         return message
         
+    except socket.timeout:
+        # Timeout é propagado para que o chamador não confunda com conexão fechada
+        raise
     except Exception as e:
         print(f"[RPC Protocol] Erro ao receber: {e}")
         return None
@@ -87,67 +196,363 @@ def base64_to_image(base64_string):
     return base64.b64decode(base64_string)
 
 
+def extract_image_bytes(params):
+    """
+    Obtém os bytes da imagem de uma requisição.
+    Aceita anexo binário ('image_bytes') ou o formato legado Base64 ('image_b64').
+    """
+    image_bytes = params.get('image_bytes')
+    if image_bytes is not None:
+        return image_bytes
+    image_b64 = params.get('image_b64')
+    if image_b64:
+        return base64_to_image(image_b64)
+    return None
+
+
+# ============================================================================
+# POOL DE CONEXÕES PERSISTENTES (LADO CLIENTE)
+# ============================================================================
+
+class RPCConnectionPool:
+    """
+    Pool de sockets TCP reutilizáveis para um mesmo servidor.
+    O servidor já atende várias mensagens por conexão (handle_client em loop),
+    então o cliente não precisa abrir/fechar um socket a cada chamada.
+    Seguro para uso por várias threads.
+    """
+
+    def __init__(self, host, port, max_size=4, timeout=10, max_idle_seconds=60):
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle_seconds = max_idle_seconds
+        self._idle = queue.LifoQueue()  # (socket, instante de devolução)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._closed = False
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _is_healthy(self, sock, returned_at):
+        """Conexão ociosa está viva? (sem dados pendentes nem EOF do servidor)"""
+        if time.time() - returned_at > self.max_idle_seconds:
+            return False
+        try:
+            if hasattr(select, 'poll'):
+                # poll não tem o limite FD_SETSIZE (fd >= 1024) do select
+                poller = select.poll()
+                poller.register(sock, select.POLLIN | select.POLLERR | select.POLLHUP)
+                readable = poller.poll(0)
+            else:
+                readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        # Uma conexão ociosa saudável nunca fica legível; legível = EOF ou lixo
+        return not readable
+
+    def _checkout(self):
+        """Retorna (socket, reutilizado)"""
+        while True:
+            try:
+                sock, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect(), False
+            if self._is_healthy(sock, returned_at):
+                return sock, True
+            self._discard(sock)
+
+    def _checkin(self, sock):
+        if self._closed:
+            self._discard(sock)
+        else:
+            self._idle.put((sock, time.time()))
+
+    @staticmethod
+    def _discard(sock):
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Empresta uma conexão exclusiva do pool (ex.: para streaming).
+        Em caso de erro a conexão é descartada em vez de devolvida.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise socket.timeout("Pool de conexões esgotado")
+        sock = None
+        try:
+            sock, _ = self._checkout()
+            sock.settimeout(timeout if timeout is not None else self.timeout)
+            yield sock
+            self._checkin(sock)
+            sock = None
+        finally:
+            if sock is not None:
+                self._discard(sock)
+            self._slots.release()
+
+    def call(self, message, lamport_clock=None, timeout=None, vector_clock=None):
+        """
+        Envia uma requisição e aguarda a resposta usando uma conexão do pool.
+        Se uma conexão reutilizada estiver quebrada, reconecta e repete uma vez.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise socket.timeout("Pool de conexões esgotado")
+        try:
+            for attempt in range(2):
+                sock, reused = self._checkout()
+                try:
+                    sock.settimeout(timeout if timeout is not None else self.timeout)
+                    send_rpc_message(sock, message, lamport_clock, vector_clock)
+                    response = receive_rpc_message(sock, lamport_clock, vector_clock)
+                except socket.timeout:
+                    self._discard(sock)
+                    raise
+                except OSError:
+                    self._discard(sock)
+                    if reused and attempt == 0:
+                        continue
+                    raise
+
+                if response is None:
+                    # Servidor fechou a conexão (ex.: reinício)
+                    self._discard(sock)
+                    if reused and attempt == 0:
+                        continue
+                    raise ConnectionError("Conexão encerrada pelo servidor")
+
+                self._checkin(sock)
+                return response
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Fecha todas as conexões ociosas"""
+        self._closed = True
+        while True:
+            try:
+                sock, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(sock)
+
+
 # ============================================================================
 # SERVIDOR RPC BASE COM LAMPORT CLOCK
 # ============================================================================
 
 class RPCServerBase:
-    def __init__(self, host, port, lamport_clock=None):
+    """
+    Servidor RPC sobre TCP com dois motores intercambiáveis:
+    - 'threaded': uma thread por conexão (padrão)
+    - 'asyncio': event loop único; os métodos rodam em executores limitados
+    """
+    def __init__(self, host, port, lamport_clock=None, engine='threaded',
+                 backlog=128, max_connections=512, inference_workers=4, vector_clock=None):
         self.host = host
         self.port = port
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.methods = {}
+        self.heavy_methods = set()
         self.running = False
         self.lamport_clock = lamport_clock
+        self.vector_clock = vector_clock
+        self.engine = engine
+        self.backlog = backlog
+        self.max_connections = max_connections
+        self.inference_workers = inference_workers
+        self._connection_slots = None
+        self._async_engine = None
     
-    def register_method(self, name, function):
-        """Registra uma função que pode ser chamada remotamente"""
+    def register_method(self, name, function, heavy=False):
+        """
+        Registra uma função que pode ser chamada remotamente.
+        heavy=True marca métodos de inferência: no motor asyncio eles rodam
+        no executor limitado a inference_workers threads.
+        """
         self.methods[name] = function
+        if heavy:
+            self.heavy_methods.add(name)
+        else:
+            self.heavy_methods.discard(name)
     
     def start(self):
         self.sock.bind((self.host, self.port))
-        self.sock.listen(5)
+        self.sock.listen(self.backlog)
         self.running = True
-        print(f"[RPC Server] Escutando em {self.host}:{self.port} (TCP Sockets)")
+        print(f"[RPC Server] Escutando em {self.host}:{self.port} (TCP Sockets, motor: {self.engine})")
         print(f"[RPC Server] Lamport Clock: {'Enabled' if self.lamport_clock else 'Disabled'}")
+        if self.vector_clock:
+            print("[RPC Server] Vector Clock: Enabled")
+        
+        if self.engine == 'asyncio':
+            self._async_engine = AsyncRPCEngine(self)
+            self._async_engine.run()
+            return
         
+        # Limita conexões simultâneas: acima do limite o accept espera (backpressure)
+        self._connection_slots = threading.BoundedSemaphore(self.max_connections)
         while self.running:
+            self._connection_slots.acquire()
             try:
                 client_sock, address = self.sock.accept()
-                t = threading.Thread(target=self.handle_client, args=(client_sock,))
-                t.daemon = True
-                t.start()
             except OSError:
+                self._connection_slots.release()
                 break
+            t = threading.Thread(target=self._handle_client_slot, args=(client_sock,))
+            t.daemon = True
+            t.start()
     
     def stop(self):
         self.running = False
+        if self._async_engine:
+            # O socket de escuta pertence ao event loop, que o fecha ao parar
+            self._async_engine.stop()
+            return
+        try:
+            # Desbloqueia o accept() pendente antes de fechar
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
         self.sock.close()
     
+    def _handle_client_slot(self, client_sock):
+        try:
+            self.handle_client(client_sock)
+        finally:
+            self._connection_slots.release()
+    
+    def dispatch(self, request):
+        """Executa o método RPC solicitado e retorna o dicionário de resposta"""
+        method_name = request.get('method')
+        params = request.get('params', {})
+        
+        # Adiciona timestamp recebido aos params para logs
+        if 'lamport_ts' in request:
+            params['_received_lamport_ts'] = request['lamport_ts']
+        if 'vector_ts' in request:
+            params['_received_vector_ts'] = request['vector_ts']
+        
+        response = {"success": False, "error": "Method not found"}
+        
+        if method_name in self.methods:
+            try:
+                result = self.methods[method_name](params)
+                response = result
+            except Exception as e:
+                response = {"success": False, "error": str(e)}
+        
+        return response
+    
     def handle_client(self, client_sock):
         with client_sock:
             while True:
                 # Recebe mensagem e atualiza relógio
-                request = receive_rpc_message(client_sock, self.lamport_clock)
+                request = receive_rpc_message(client_sock, self.lamport_clock, self.vector_clock)
                 if request is None:
                     break
                 
-                method_name = request.get('method')
-                params = request.get('params', {})
-                
-                # Adiciona timestamp recebido aos params para logs
-                if 'lamport_ts' in request:
-                    params['_received_lamport_ts'] = request['lamport_ts']
+                response = self.dispatch(request)
                 
-                response = {"success": False, "error": "Method not found"}
-                
-                if method_name in self.methods:
+                # Envia resposta com timestamp
+                send_rpc_message(client_sock, response, self.lamport_clock, self.vector_clock)
+
+
+class AsyncRPCEngine:
+    """
+    Motor asyncio para RPCServerBase (mesmo protocolo com prefixo de tamanho).
+    O event loop só faz I/O; os métodos registrados rodam em executores:
+    - inferência (heavy): limitado a inference_workers threads
+    - controle: demais métodos (inclui mutex_acquire em long-poll)
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = None
+        self._stop_event = None
+        self._connections = None
+        self._tasks = set()
+        self.inference_executor = ThreadPoolExecutor(
+            max_workers=max(1, server.inference_workers), thread_name_prefix='rpc-inference'
+        )
+        self.control_executor = ThreadPoolExecutor(
+            max_workers=max(1, server.max_connections), thread_name_prefix='rpc-control'
+        )
+
+    def run(self):
+        """Bloqueia até stop() ser chamado (equivalente ao loop de accept)"""
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._serve())
+        finally:
+            self.inference_executor.shutdown(wait=False)
+            self.control_executor.shutdown(wait=False)
+            self.loop.close()
+
+    def stop(self):
+        if self.loop and self._stop_event and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def _serve(self):
+        self._stop_event = asyncio.Event()
+        self._connections = asyncio.Semaphore(self.server.max_connections)
+        server = await asyncio.start_server(
+            self._handle_connection, sock=self.server.sock, backlog=self.server.backlog
+        )
+        async with server:
+            await self._stop_event.wait()
+            # Encerra conexões ainda abertas antes de fechar o loop
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            await self._serve_connection(reader, writer)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._tasks.discard(task)
+            writer.close()
+
+    async def _serve_connection(self, reader, writer):
+        # Acima de max_connections a conexão aguarda vaga sem ser atendida
+        async with self._connections:
+            try:
+                while True:
+                    try:
+                        raw_header = await reader.readexactly(4)
+                        msglen, binary = parse_frame_header(raw_header)
+                        body = await reader.readexactly(msglen)
+                    except (asyncio.IncompleteReadError, ConnectionError):
+                        break
+                    
                     try:
-                        result = self.methods[method_name](params)
-                        response = result
+                        request = decode_rpc_body(body, binary)
                     except Exception as e:
-                        response = {"success": False, "error": str(e)}
-                
-                # Envia resposta com timestamp
-                send_rpc_message(client_sock, response, self.lamport_clock)
\ No newline at end of file
+                        print(f"[RPC Protocol] Erro ao receber: {e}")
+                        break
+                    apply_received_timestamp(request, self.server.lamport_clock, self.server.vector_clock)
+                    
+                    executor = (self.inference_executor
+                                if request.get('method') in self.server.heavy_methods
+                                else self.control_executor)
+                    response = await self.loop.run_in_executor(
+                        executor, self.server.dispatch, request
+                    )
+                    
+                    writer.write(encode_rpc_message(response, self.server.lamport_clock,
+                                                    self.server.vector_clock))
+                    await writer.drain()
+            except ConnectionError:
+                pass
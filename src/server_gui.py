@@ -13,59 +13,179 @@ from tkinter import messagebox, scrolledtext, ttk
 import threading
 import os
 import time
+import uuid
 from datetime import datetime
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 # Importar protocolo RPC
-from rpc_protocol import RPCServerBase, base64_to_image
+from rpc_protocol import RPCServerBase, extract_image_bytes, PROTOCOL_CAPABILITIES
+from lamport_clock import MutexEventLogger
 
 # Importar utilitários e MutexManager
 from utils import (
     load_config, scan_models, load_model, 
-    process_image_from_bytes, make_prediction,
-    get_model_info, format_timestamp, 
+    process_image_from_bytes, preprocess_images_parallel,
+    format_timestamp, resolve_project_path,
     validate_image_file, bytes_to_mb,
-    MutexManager
+    build_prediction_result,
+    MutexManager, MicroBatchScheduler, PredictionCache, ModelRegistry, ServerMetrics,
+    LogRingBuffer, AsyncFileLogSink
 )
 
 class IdentyFireRPCServer(RPCServerBase):
     """Servidor de detecção de incêndios usando RPC Manual"""
     
+    # Streams de lote sem atividade por mais tempo que isso são descartados
+    STREAM_IDLE_SECONDS = 600
+    
     def __init__(self, host="0.0.0.0", port=5000):
-        # Inicializa a base do servidor socket
-        super().__init__(host, port)
-        
         self.config = load_config()
-        self.modelo = None
-        self.modelo_path = None
-        self.modelo_info = {}
+        
+        # Inicializa a base do servidor socket (motor e limites vêm do config.json)
+        server_config = self.config['server']
+        mutex_config = self.config.get('mutex', {})
+        slots = max(1, int(mutex_config.get('slots', 1)))
+        super().__init__(
+            host, port,
+            engine=server_config.get('engine', 'threaded'),
+            backlog=server_config.get('backlog', 128),
+            max_connections=server_config.get('max_connections', 512),
+            # No motor asyncio, cada slot precisa de uma thread de inferência
+            inference_workers=max(server_config.get('inference_workers', 4), slots)
+        )
+        
         self.available_models = []
+        self.metrics = ServerMetrics()
+        # Modelos sendo carregados em segundo plano (o servidor já aceita conexões)
+        self.loading_models = set()
+        self.model_load_error = None
         
-        # Inicializa o gerenciador de Exclusão Mútua
-        self.mutex = MutexManager(timeout_seconds=30)
-        
-        # Estatísticas
-        self.stats = {
-            'requests_total': 0,
-            'requests_success': 0,
-            'requests_error': 0,
-            'fires_detected': 0,
-            'no_fire': 0,
-            'server_start_time': None
-        }
+        # Inicializa o gerenciador de Exclusão Mútua (N slots = N clientes na CS)
+        # Log de Lamport do coordenador (leases expirados), lido pelo mutex_tester;
+        # o journal é aberto em start()
+        self.mutex_events = None
+        self.mutex = MutexManager(
+            timeout_seconds=mutex_config.get('timeout_seconds', 30),
+            on_grant=self._on_mutex_grant,
+            slots=slots,
+            classes=mutex_config.get('priority_classes'),
+            lease_seconds=mutex_config.get('lease_seconds', 10),
+            on_expire=self._on_lease_expired
+        )
+        self.mutex_max_wait = mutex_config.get('max_wait_seconds', 30)
+        # 'distributed': pares coordenam entre si (ricart_agrawala.py) e enviam a
+        # concessão RA ('ra_grant') nas predições; sem ela vale o mutex central
+        self.mutex_mode = mutex_config.get('mode', 'centralized')
+        self._ra_latest_grant = None  # (request_ts, peer) mais recente já usado
+        self._ra_lock = threading.Lock()
+        
+        # Micro-batching: agrupa predições individuais concorrentes
+        batching_config = self.config.get('batching', {})
+        self.batching_enabled = batching_config.get('enabled', True)
+        
+        # Registro de modelos: vários modelos por nome, aquecidos antes de publicar
+        model_config = self.config['model']
+        warmup_sizes = ()
+        if model_config.get('warmup', True):
+            warmup_sizes = (1, batching_config.get('max_batch_size', 16))
+        self.models = ModelRegistry(
+            max_models=model_config.get('max_loaded_models', 2),
+            warmup_shape=(model_config['img_height'], model_config['img_width']),
+            warmup_batch_sizes=warmup_sizes,
+            loader=partial(load_model, backend=model_config.get('backend', 'keras')),
+            verbose=False,
+            replicas=slots
+        )
+        
+        # Um worker de inferência (fila + thread própria) por slot do mutex, cada
+        # um com a sua cópia do modelo; toda chamada a predict passa por eles
+        self.batchers = [
+            MicroBatchScheduler(
+                self._predict_tensor,
+                max_batch_size=batching_config.get('max_batch_size', 16),
+                max_wait_ms=batching_config.get('max_wait_ms', 5),
+                metrics=self.metrics
+            )
+            for _ in range(slots)
+        ]
+        
+        # Cache de resultados por hash da imagem (câmeras reenviam quadros idênticos)
+        cache_config = self.config.get('cache', {})
+        self.cache_enabled = cache_config.get('enabled', True)
+        self.prediction_cache = PredictionCache(
+            max_entries=cache_config.get('max_entries', 10000),
+            max_bytes=int(cache_config.get('max_mb', 16) * 1024 * 1024)
+        )
+        
+        # Estágio de decodificação paralela do predict_batch
+        preprocessing_config = self.config.get('preprocessing', {})
+        decode_workers = preprocessing_config.get('decode_workers', 4)
+        self.decode_executor = None
+        if decode_workers > 1:
+            if preprocessing_config.get('executor', 'thread') == 'process':
+                self.decode_executor = ProcessPoolExecutor(max_workers=decode_workers)
+            else:
+                self.decode_executor = ThreadPoolExecutor(
+                    max_workers=decode_workers, thread_name_prefix='decode'
+                )
+        
+        # Lotes em streaming abertos (stream_id -> contadores)
+        self.streams = {}
+        self.streams_lock = threading.Lock()
+        
+        # Métricas (contadores por thread + histogramas de latência)
+        self.server_start_time = None
         
         self.log_callback = None
         
+        # Arquivo de log opcional, gravado por uma thread própria (aberto em start())
+        self.log_sink = None
+        
         # ====================================================================
         # REGISTRO DE MÉTODOS RPC (Substitui Rotas Flask)
         # ====================================================================
         self.register_method("health_check", self.rpc_health_check)
+        self.register_method("get_metrics", self.rpc_get_metrics)
         self.register_method("get_models", self.rpc_list_models)
         self.register_method("get_current_model", self.rpc_current_model)
         self.register_method("load_model", self.rpc_load_model)
+        self.register_method("unload_model", self.rpc_unload_model)
         self.register_method("mutex_acquire", self.rpc_mutex_acquire)
         self.register_method("mutex_release", self.rpc_mutex_release)
-        self.register_method("predict_image", self.rpc_predict_image)
-        self.register_method("predict_batch", self.rpc_predict_batch)
+        self.register_method("mutex_heartbeat", self.rpc_mutex_heartbeat)
+        self.register_method("predict_image", self.rpc_predict_image, heavy=True)
+        self.register_method("predict_batch", self.rpc_predict_batch, heavy=True)
+        self.register_method("predict_stream_open", self.rpc_predict_stream_open)
+        self.register_method("predict_stream_chunk", self.rpc_predict_stream_chunk, heavy=True)
+        self.register_method("predict_stream_close", self.rpc_predict_stream_close)
+
+    @property
+    def modelo(self):
+        """Modelo padrão do registro (None se nenhum estiver carregado)"""
+        entry = self.models.get()
+        return entry.model if entry else None
+    
+    @property
+    def model_status(self):
+        """'ready', 'loading', 'error' ou 'not_loaded' (modelo padrão)"""
+        if self.models.get() is not None:
+            return 'ready'
+        if self.loading_models:
+            return 'loading'
+        if self.model_load_error:
+            return 'error'
+        return 'not_loaded'
+    
+    @property
+    def modelo_path(self):
+        entry = self.models.get()
+        return entry.path if entry else None
+    
+    @property
+    def modelo_info(self):
+        entry = self.models.get()
+        return entry.info if entry else {}
 
     def set_log_callback(self, callback):
         """Define callback para logging na GUI"""
@@ -77,6 +197,8 @@ class IdentyFireRPCServer(RPCServerBase):
         log_message = f"[{timestamp}] {message}"
         if self.log_callback:
             self.log_callback(log_message)
+        if self.log_sink:
+            self.log_sink.write(log_message)
         print(log_message)
     
     # ====================================================================
@@ -102,27 +224,72 @@ class IdentyFireRPCServer(RPCServerBase):
         model_path = os.path.join(models_dir, default_model)
         return self.load_model_by_path(model_path)
     
-    def load_model_by_path(self, model_path):
+    def load_model_by_path(self, model_path, name=None, make_default=True):
+        """
+        Carrega, aquece e publica um modelo no registro.
+        Requisições em andamento terminam no modelo anterior. O cache é limpo
+        ao publicar: a chave já inclui a geração do modelo, mas as entradas da
+        geração antiga nunca mais seriam lidas e só ocupariam a memória do LRU.
+        """
+        name = name or os.path.basename(model_path)
         self.log(f"Carregando modelo: {model_path}")
-        model, error = load_model(model_path)
+        load_start = time.perf_counter()
+        self.loading_models.add(name)
+        try:
+            entry, error = self.models.load(name, model_path, make_default=make_default)
+        finally:
+            self.loading_models.discard(name)
         
         if error:
+            self.model_load_error = error
             self.log(f"✗ Erro: {error}")
             return False
         
-        self.modelo = model
-        self.modelo_path = model_path
-        self.modelo_info = get_model_info(model)
-        
-        self.log(f"✓ Modelo carregado: {os.path.basename(model_path)}")
+        self.model_load_error = None
+        self.prediction_cache.clear()
+        elapsed = time.perf_counter() - load_start
+        self.log(f"✓ Modelo carregado e aquecido: {name} ({elapsed:.1f}s, geração {entry.generation})")
         return True
     
-    def get_current_model_info_dict(self):
-        if not self.modelo:
+    def _slot_for(self, client_id):
+        """Slot ocupado pelo cliente (0 se não for dono, ex.: modo distribuído)"""
+        slot = self.mutex.slot_of(client_id)
+        return slot if slot is not None else 0
+
+    def _batcher_for(self, client_id):
+        """Worker de inferência do slot ocupado pelo cliente"""
+        return self.batchers[self._slot_for(client_id)]
+
+    def _infer_tensor(self, entry, batch_array, client_id):
+        """Executa um tensor já montado no worker do slot do cliente, com a cópia do modelo desse slot"""
+        slot = self._slot_for(client_id)
+        return self.batchers[slot].submit_tensor(batch_array, entry.replica(slot)).result()
+
+    def _batching_stats(self):
+        """Estatísticas somadas dos workers de todos os slots"""
+        batches = sum(b.batches_run for b in self.batchers)
+        images = sum(b.items_run for b in self.batchers)
+        return {
+            'workers': len(self.batchers),
+            'batches': batches,
+            'images': images,
+            'avg_batch_size': images / batches if batches else 0
+        }
+
+    def _predict_tensor(self, batch_array, model):
+        """Executa um modelo do registro sobre um tensor (N, H, W, 3)"""
+        if model is None:
+            raise RuntimeError('Model not loaded')
+        return model.predict(batch_array, verbose=0)
+
+    def get_current_model_info_dict(self, name=None):
+        entry = self.models.get(name)
+        if entry is None:
             return None
         return {
-            'name': os.path.basename(self.modelo_path) if self.modelo_path else 'Unknown',
-            'info': self.modelo_info,
+            'name': entry.name,
+            'info': entry.info,
+            'generation': entry.generation,
             'loaded': True
         }
 
@@ -132,30 +299,57 @@ class IdentyFireRPCServer(RPCServerBase):
 
     def rpc_health_check(self, params):
         uptime = None
-        if self.stats['server_start_time']:
-            uptime_seconds = (datetime.now() - self.stats['server_start_time']).total_seconds()
+        if self.server_start_time:
+            uptime_seconds = (datetime.now() - self.server_start_time).total_seconds()
             uptime = f"{int(uptime_seconds // 3600)}h {int((uptime_seconds % 3600) // 60)}m"
         
+        mutex_state = self.mutex.snapshot()
+        counters = self.metrics.counters()
+        events = self.mutex_events
+        
         return {
             'status': 'online',
             'model_loaded': self.modelo is not None,
-            'model_name': os.path.basename(self.modelo_path) if self.modelo_path else None,
+            'model_status': self.model_status,
+            'models_loading': sorted(self.loading_models),
+            'model_name': self.models.default_name,
+            'loaded_models': [entry['name'] for entry in self.models.list_loaded()],
             'uptime': uptime,
-            'mutex_locked': self.mutex.locked,
-            'mutex_owner': self.mutex.owner_id,
+            'mutex_locked': mutex_state['locked'],
+            'mutex_owner': mutex_state['owner_id'],
+            'mutex_queue_length': mutex_state['queue_length'],
+            'mutex_slots': mutex_state['slots'],
+            'mutex_slots_in_use': mutex_state['slots_in_use'],
+            'mutex_mode': self.mutex_mode,
+            'mutex_journal': events.journal.path if events else None,
+            'capabilities': PROTOCOL_CAPABILITIES + ['stream_batch'],
+            'batching': self._batching_stats() if self.batching_enabled else None,
+            'cache': self.prediction_cache.get_stats() if self.cache_enabled else None,
             'stats': {
-                'total_requests': self.stats['requests_total'],
-                'fires_detected': self.stats['fires_detected']
+                'total_requests': counters.get('requests_total', 0),
+                'fires_detected': counters.get('fires_detected', 0)
             }
         }
 
+    def rpc_get_metrics(self, params):
+        """Contadores, percentis de latência (p50/p95/p99) por estágio e vazão"""
+        metrics = self.metrics.snapshot()
+        metrics['success'] = True
+        metrics['mutex'] = self.mutex.snapshot()
+        if self.batching_enabled:
+            metrics['batching'] = self._batching_stats()
+        if self.cache_enabled:
+            metrics['cache'] = self.prediction_cache.get_stats()
+        return metrics
+
     def rpc_list_models(self, params):
         self.log("📋 RPC: Listar modelos")
         models = self.scan_available_models()
-        return {'success': True, 'models': models, 'total': len(models)}
+        return {'success': True, 'models': models, 'total': len(models),
+                'loaded': self.models.list_loaded()}
 
     def rpc_current_model(self, params):
-        info = self.get_current_model_info_dict()
+        info = self.get_current_model_info_dict(params.get('model'))
         if info:
             return {'success': True, 'model': info}
         return {'success': False, 'message': 'Nenhum modelo carregado'}
@@ -178,30 +372,129 @@ class IdentyFireRPCServer(RPCServerBase):
         if not os.path.exists(model_path):
             return {'success': False, 'error': 'File not found'}
             
-        if self.load_model_by_path(model_path):
-            return {'success': True, 'model': self.get_current_model_info_dict()}
+        # 'name' permite manter várias versões; 'make_default': false carrega em standby
+        name = params.get('name') or os.path.basename(model_path)
+        make_default = params.get('make_default', True)
+        if self.load_model_by_path(model_path, name=name, make_default=make_default):
+            return {'success': True, 'model': self.get_current_model_info_dict(name)}
         return {'success': False, 'error': 'Failed to load model'}
 
+    def rpc_unload_model(self, params):
+        name = params.get('name')
+        if not name:
+            return {'success': False, 'error': 'No model name provided'}
+        if not self.models.unload(name):
+            return {'success': False, 'error': f"Model '{name}' not loaded"}
+        self.log(f"⏏ RPC: Modelo '{name}' descarregado")
+        return {'success': True, 'default': self.models.default_name}
+
     def rpc_mutex_acquire(self, params):
-        """Predição de uma única imagem (Base64)"""
+        """
+        Solicita o lock da GPU.
+        Com 'wait': true a requisição fica aberta (long-poll) até o lock ser
+        concedido ou 'timeout' segundos passarem (limitado por max_wait_seconds).
+        'priority' escolhe a classe (critical/normal/bulk); 'max_hold_seconds' e
+        'image_quota' podem apertar os limites da classe para esta concessão.
+        """
         client_id = params.get('client_id')
         if not client_id:
             return {'success': False, 'error': 'Missing client_id'}
-            
-        granted, status, position = self.mutex.request_access(client_id)
         
+        request = {
+            'priority': params.get('priority'),
+            'max_hold_seconds': params.get('max_hold_seconds'),
+            'image_quota': params.get('image_quota')
+        }
+        try:
+            if params.get('wait'):
+                wait_timeout = min(float(params.get('timeout', self.mutex_max_wait)), self.mutex_max_wait)
+                granted, status, position = self.mutex.wait_for_access(client_id, wait_timeout, **request)
+            else:
+                granted, status, position = self.mutex.request_access(client_id, **request)
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
+        
+        grant = None
         if status == "GRANTED":
-            self.log(f"🔒 Mutex CONCEDIDO para: {client_id}")
+            grant = self.mutex.grant_info(client_id)
+        if grant:
+            self.log(f"🔒 Mutex CONCEDIDO para: {client_id} (slot {grant['slot']}, {grant['priority']})")
         
-        import time
         server_timestamp = int(time.time() * 1000)  # Timestamp em milissegundos
         
-        return {
+        response = {
             'success': True, 
             'status': status, 
             'queue_position': position,
-            'server_timestamp': server_timestamp
+            'slot': grant['slot'] if grant else None,
+            'slots': self.mutex.slots,
+            'server_timestamp': server_timestamp,
+            'long_poll': True
         }
+        if grant:
+            response['priority'] = grant['priority']
+            response['max_hold_seconds'] = grant['max_hold_seconds']
+            response['image_quota'] = grant['image_quota']
+            response['lease_seconds'] = grant['lease_seconds']
+        return response
+
+    def _mutex_denial(self, client_id, images, ra_grant=None):
+        """Mensagem de erro se o cliente não pode usar a CS agora (None = liberado)"""
+        if self.mutex_mode == 'distributed' and ra_grant is not None:
+            return self._ra_denial(client_id, ra_grant)
+        if not client_id:
+            return 'Mutex Violation - Acquire lock first'
+        allowed, reason = self.mutex.authorize(client_id, images)
+        if allowed:
+            return None
+        if reason == 'quota_exceeded':
+            return 'Image quota exceeded for this grant - send fewer images or release and reacquire'
+        return 'Mutex Violation - Acquire lock first'
+
+    def _mutex_finish(self, client_id, ra_grant=None):
+        """Fim do pedido liberado por _mutex_denial (cota zerada devolve o slot só agora)"""
+        if self.mutex_mode == 'distributed' and ra_grant is not None:
+            return
+        self.mutex.finish(client_id)
+
+    def _ra_denial(self, client_id, ra_grant):
+        """
+        Valida a concessão Ricart-Agrawala apresentada pelo par.
+        O RA concede a CS em ordem total de (request_ts, peer): uma concessão
+        anterior à mais recente já vista é de um dono que já deveria ter saído.
+        """
+        try:
+            token = (int(ra_grant['request_ts']), str(ra_grant['peer']))
+        except (KeyError, TypeError, ValueError):
+            return 'Invalid Ricart-Agrawala grant'
+        if token[1] != client_id:
+            return 'Ricart-Agrawala grant belongs to another peer'
+        with self._ra_lock:
+            if self._ra_latest_grant is not None and token < self._ra_latest_grant:
+                return 'Stale Ricart-Agrawala grant - a newer grant is already in use'
+            self._ra_latest_grant = token
+        return None
+
+    def _on_mutex_grant(self, client_id, waited, priority):
+        """Tempo na fila do mutex: geral e por classe de prioridade (SLOs)"""
+        self.metrics.observe('mutex_wait', waited)
+        self.metrics.observe(f'mutex_wait:{priority}', waited)
+        self.metrics.incr(f'mutex_grants:{priority}')
+
+    def _on_lease_expired(self, client_id, reason):
+        """Slot retomado pelo coordenador (chamado com o estado do mutex travado)"""
+        self.metrics.incr(f'mutex_{reason}')
+        events = self.mutex_events
+        if events:
+            events.log_lease_expired(client_id, server_timestamp=int(time.time() * 1000))
+        self.log(f"⌛ Lease de {client_id} encerrado ({reason}) - slot devolvido à fila")
+
+    def rpc_mutex_heartbeat(self, params):
+        """Renova o lease do dono do lock (chamada leve, sem long-poll)"""
+        alive, lease_left = self.mutex.heartbeat(params.get('client_id'))
+        if not alive:
+            return {'success': False, 'error': 'Lease expired or not owner'}
+        return {'success': True, 'lease_seconds': lease_left}
 
     def rpc_mutex_release(self, params):
         client_id = params.get('client_id')
@@ -211,186 +504,403 @@ class IdentyFireRPCServer(RPCServerBase):
         return {'success': success}
 
     def rpc_predict_image(self, params):
-        """Predição de uma única imagem (Base64)"""
-        self.stats['requests_total'] += 1
+        """Predição de uma única imagem (anexo binário ou Base64)"""
+        self.metrics.incr('requests_total')
         
-        # 1. Verificar Mutex
+        # 1. Verificar Mutex (e consumir a cota de imagens da concessão)
         client_id = params.get('client_id')
-        if not client_id or not self.mutex.check_permission(client_id):
+        denial = self._mutex_denial(client_id, 1, params.get('ra_grant'))
+        if denial:
             self.log(f"🚫 Acesso negado (Mutex) ao cliente {client_id}")
-            self.stats['requests_error'] += 1
-            return {'success': False, 'error': 'Mutex Violation - Acquire lock first'}
+            self.metrics.incr('requests_error')
+            return {'success': False, 'error': denial}
 
-        # 2. Verificar Modelo
-        if self.modelo is None:
-            self.stats['requests_error'] += 1
-            return {'success': False, 'error': 'Model not loaded'}
+        # 2. Reservar o modelo (o pedido pode escolher um pelo nome)
+        try:
+            with self.models.acquire(params.get('model')) as entry:
+                if entry is None:
+                    self.metrics.incr('requests_error')
+                    return {'success': False, 'error': self._missing_model_error(params.get('model'))}
+                
+                result = self._predict_single(entry, params)
+                if result['success']:
+                    result['model'] = entry.name
+                return result
+        finally:
+            self._mutex_finish(client_id, params.get('ra_grant'))
 
-        # 3. Processar Imagem
+    def _predict_single(self, entry, params):
+        """Pré-processa e classifica uma imagem com o modelo reservado"""
         try:
-            image_b64 = params.get('image_b64')
+            image_bytes = extract_image_bytes(params)
             filename = params.get('filename', 'unknown.jpg')
             
-            if not image_b64:
+            if not image_bytes:
                 return {'success': False, 'error': 'No image data'}
-
-            image_bytes = base64_to_image(image_b64)
             
             # Validação de tamanho
             max_size_mb = self.config['server'].get('max_image_size_mb', 10)
             if bytes_to_mb(len(image_bytes)) > max_size_mb:
                 return {'success': False, 'error': 'File too large'}
 
-            # Pre-processamento
             img_config = self.config['model']
-            processed_image, error = process_image_from_bytes(
-                image_bytes,
-                img_config['img_width'],
-                img_config['img_height']
-            )
+            threshold = img_config.get('prediction_threshold', 0.5)
+            
+            # Cache: quadro idêntico já avaliado por este modelo
+            cache_key = None
+            if self.cache_enabled:
+                cache_key = PredictionCache.make_key(image_bytes, entry.model_id, threshold)
+                cached_score = self.prediction_cache.get(cache_key)
+                if cached_score is not None:
+                    result = build_prediction_result(cached_score, threshold)
+                    result['cached'] = True
+                    self._record_prediction(result, filename, cached=True)
+                    return result
+
+            # Pre-processamento (anunciado ao worker do slot, que espera esta imagem para o lote)
+            client_id = params.get('client_id')
+            slot = self._slot_for(client_id)
+            batcher = self.batchers[slot] if self.batching_enabled else None
+            if batcher:
+                batcher.expect()
+            try:
+                with self.metrics.timer('decode'):
+                    processed_image, error = process_image_from_bytes(
+                        image_bytes,
+                        img_config['img_width'],
+                        img_config['img_height']
+                    )
+            except Exception:
+                if batcher:
+                    batcher.cancel_expected()
+                raise
             
             if error:
-                self.stats['requests_error'] += 1
+                if batcher:
+                    batcher.cancel_expected()
+                self.metrics.incr('requests_error')
                 return {'success': False, 'error': f'Processing failed: {error}'}
 
-            # Predição
-            threshold = img_config.get('prediction_threshold', 0.5)
-            result = make_prediction(self.modelo, processed_image, threshold)
+            # Predição no worker do slot (agrupada via micro-batching quando habilitado)
+            try:
+                if batcher:
+                    score = batcher.submit(processed_image[0], entry.replica(slot), expected=True).result()
+                else:
+                    score = float(self._infer_tensor(entry, processed_image, client_id)[0][0])
+                result = build_prediction_result(score, threshold)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
             
             if result['success']:
-                self.stats['requests_success'] += 1
-                if result['fire_detected']:
-                    self.stats['fires_detected'] += 1
-                    status = "🔥 FIRE"
-                else:
-                    self.stats['no_fire'] += 1
-                    status = "✅ SAFE"
-                
-                self.log(f"{status} - {filename} ({result['confidence']:.1f}%)")
+                if cache_key is not None:
+                    self.prediction_cache.put(cache_key, result['raw_score'])
+                self._record_prediction(result, filename)
             else:
-                self.stats['requests_error'] += 1
+                self.metrics.incr('requests_error')
 
             return result
 
         except Exception as e:
-            self.stats['requests_error'] += 1
+            self.metrics.incr('requests_error')
             return {'success': False, 'error': str(e)}
 
-    def rpc_predict_batch(self, params):
-        """Predição em lote otimizada"""
-        if self.modelo is None:
-            return {'success': False, 'error': 'Model not loaded'}
+    def _missing_model_error(self, name):
+        if name in self.loading_models or (not name and self.model_status == 'loading'):
+            return 'Model loading - try again shortly'
+        if name:
+            return f"Model '{name}' not loaded"
+        return 'Model not loaded'
 
-        # 1. Verificar Mutex
-        client_id = params.get('client_id')
-        if not client_id or not self.mutex.check_permission(client_id):
-            return {'success': False, 'error': 'Mutex Violation'}
+    def _record_prediction(self, result, filename, cached=False):
+        """Atualiza estatísticas e log de uma predição bem-sucedida"""
+        self.metrics.incr('requests_success')
+        if cached:
+            self.metrics.incr('cache_hits')
+        if result['fire_detected']:
+            self.metrics.incr('fires_detected')
+            status = "🔥 FIRE"
+        else:
+            self.metrics.incr('no_fire')
+            status = "✅ SAFE"
+        
+        origin = " [cache]" if cached else ""
+        self.log(f"{status} - {filename} ({result['confidence']:.1f}%){origin}")
 
-        images_list = params.get('images', []) # Lista de dicts {filename, image_b64}
+    def rpc_predict_batch(self, params):
+        """Predição em lote otimizada"""
+        images_list = params.get('images', []) # Lista de dicts {filename, image_bytes | image_b64}
         if not images_list:
             return {'success': False, 'error': 'No images provided'}
 
+        # 1. Verificar Mutex (e consumir a cota de imagens da concessão)
+        client_id = params.get('client_id')
+        denial = self._mutex_denial(client_id, len(images_list), params.get('ra_grant'))
+        if denial:
+            return {'success': False, 'error': denial}
+
         try:
-            import numpy as np
-            
             self.log(f"📦 Batch RPC: {len(images_list)} imagens")
+            response = self._predict_images(images_list, params.get('model'), client_id)
+            if response['success']:
+                self.log(f"✅ Batch Finalizado. Fogos: {response['fires_detected']}/{len(response['results'])} "
+                         f"(decode: {response['timing']['decode_ms']:.0f} ms, "
+                         f"inferência: {response['timing']['inference_ms']:.0f} ms)")
+            return response
+
+        except Exception as e:
+            self.log(f"✗ Erro Fatal no Batch: {e}")
+            return {'success': False, 'error': str(e)}
+        finally:
+            self._mutex_finish(client_id, params.get('ra_grant'))
+
+    def _predict_images(self, images_list, model_name=None, client_id=None):
+        """Decodifica e classifica uma lista de imagens em um único model.predict"""
+        with self.models.acquire(model_name) as entry:
+            if entry is None:
+                return {'success': False, 'error': self._missing_model_error(model_name)}
+            response = self._predict_images_with(entry, images_list, client_id)
+            response['model'] = entry.name
+            return response
+
+    def _predict_images_with(self, entry, images_list, client_id=None):
+        img_config = self.config['model']
+        threshold = img_config.get('prediction_threshold', 0.5)
+        
+        images_bytes = []
+        candidates = []
+        errors = []
+        
+        for item in images_list:
+            fname = item.get('filename', 'unknown')
             
-            img_config = self.config['model']
-            threshold = img_config.get('prediction_threshold', 0.5)
-            
-            processed_images = []
-            filenames = []
-            errors = []
-            
-            # Processamento
-            for item in images_list:
-                fname = item.get('filename', 'unknown')
-                b64 = item.get('image_b64')
-                
-                try:
-                    img_bytes = base64_to_image(b64)
-                    proc_img, err = process_image_from_bytes(
-                        img_bytes, img_config['img_width'], img_config['img_height']
-                    )
-                    
-                    if err:
-                        errors.append({'filename': fname, 'error': err})
-                    else:
-                        processed_images.append(proc_img[0]) # Remove dimensão extra (1, W, H, C)
-                        filenames.append(fname)
-                except Exception as e:
-                    errors.append({'filename': fname, 'error': str(e)})
-
-            if not processed_images:
-                return {'success': False, 'error': 'No valid images in batch', 'errors': errors}
-
-            # Predição na GPU (Batch único)
-            batch_array = np.array(processed_images)
-            self.log(f"🚀 Enviando tensor {batch_array.shape} para GPU...")
-            predictions = self.modelo.predict(batch_array, verbose=0)
-            
-            results = []
-            fire_count = 0
+            try:
+                img_bytes = extract_image_bytes(item)
+                if not img_bytes:
+                    errors.append({'filename': fname, 'error': 'No image data'})
+                    continue
+                images_bytes.append(img_bytes)
+                candidates.append(fname)
+            except Exception as e:
+                errors.append({'filename': fname, 'error': str(e)})
+
+        # Processamento: decodifica (em paralelo) direto no tensor float32 do lote
+        decode_start = time.perf_counter()
+        batch_array, valid_indices, decode_errors = preprocess_images_parallel(
+            images_bytes, img_config['img_width'], img_config['img_height'],
+            self.decode_executor
+        )
+        decode_ms = (time.perf_counter() - decode_start) * 1000
+        filenames = [candidates[i] for i in valid_indices]
+        for idx, err in decode_errors:
+            errors.append({'filename': candidates[idx], 'error': err})
+
+        if not filenames:
+            return {'success': False, 'error': 'No valid images in batch', 'errors': errors}
+
+        # Predição na GPU (Batch único, no worker do slot do cliente)
+        self.log(f"🚀 Enviando tensor {batch_array.shape} para GPU...")
+        inference_start = time.perf_counter()
+        predictions = self._infer_tensor(entry, batch_array, client_id)
+        inference_ms = (time.perf_counter() - inference_start) * 1000
+        
+        results = []
+        fire_count = 0
+        
+        for i, pred in enumerate(predictions):
+            score = float(pred[0])
+            is_fire = score > threshold
+            conf = score if is_fire else 1 - score
             
-            for i, pred in enumerate(predictions):
-                score = float(pred[0])
-                is_fire = score > threshold
-                conf = score if is_fire else 1 - score
-                
-                if is_fire: fire_count += 1
-                
-                results.append({
-                    'filename': filenames[i],
-                    'fire_detected': is_fire,
-                    'confidence': round(conf * 100, 2),
-                    'raw_prediction': score
-                })
-
-            # Atualizar stats globais
-            self.stats['requests_total'] += len(results)
-            self.stats['requests_success'] += len(results)
-            self.stats['fires_detected'] += fire_count
-            self.stats['no_fire'] += (len(results) - fire_count)
-
-            self.log(f"✅ Batch Finalizado. Fogos: {fire_count}/{len(results)}")
+            if is_fire: fire_count += 1
             
-            return {
-                'success': True,
-                'results': results,
-                'errors': errors,
-                'fires_detected': fire_count
+            results.append({
+                'filename': filenames[i],
+                'fire_detected': is_fire,
+                'confidence': round(conf * 100, 2),
+                'raw_prediction': score
+            })
+
+        # Atualizar métricas globais
+        self.metrics.incr('requests_total', len(results))
+        self.metrics.incr('requests_success', len(results))
+        self.metrics.incr('fires_detected', fire_count)
+        self.metrics.incr('no_fire', len(results) - fire_count)
+        self.metrics.incr('batch_images', len(results))
+        self.metrics.observe('decode', decode_ms / 1000)
+
+        return {
+            'success': True,
+            'results': results,
+            'errors': errors,
+            'fires_detected': fire_count,
+            'timing': {
+                'decode_ms': round(decode_ms, 2),
+                'inference_ms': round(inference_ms, 2)
+            }
+        }
+
+    # ====================================================================
+    # LOTE EM STREAMING (predict_stream_open / _chunk / _close)
+    # ====================================================================
+
+    def rpc_predict_stream_open(self, params):
+        """Abre um lote em streaming: o cliente envia as imagens em blocos"""
+        client_id = params.get('client_id')
+        denial = self._mutex_denial(client_id, 0, params.get('ra_grant'))
+        if denial:
+            return {'success': False, 'error': denial}
+        
+        stream_id = uuid.uuid4().hex
+        now = time.time()
+        with self.streams_lock:
+            # Descarta streams abandonados (cliente caiu sem fechar)
+            for sid in [sid for sid, st in self.streams.items()
+                        if now - st['last_activity'] > self.STREAM_IDLE_SECONDS]:
+                del self.streams[sid]
+            self.streams[stream_id] = {
+                'client_id': client_id,
+                'model': params.get('model'),
+                'images': 0,
+                'fires': 0,
+                'errors': 0,
+                'chunks': 0,
+                'started': now,
+                'last_activity': now
             }
+        
+        self.log(f"📡 Stream de lote aberto por {client_id} ({stream_id[:8]})")
+        return {'success': True, 'stream_id': stream_id}
 
+    def rpc_predict_stream_chunk(self, params):
+        """Classifica um bloco do stream e devolve os resultados desse bloco"""
+        stream_id = params.get('stream_id')
+        with self.streams_lock:
+            stream = self.streams.get(stream_id)
+        if stream is None:
+            return {'success': False, 'error': 'Unknown stream'}
+        
+        client_id = params.get('client_id')
+        if client_id != stream['client_id']:
+            return {'success': False, 'error': 'Mutex Violation', 'seq': params.get('seq')}
+        denial = self._mutex_denial(client_id, len(params.get('images', [])), params.get('ra_grant'))
+        if denial:
+            return {'success': False, 'error': denial, 'seq': params.get('seq')}
+        try:
+            response = self._predict_images(params.get('images', []), stream['model'], client_id)
         except Exception as e:
-            self.log(f"✗ Erro Fatal no Batch: {e}")
-            return {'success': False, 'error': str(e)}
+            response = {'success': False, 'error': str(e)}
+        finally:
+            self._mutex_finish(client_id, params.get('ra_grant'))
+        response['seq'] = params.get('seq')
+        
+        with self.streams_lock:
+            stream['chunks'] += 1
+            stream['images'] += len(response.get('results', []))
+            stream['fires'] += response.get('fires_detected', 0)
+            stream['errors'] += len(response.get('errors', []))
+            stream['last_activity'] = time.time()
+        return response
+
+    def rpc_predict_stream_close(self, params):
+        """Fecha o stream e retorna o resumo do lote"""
+        with self.streams_lock:
+            stream = self.streams.pop(params.get('stream_id'), None)
+        if stream is None:
+            return {'success': False, 'error': 'Unknown stream'}
+        
+        elapsed = time.time() - stream['started']
+        self.log(f"✅ Stream finalizado: {stream['images']} imagens em {stream['chunks']} blocos, "
+                 f"fogos: {stream['fires']} ({elapsed:.1f}s)")
+        return {
+            'success': True,
+            'images': stream['images'],
+            'fires_detected': stream['fires'],
+            'errors': stream['errors'],
+            'chunks': stream['chunks'],
+            'elapsed_seconds': round(elapsed, 3)
+        }
 
     # ====================================================================
     # CONTROLE DE SERVIDOR
     # ====================================================================
 
+    def _open_file_sinks(self):
+        """Abre os arquivos de log do config (só ao iniciar; construir o objeto não cria arquivos)"""
+        logging_config = self.config.get('logging', {})
+        if self.log_sink is None and logging_config.get('save_logs', False) and logging_config.get('log_file'):
+            self.log_sink = AsyncFileLogSink(resolve_project_path(logging_config['log_file']))
+        journal = logging_config.get('mutex_journal')
+        if self.mutex_events is None and journal:
+            # Um arquivo por execução: reinícios e instâncias simultâneas não se sobrescrevem
+            stem, ext = os.path.splitext(resolve_project_path(journal))
+            path = f"{stem}_{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}{ext or '.evj'}"
+            self.mutex_events = MutexEventLogger('server', journal_path=path)
+
+    def start(self):
+        self._open_file_sinks()
+        super().start()
+
     def start_server_wrapper(self, host, port):
         """Wrapper para iniciar o servidor com parâmetros da GUI"""
         self.host = host
         self.port = port
-        self.stats['server_start_time'] = datetime.now()
+        self.server_start_time = datetime.now()
+        # Antes do banner, para que ele também vá para o arquivo
+        self._open_file_sinks()
         
         self.log("=" * 60)
         self.log("SERVIDOR IDENTYFIRE RPC (TCP SOCKETS) INICIADO")
         self.log("=" * 60)
-        self.log(f"🌐 Escutando em: {host}:{port}")
+        self.log(f"🌐 Escutando em: {host}:{port} (motor: {self.engine})")
+        self.log(f"🔒 Slots de inferência (mutex): {self.mutex.slots}")
+        if self.mutex_events:
+            self.log(f"📒 Journal do mutex: {self.mutex_events.journal.path}")
         self.log(f"📁 Diretório de modelos: {self.config['server']['models_directory']}")
+        self.log(f"⚙ Backend de inferência: {self.config['model'].get('backend', 'keras')}")
         
-        # Carregamento inicial
+        # Carregamento inicial em segundo plano: o servidor aceita conexões
+        # (health_check responde 'loading') enquanto o TensorFlow e o modelo carregam
         self.scan_available_models()
-        if self.load_default_model():
-            self.log(f"✓ Modelo padrão carregado")
+        default_model = self.config['server'].get('default_model')
+        if self.config['server'].get('auto_load_default', False) and default_model:
+            self.loading_models.add(default_model)
+            threading.Thread(target=self._load_default_model_background,
+                             daemon=True, name='model-loader').start()
         else:
             self.log("⚠ Nenhum modelo carregado - aguardando cliente")
             
+        # Leases vencidos são retomados na hora por uma thread própria
+        self.mutex.start_reaper()
+        
         # Inicia loop principal do socket (herdado de RPCServerBase)
         self.start() 
 
+    def _load_default_model_background(self):
+        try:
+            if self.load_default_model():
+                self.log(f"✓ Modelo padrão carregado")
+            else:
+                self.log("⚠ Modelo padrão não carregado - aguardando cliente")
+        finally:
+            self.loading_models.discard(self.config['server'].get('default_model'))
+
+    def stop(self):
+        super().stop()
+        if self.log_sink:
+            self.log_sink.close()  # grava o que ainda estiver na fila
+            self.log_sink = None
+        self.mutex.stop_reaper()
+        # Handlers ainda em andamento podem expirar leases: o journal é retirado
+        # sob o lock do mutex (o mesmo de _on_lease_expired) antes de ser fechado
+        with self.mutex._cond:
+            events, self.mutex_events = self.mutex_events, None
+        if events:
+            events.close()
+        for batcher in self.batchers:
+            batcher.stop()
+        if self.decode_executor:
+            self.decode_executor.shutdown(wait=False)
+
 class ServerGUI:
     """Interface gráfica do servidor (Painel de Monitoramento)"""
     
@@ -398,7 +908,11 @@ class ServerGUI:
         self.master = master
         # Instancia o servidor RPC mas não inicia ainda
         self.server = IdentyFireRPCServer() 
-        self.server.set_log_callback(self.log_to_console)
+        
+        # Threads do servidor só enfileiram; o loop do Tk insere em lotes
+        self.max_logs = self.server.config.get('logging', {}).get('max_logs', 1000)
+        self.log_buffer = LogRingBuffer(capacity=self.max_logs)
+        self.server.set_log_callback(self.log_buffer.append)
         
         self.server_thread = None
         self.server_running = False
@@ -410,6 +924,7 @@ class ServerGUI:
         
         self.setup_ui()
         self.update_stats_loop()
+        self.drain_logs_loop()
     
     def setup_ui(self):
         # ==================== CONFIGURAÇÃO ====================
@@ -469,8 +984,22 @@ class ServerGUI:
         tk.Button(log_frame, text="Limpar", command=lambda: self.console.delete(1.0, tk.END)).pack()
 
     def log_to_console(self, message):
-        self.console.insert(tk.END, message + "\n")
-        self.console.see(tk.END)
+        """Log direto no console (apenas na thread do Tk)"""
+        self.log_buffer.append(message)
+
+    def drain_logs_loop(self):
+        """Insere no console, de uma vez, as linhas acumuladas desde o último ciclo"""
+        lines, dropped = self.log_buffer.drain()
+        if dropped:
+            lines.insert(0, f"... {dropped} linha(s) de log descartada(s) (buffer cheio)")
+        if lines:
+            self.console.insert(tk.END, "\n".join(lines) + "\n")
+            # Mantém no máximo max_logs linhas no widget
+            total_lines = int(self.console.index('end-1c').split('.')[0]) - 1
+            if total_lines > self.max_logs:
+                self.console.delete('1.0', f"{total_lines - self.max_logs + 1}.0")
+            self.console.see(tk.END)
+        self.master.after(100, self.drain_logs_loop)
     
     def start_server(self):
         host = self.host_entry.get()
@@ -506,10 +1035,17 @@ class ServerGUI:
             
     def update_stats_loop(self):
         if self.server_running:
-            stats = self.server.stats
-            self.label_requests.config(text=f"Requisições: {stats['requests_total']}")
-            self.label_fires.config(text=f"🔥 Fogo: {stats['fires_detected']}")
-            self.label_safe.config(text=f"✅ Seguro: {stats['no_fire']}")
+            # Snapshot agregado das métricas (nunca o estado vivo das threads)
+            snapshot = self.server.metrics.snapshot()
+            counters = snapshot['counters']
+            inference = snapshot['latency']['inference']
+            self.label_requests.config(
+                text=f"Requisições: {counters.get('requests_total', 0)} | "
+                     f"{snapshot['throughput']['recent_predictions_per_s']:.1f} pred/s | "
+                     f"inferência p95: {inference['p95_ms']:.1f} ms"
+            )
+            self.label_fires.config(text=f"🔥 Fogo: {counters.get('fires_detected', 0)}")
+            self.label_safe.config(text=f"✅ Seguro: {counters.get('no_fire', 0)}")
             
             info = self.server.get_current_model_info_dict()
             if info:
@@ -521,11 +1057,12 @@ class ServerGUI:
         
     def on_closing(self):
         if self.server_running:
-            if messagebox.askyesno("Sair", "Parar servidor e sair?"):
-                self.stop_server()
-                self.master.destroy()
-        else:
-            self.master.destroy()
+            if not messagebox.askyesno("Sair", "Parar servidor e sair?"):
+                return
+            self.stop_server()
+        if self.server.log_sink:
+            self.server.log_sink.close()  # grava o que ainda estiver na fila
+        self.master.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,154 @@
+"""
+Benchmark de inicialização
+- Tempo de import dos módulos (e se o TensorFlow foi carregado junto)
+- Servidor: tempo até aceitar conexões e até o modelo padrão ficar pronto
+Cada medição roda em um processo Python novo (sem cache de import).
+"""
+
+import os
+import sys
+import time
+import json
+import socket
+import subprocess
+
+from rpc_protocol import send_rpc_message, receive_rpc_message
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, 'tensorflow' in sys.modules)
+"""
+
+SERVER_CHILD = """
+import sys
+sys.path.insert(0, {src!r})
+import server_gui
+srv = server_gui.IdentyFireRPCServer()
+# Sem arquivos de log nem journal do mutex (saídas ficariam na cópia de trabalho)
+srv.config.setdefault('logging', {{}}).update(save_logs=False, mutex_journal=None)
+if {model!r}:
+    srv.config['server']['default_model'] = {model!r}
+    srv.config['server']['auto_load_default'] = True
+srv.start_server_wrapper('127.0.0.1', {port})
+"""
+
+
+def measure_import(module, cwd):
+    """Retorna (segundos, tensorflow_importado) do import em um processo novo"""
+    code = IMPORT_PROBE.format(module=module)
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    out = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env,
+                         capture_output=True, text=True, timeout=300)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else 'import failed')
+    seconds, tf_loaded = out.stdout.strip().splitlines()[-1].split()
+    return float(seconds), tf_loaded == 'True'
+
+
+def health_check(port, timeout=1.0):
+    with socket.create_connection(('127.0.0.1', port), timeout=timeout) as sock:
+        send_rpc_message(sock, {'method': 'health_check', 'params': {}})
+        return receive_rpc_message(sock)
+
+
+def measure_server(port, model, cwd, timeout):
+    """
+    Sobe o servidor em um processo novo e mede, a partir do spawn:
+    - accept: primeira resposta de health_check
+    - model_ready: health_check com model_status == 'ready'
+    """
+    code = SERVER_CHILD.format(src=SRC_DIR, model=model, port=port)
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', code], cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {'accept_seconds': None, 'model_ready_seconds': None, 'model_status': None}
+    try:
+        deadline = start + timeout
+        while time.perf_counter() < deadline and proc.poll() is None:
+            try:
+                health = health_check(port)
+            except OSError:
+                time.sleep(0.02)
+                continue
+            if not health:
+                time.sleep(0.02)
+                continue
+            elapsed = time.perf_counter() - start
+            if result['accept_seconds'] is None:
+                result['accept_seconds'] = elapsed
+            result['model_status'] = health.get('model_status')
+            if health.get('model_status') != 'loading':
+                if health.get('model_status') == 'ready':
+                    result['model_ready_seconds'] = elapsed
+                break
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return result
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark de inicialização')
+    parser.add_argument('--modules', nargs='+',
+                        default=['rpc_protocol', 'utils', 'mutex_tester', 'server_gui', 'client_gui'],
+                        help='Módulos cujo tempo de import é medido')
+    parser.add_argument('--runs', type=int, default=3, help='Repetições de cada medição')
+    parser.add_argument('--port', type=int, default=5099, help='Porta do servidor de teste')
+    parser.add_argument('--model', default='', help='Modelo padrão (vazio = usa o config.json)')
+    parser.add_argument('--skip-server', action='store_true', help='Mede apenas os imports')
+    parser.add_argument('--timeout', type=float, default=120, help='Limite por inicialização do servidor')
+    parser.add_argument('--output', help='Salva resultados em JSON')
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    report = {'imports': {}, 'server': []}
+
+    print("=" * 60)
+    print("BENCHMARK DE INICIALIZAÇÃO")
+    print("=" * 60)
+
+    print("\nImport (processo novo):")
+    for module in args.modules:
+        try:
+            runs = [measure_import(module, cwd) for _ in range(args.runs)]
+        except Exception as e:
+            print(f"  {module:<14} ✗ {e}")
+            continue
+        best = min(seconds for seconds, _ in runs)
+        tf_loaded = any(loaded for _, loaded in runs)
+        report['imports'][module] = {'best_seconds': best, 'tensorflow_loaded': tf_loaded}
+        print(f"  {module:<14} {best * 1000:8.1f} ms  {'(TensorFlow importado)' if tf_loaded else ''}")
+        sys.stdout.flush()
+
+    if not args.skip_server:
+        print("\nServidor (a partir do spawn):")
+        for i in range(args.runs):
+            result = measure_server(args.port, args.model, cwd, args.timeout)
+            report['server'].append(result)
+            accept = result['accept_seconds']
+            ready = result['model_ready_seconds']
+            print(f"  execução {i + 1}: aceita conexões em "
+                  f"{f'{accept:.2f}s' if accept is not None else '—'} | modelo pronto em "
+                  f"{f'{ready:.2f}s' if ready is not None else '— (' + str(result['model_status']) + ')'}")
+            sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Resultados salvos em: {args.output}")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
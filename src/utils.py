@@ -1,106 +1,1201 @@
 import os
 import json
 import time
+import queue
 import io
+import hashlib
+import heapq
+import threading
+import importlib.util
 import numpy as np
 from datetime import datetime
-from collections import deque
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
 from PIL import Image
 
-# Tenta importar TensorFlow (necessário apenas no servidor)
-try:
-    import tensorflow as tf
-    TF_AVAILABLE = True
-except ImportError:
-    TF_AVAILABLE = False
-    print("Aviso: TensorFlow não encontrado. As funções de ML não funcionarão neste ambiente.")
+# TensorFlow é importado sob demanda (get_tf): só carregar/executar modelos
+# precisa dele, e o import custa vários segundos. find_spec não importa nada.
+TF_AVAILABLE = importlib.util.find_spec('tensorflow') is not None
+TFLITE_RUNTIME_AVAILABLE = importlib.util.find_spec('tflite_runtime') is not None
+
+_tf_module = None
+_tf_import_lock = threading.Lock()
+
+def get_tf():
+    """Importa o TensorFlow na primeira chamada e o reutiliza depois"""
+    global _tf_module
+    if _tf_module is None:
+        with _tf_import_lock:
+            if _tf_module is None:
+                import tensorflow
+                _tf_module = tensorflow
+    return _tf_module
+
+def tensorflow_loaded():
+    """True se o TensorFlow já foi importado neste processo"""
+    return _tf_module is not None
 
 # ============================================================================
 # CLASSE DE EXCLUSÃO MÚTUA (REQ. SISTEMAS DISTRIBUÍDOS)
 # ============================================================================
 
+# Classes de prioridade padrão (peso = fatia relativa das concessões quando
+# há disputa; limites opcionais por concessão: tempo de posse e imagens)
+DEFAULT_PRIORITY_CLASSES = {
+    'critical': {'weight': 10, 'max_hold_seconds': None, 'image_quota': None},
+    'normal': {'weight': 3, 'max_hold_seconds': None, 'image_quota': None},
+    'bulk': {'weight': 1, 'max_hold_seconds': None, 'image_quota': None}
+}
+DEFAULT_PRIORITY = 'normal'
+
+
 class MutexManager:
     """
     Gerenciador de Exclusão Mútua Centralizada.
-    Garante que apenas um cliente utilize a GPU (Seção Crítica) por vez.
+    Garante que no máximo `slots` clientes utilizem a GPU/CPU (Seção Crítica)
+    ao mesmo tempo; com slots=1 é o mutex clássico. Cada concessão ocupa um
+    slot numerado (0..slots-1), que o servidor associa a um worker de inferência.
+    Suporta long-poll: wait_for_access bloqueia até a concessão ou timeout.
+
+    Classes de prioridade com weighted fair queueing: cada classe tem sua
+    fila FIFO e a próxima concessão vai para a classe com o menor tempo
+    virtual de início (start-time fair queueing, custo 1 por concessão).
+    Classes ociosas não acumulam crédito. Uma concessão pode ter tempo máximo
+    de posse e cota de imagens; ao estourar, o slot é liberado.
+
+    Leases: cada concessão vale lease_seconds e é renovada por qualquer
+    atividade do dono (heartbeat, predição, novo acquire). Uma thread de
+    expiração (start_reaper) acorda no próximo vencimento e devolve o slot na
+    hora, acordando quem espera em long-poll, sem depender de outro pedido.
+    Quem está na fila também precisa dar sinal de vida (polls, long-poll em
+    andamento ou heartbeat): um cliente da fila sem contato por lease_seconds
+    é removido, para que um cliente morto na cabeça não trave a fila.
+    Slots liberados vão direto para a próxima cabeça de fila (escolhida pelo
+    WFQ), sem esperar que ela volte a perguntar.
+
+    Thread-safe: todo acesso ao estado passa por uma threading.Condition.
+    Cada fila é um OrderedDict client_id -> ticket (senha sequencial), o que
+    dá pertinência, remoção da cabeça e posição na fila em O(1).
     """
-    def __init__(self, timeout_seconds=30):
-        self.locked = False
-        self.owner_id = None
-        self.queue = deque()  # Fila FIFO para garantir justiça (fairness)
-        self.last_activity = 0
+    def __init__(self, timeout_seconds=30, verbose=True, on_grant=None, slots=1, classes=None,
+                 lease_seconds=None, on_expire=None):
+        self.slots = max(1, int(slots))
+        self.lease_seconds = float(lease_seconds or timeout_seconds)
+        self.on_expire = on_expire  # on_expire(client_id, motivo) ao retomar um slot
+        self._reaper = None
+        self._reaper_wake = threading.Event()
+        self._reaper_stop = threading.Event()
+        self.owners = {}  # client_id -> slot ocupado
+        self.last_activity = {}  # client_id -> última atividade do dono
+        self._grants = {}  # client_id -> classe, instante, limites da concessão
+        self._free_slots = list(range(self.slots))  # heap: menor slot livre primeiro
+        self.classes = {}
+        for name, spec in (classes or DEFAULT_PRIORITY_CLASSES).items():
+            self.classes[name] = dict(DEFAULT_PRIORITY_CLASSES.get(name, {}), **spec)
+            self.classes[name]['weight'] = float(self.classes[name].get('weight') or 1)
+        self.default_priority = DEFAULT_PRIORITY if DEFAULT_PRIORITY in self.classes else next(iter(self.classes))
+        # Filas FIFO por classe (client_id -> ticket) para garantir justiça dentro da classe
+        self.queues = {name: OrderedDict() for name in self.classes}
+        self._next_ticket = {name: 0 for name in self.classes}
+        self._queued_class = {}  # client_id -> classe em que está na fila
+        self._virtual_time = 0.0
+        self._virtual_finish = {name: 0.0 for name in self.classes}
+        self._enqueued_at = {}  # client_id -> instante em que entrou na fila
+        self._last_seen = {}  # client_id na fila -> último contato (poll/heartbeat)
+        self._polling = {}  # client_id -> long-polls em andamento (vivo enquanto espera)
+        self._queued_limits = {}  # client_id na fila -> (max_hold_seconds, image_quota) pedidos
+        self._stale_check_at = 0.0  # antes disso nenhum cliente da fila pode estar inativo
+        self.on_grant = on_grant  # on_grant(client_id, segundos_na_fila, classe)
         self.TIMEOUT_SECONDS = timeout_seconds
+        self.verbose = verbose
+        # Condição usada para acordar clientes em long-poll quando um slot muda de mãos
+        self._cond = threading.Condition()
+
+    @property
+    def locked(self):
+        """True se todos os slots estão ocupados"""
+        return len(self.owners) >= self.slots
 
-    def request_access(self, client_id):
+    @property
+    def owner_id(self):
+        """Dono mais antigo (com slots=1, o dono do lock)"""
+        return next(iter(self.owners), None)
+
+    @property
+    def queue_length(self):
+        return len(self._queued_class)
+
+    def request_access(self, client_id, priority=None, max_hold_seconds=None, image_quota=None):
         """
-        Tenta adquirir o lock.
+        Tenta adquirir um slot.
+        priority: nome da classe (padrão 'normal'); max_hold_seconds/image_quota
+        só podem reduzir os limites da classe.
         Retorna: (bool_granted, status_string, queue_position)
         """
-        current_time = time.time()
-
-        # 1. Segurança: Se o dono atual sumiu (crashou), libera o lock
-        if self.locked and (current_time - self.last_activity > self.TIMEOUT_SECONDS):
-            print(f"[MUTEX] Timeout detectado para {self.owner_id}. Liberando forçadamente.")
-            self.force_release()
-
-        # 2. Se ninguém está usando, concede acesso
-        if not self.locked:
-            # Mas só concede se a fila estiver vazia ou se ele for o primeiro da fila
-            if not self.queue or self.queue[0] == client_id:
-                if self.queue and self.queue[0] == client_id:
-                    self.queue.popleft()  # Remove da fila se estava lá
-                
-                self._grant_lock(client_id, current_time)
+        with self._cond:
+            current_time = time.time()
+
+            # 1. Segurança: donos que sumiram (crasharam) ou estouraram limites perdem o slot
+            self._reclaim_expired(current_time)
+
+            # 2. Se já é dono (Reentrância / Renovação de lease)
+            if client_id in self.owners:
+                self.last_activity[client_id] = current_time
                 return True, "GRANTED", 0
-            
-            # Se está livre mas tem gente na fila e não é ele, entra na fila
-            if client_id not in self.queue:
-                self.queue.append(client_id)
-            return False, "QUEUED", list(self.queue).index(client_id) + 1
-
-        # 3. Se já é o dono (Reentrância / Renovação de lease)
-        if self.owner_id == client_id:
-            self.last_activity = current_time
-            return True, "GRANTED", 0
-
-        # 4. Se está ocupado por outro, coloca na fila
-        if client_id not in self.queue:
-            self.queue.append(client_id)
-        
-        return False, "QUEUED", list(self.queue).index(client_id) + 1
+
+            # Quem já está na fila mantém a classe com que entrou
+            priority = self._queued_class.get(client_id) or self._resolve_priority(priority)
+
+            # 3. Se há slot livre, concede acesso
+            if self._free_slots:
+                # Mas só ao primeiro da classe escolhida pelo WFQ (ou se não há fila)
+                next_class = self._next_class()
+                if next_class is None or self._queue_head(next_class) == client_id:
+                    if next_class is not None:
+                        self._dequeue(client_id)  # Remove da fila se estava lá
+                    
+                    self._charge(priority)
+                    self._grant_lock(client_id, current_time, priority, max_hold_seconds, image_quota)
+                    return True, "GRANTED", 0
+
+            # 4. Sem slot livre (ou outro cliente na frente): entra na fila da classe
+            return False, "QUEUED", self._enqueue(client_id, priority, max_hold_seconds, image_quota)
+
+    def wait_for_access(self, client_id, timeout, priority=None, max_hold_seconds=None, image_quota=None):
+        """
+        Long-poll: mantém a requisição aberta até um slot ser concedido
+        a client_id ou o timeout (segundos) expirar.
+        Retorna: (bool_granted, status_string, queue_position)
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            # Enquanto o long-poll está aberto o cliente conta como vivo na fila
+            self._polling[client_id] = self._polling.get(client_id, 0) + 1
+            try:
+                while True:
+                    granted, status, position = self.request_access(
+                        client_id, priority, max_hold_seconds, image_quota
+                    )
+                    remaining = deadline - time.time()
+                    if granted or remaining <= 0:
+                        return granted, status, position
+                    # Acorda na liberação/concessão, ou periodicamente para checar timeout dos donos
+                    self._cond.wait(min(remaining, self.TIMEOUT_SECONDS))
+            finally:
+                # Timeout: o ticket fica marcado com o último contato e expira
+                # em lease_seconds se o cliente não voltar
+                self._polling[client_id] -= 1
+                if not self._polling[client_id]:
+                    del self._polling[client_id]
+                if client_id in self._last_seen:
+                    self._last_seen[client_id] = time.time()
+                    self._reaper_wake.set()
+
+    def heartbeat(self, client_id):
+        """
+        Renova o lease do dono (ou o sinal de vida de quem está na fila).
+        Retorna (bool dono, segundos restantes do lease).
+        """
+        with self._cond:
+            self._reclaim_expired(time.time())
+            if client_id in self._last_seen:
+                self._last_seen[client_id] = time.time()
+            if client_id not in self.owners:
+                return False, 0.0
+            self.last_activity[client_id] = time.time()
+            return True, self.lease_seconds
+
+    def start_reaper(self):
+        """Inicia a thread que expira leases vencidos no instante do vencimento"""
+        with self._cond:
+            if self._reaper is not None:
+                return
+            self._reaper_stop.clear()
+            self._reaper = threading.Thread(target=self._reaper_loop, daemon=True, name='mutex-reaper')
+            self._reaper.start()
+
+    def stop_reaper(self):
+        reaper = self._reaper
+        if reaper is None:
+            return
+        self._reaper_stop.set()
+        self._reaper_wake.set()
+        reaper.join(timeout=5)
+        self._reaper = None
+
+    def _reaper_loop(self):
+        while not self._reaper_stop.is_set():
+            with self._cond:
+                self._reclaim_expired(time.time())
+                deadline = self._next_expiry()
+            # Acorda no próximo vencimento, ou antes se houver nova concessão
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            self._reaper_wake.wait(timeout)
+            self._reaper_wake.clear()
+
+    def _next_expiry(self):
+        deadlines = [last + self.lease_seconds for last in self.last_activity.values()]
+        deadlines.extend(last + self.lease_seconds for client_id, last in self._last_seen.items()
+                         if client_id not in self._polling)
+        for grant in self._grants.values():
+            if grant['max_hold_seconds']:
+                deadlines.append(grant['granted_at'] + grant['max_hold_seconds'])
+        return min(deadlines, default=None)
 
     def release(self, client_id):
-        """Libera o recurso se o solicitante for o dono"""
-        if self.owner_id == client_id:
-            print(f"[MUTEX] Lock liberado por {client_id}")
-            self.locked = False
-            self.owner_id = None
-            return True
-        return False
+        """Libera o slot se o solicitante for dono"""
+        with self._cond:
+            if client_id in self.owners:
+                self._log(f"[MUTEX] Lock liberado por {client_id}")
+                self._free(client_id)
+                self._advance_queue(time.time())
+                self._cond.notify_all()
+                return True
+            return False
 
     def check_permission(self, client_id):
         """Verifica se o cliente tem permissão para operar agora"""
-        if self.locked and self.owner_id == client_id:
-            self.last_activity = time.time() # Renova atividade
-            return True
-        return False
+        return self.authorize(client_id, images=0)[0]
+
+    def authorize(self, client_id, images=1):
+        """
+        Verifica a permissão e consome `images` da cota da concessão.
+        Retorna (bool, motivo) com motivo None, 'not_owner' ou 'quota_exceeded'.
+        Um pedido maior que a cota restante é recusado sem perder o slot.
+        Pedidos autorizados com images > 0 ficam em andamento até finish():
+        com a cota zerada, a concessão só termina quando o último deles acaba.
+        """
+        with self._cond:
+            current_time = time.time()
+            self._reclaim_expired(current_time)
+            if client_id not in self.owners:
+                return False, 'not_owner'
+            self.last_activity[client_id] = current_time # Renova atividade
+            grant = self._grants[client_id]
+            if grant['quota_left'] is not None and images:
+                if images > grant['quota_left']:
+                    return False, 'quota_exceeded'
+                grant['quota_left'] -= images
+            if images:
+                grant['in_flight'] += 1
+            return True, None
+
+    def finish(self, client_id):
+        """
+        Fim de um pedido autorizado com images > 0 (após a inferência).
+        Se a cota zerou e não há outro pedido em andamento, libera o slot.
+        """
+        with self._cond:
+            grant = self._grants.get(client_id)
+            if grant is None:
+                return
+            grant['in_flight'] = max(0, grant['in_flight'] - 1)
+            if grant['quota_left'] == 0 and not grant['in_flight']:
+                self._log(f"[MUTEX] Cota de imagens esgotada para {client_id}")
+                self._free(client_id)
+                self._advance_queue(time.time())
+                self._cond.notify_all()
+
+    def grant_info(self, client_id):
+        """Classe, slot e limites restantes da concessão (ou None)"""
+        with self._cond:
+            grant = self._grants.get(client_id)
+            if grant is None:
+                return None
+            info = dict(grant, slot=self.owners[client_id], lease_seconds=self.lease_seconds)
+            info['lease_left_seconds'] = max(0.0, self.last_activity[client_id] + self.lease_seconds - time.time())
+            if grant['max_hold_seconds']:
+                info['hold_left_seconds'] = max(0.0, grant['granted_at'] + grant['max_hold_seconds'] - time.time())
+            return info
+
+    def slot_of(self, client_id):
+        """Slot ocupado pelo cliente, ou None se ele não for dono"""
+        with self._cond:
+            return self.owners.get(client_id)
+
+    def force_release(self, client_id=None):
+        """Liberação forçada de um dono ou, sem client_id, de todos (uso interno ou admin)"""
+        with self._cond:
+            targets = [client_id] if client_id is not None else list(self.owners)
+            for owner in targets:
+                if owner in self.owners:
+                    self._free(owner)
+            self._advance_queue(time.time())
+            self._cond.notify_all()
+
+    def queue_position(self, client_id):
+        """Posição (1-based) do cliente na fila da sua classe, ou 0 se não estiver na fila"""
+        with self._cond:
+            priority = self._queued_class.get(client_id)
+            if priority is None:
+                return 0
+            queue = self.queues[priority]
+            return queue[client_id] - queue[self._queue_head(priority)] + 1
+
+    def snapshot(self):
+        """Retorna uma cópia consistente do estado (para health_check/GUI)"""
+        with self._cond:
+            return {
+                'locked': self.locked,
+                'owner_id': self.owner_id,
+                'owners': list(self.owners),
+                'slots': self.slots,
+                'slots_in_use': len(self.owners),
+                'queue_length': self.queue_length,
+                'queues': {name: len(queue) for name, queue in self.queues.items()}
+            }
+
+    def _resolve_priority(self, priority):
+        if priority is None:
+            return self.default_priority
+        if priority not in self.classes:
+            raise ValueError(f"Unknown priority '{priority}' (use: {', '.join(self.classes)})")
+        return priority
+
+    def _queue_head(self, priority):
+        return next(iter(self.queues[priority]), None)
+
+    def _next_class(self):
+        """Classe com fila cujo início virtual é o menor (empate: maior peso)"""
+        best, best_key = None, None
+        for name, queue in self.queues.items():
+            if not queue:
+                continue
+            start = max(self._virtual_finish[name], self._virtual_time)
+            key = (start, -self.classes[name]['weight'])
+            if best is None or key < best_key:
+                best, best_key = name, key
+        return best
+
+    def _charge(self, priority):
+        """Contabiliza uma concessão no relógio virtual da classe"""
+        start = max(self._virtual_finish[priority], self._virtual_time)
+        self._virtual_finish[priority] = start + 1.0 / self.classes[priority]['weight']
+        self._virtual_time = start
+
+    def _enqueue(self, client_id, priority, max_hold_seconds=None, image_quota=None):
+        """Insere no fim da fila da classe (se ainda não estiver) e retorna a posição"""
+        queue = self.queues[priority]
+        ticket = queue.get(client_id)
+        now = time.time()
+        if ticket is None:
+            ticket = self._next_ticket[priority]
+            self._next_ticket[priority] += 1
+            queue[client_id] = ticket
+            self._queued_class[client_id] = priority
+            self._enqueued_at[client_id] = now
+            self._reaper_wake.set()  # novo prazo de sinal de vida
+        self._last_seen[client_id] = now
+        self._queued_limits[client_id] = (max_hold_seconds, image_quota)
+        # Tickets são crescentes: com saídas do meio da fila (clientes
+        # expirados) a posição é um limite superior
+        return ticket - queue[self._queue_head(priority)] + 1
+
+    def _dequeue(self, client_id):
+        """Remove o cliente da fila da sua classe; retorna os limites pedidos"""
+        priority = self._queued_class.pop(client_id)
+        del self.queues[priority][client_id]
+        self._last_seen.pop(client_id, None)
+        return self._queued_limits.pop(client_id, (None, None))
+
+    def _advance_queue(self, now):
+        """Concede slots livres às cabeças de fila escolhidas pelo WFQ"""
+        while self._free_slots:
+            next_class = self._next_class()
+            if next_class is None:
+                return
+            client_id = self._queue_head(next_class)
+            max_hold_seconds, image_quota = self._dequeue(client_id)
+            self._charge(next_class)
+            self._grant_lock(client_id, now, next_class, max_hold_seconds, image_quota)
+
+    def _reclaim_expired(self, now):
+        expired = []
+        for client_id, last in self.last_activity.items():
+            grant = self._grants[client_id]
+            if now - last >= self.lease_seconds:
+                expired.append((client_id, 'lease_expired'))
+            elif grant['max_hold_seconds'] and now - grant['granted_at'] >= grant['max_hold_seconds']:
+                expired.append((client_id, 'max_hold_exceeded'))
+        for client_id, reason in expired:
+            self._log(f"[MUTEX] {reason} para {client_id}. Liberando forçadamente.")
+            self._free(client_id)
+            if self.on_expire:
+                self.on_expire(client_id, reason)
+        # Clientes da fila sem sinal de vida (long-poll aberto conta como vivo).
+        # Contatos só avançam no tempo, então a varredura O(n) roda apenas
+        # quando o mais antigo pode ter vencido
+        stale = []
+        if self._last_seen and now >= self._stale_check_at:
+            oldest = now
+            for client_id, last in self._last_seen.items():
+                if client_id in self._polling:
+                    continue
+                if now - last >= self.lease_seconds:
+                    stale.append(client_id)
+                else:
+                    oldest = min(oldest, last)
+            self._stale_check_at = oldest + self.lease_seconds
+        for client_id in stale:
+            self._log(f"[MUTEX] {client_id} sem sinal de vida na fila. Removendo.")
+            self._dequeue(client_id)
+            self._enqueued_at.pop(client_id, None)
+        if expired or stale:
+            self._advance_queue(now)
+            self._cond.notify_all()
+
+    def _free(self, client_id):
+        heapq.heappush(self._free_slots, self.owners.pop(client_id))
+        self.last_activity.pop(client_id, None)
+        self._grants.pop(client_id, None)
+
+    @staticmethod
+    def _tighter(limit, requested):
+        """Menor limite definido (None = sem limite)"""
+        if requested is None:
+            return limit
+        if limit is None:
+            return requested
+        return min(limit, requested)
+
+    def _grant_lock(self, client_id, timestamp, priority, max_hold_seconds=None, image_quota=None):
+        slot = heapq.heappop(self._free_slots)
+        spec = self.classes[priority]
+        quota = self._tighter(spec.get('image_quota'), image_quota)
+        self.owners[client_id] = slot
+        self.last_activity[client_id] = timestamp
+        self._grants[client_id] = {
+            'priority': priority,
+            'granted_at': timestamp,
+            'max_hold_seconds': self._tighter(spec.get('max_hold_seconds'), max_hold_seconds),
+            'image_quota': quota,
+            'quota_left': quota,
+            'in_flight': 0  # pedidos autorizados ainda em execução
+        }
+        self._log(f"[MUTEX] Lock CONCEDIDO para {client_id} (slot {slot}, {priority})")
+        self._reaper_wake.set()  # novo vencimento para a thread de expiração
+        enqueued_at = self._enqueued_at.pop(client_id, None)
+        if self.on_grant:
+            self.on_grant(client_id, timestamp - enqueued_at if enqueued_at else 0.0, priority)
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+
+# ============================================================================
+# MICRO-BATCHING DE PREDIÇÕES (SERVIDOR)
+# ============================================================================
+
+class MicroBatchScheduler:
+    """
+    Agrupa predições individuais concorrentes em um único model.predict.
+    O worker só espera pela formação do lote enquanto há imagens anunciadas
+    (expect) e ainda não enviadas; sem ninguém a caminho o lote sai na hora.
+    Cada requisição espera no máximo max_wait_ms e o lote é disparado antes
+    se atingir max_batch_size imagens.
+    submit_tensor executa um lote já montado (predict_batch/streaming) na
+    mesma thread, em ordem: o worker é o único a chamar o seu modelo.
+    """
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5, metrics=None):
+        self.predict_fn = predict_fn  # recebe (tensor (N, H, W, 3), modelo), retorna (N, 1)
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._pending = deque()  # (image_array, Future, modelo, instante de chegada, lote pronto?)
+        self._expected = 0  # imagens anunciadas (em decodificação) e ainda não enviadas
+        self.metrics = metrics  # ServerMetrics opcional (queue_wait / inference)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.batches_run = 0
+        self.items_run = 0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Para o worker; requisições pendentes ainda são processadas"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def expect(self):
+        """Anuncia uma imagem a caminho; depois chame submit(..., expected=True) ou cancel_expected()"""
+        with self._cond:
+            self._expected += 1
+
+    def cancel_expected(self):
+        """A imagem anunciada não virá (ex.: falha na decodificação)"""
+        with self._cond:
+            self._expected = max(0, self._expected - 1)
+            self._cond.notify_all()
+
+    def submit(self, image_array, model=None, expected=False):
+        """
+        Enfileira uma imagem (H, W, 3) já pré-processada.
+        Só imagens destinadas ao mesmo modelo são agrupadas no mesmo lote.
+        expected=True: cumpre um anúncio feito com expect().
+        Retorna um Future cujo resultado é o score bruto (float).
+        """
+        future = Future()
+        self.start()
+        with self._cond:
+            if expected:
+                self._expected = max(0, self._expected - 1)
+            self._pending.append((image_array, future, model, time.perf_counter(), False))
+            self._cond.notify_all()
+        return future
 
-    def force_release(self):
-        """Liberação forçada (uso interno ou admin)"""
-        self.locked = False
-        self.owner_id = None
+    def submit_tensor(self, batch_array, model=None):
+        """
+        Enfileira um tensor (N, H, W, 3) já montado, executado sozinho no worker.
+        Retorna um Future com as predições (N, 1).
+        """
+        future = Future()
+        self.start()
+        with self._cond:
+            self._pending.append((batch_array, future, model, time.perf_counter(), True))
+            self._cond.notify_all()
+        return future
 
-    def _grant_lock(self, client_id, timestamp):
-        self.locked = True
-        self.owner_id = client_id
-        self.last_activity = timestamp
-        print(f"[MUTEX] Lock CONCEDIDO para {client_id}")
+    def get_stats(self):
+        return {
+            'batches': self.batches_run,
+            'images': self.items_run,
+            'avg_batch_size': self.items_run / self.batches_run if self.batches_run else 0
+        }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._pending:
+                    return  # parado e sem pendências
+
+                # Lote já montado: executa sem esperar nem agrupar
+                if self._pending[0][4]:
+                    tensor_item = self._pending.popleft()
+                else:
+                    tensor_item = None
+                    # Espera o lote encher ou o prazo da requisição mais antiga vencer
+                    # (contado da chegada dela: quem esperou o lote anterior não espera de novo),
+                    # mas só enquanto houver imagens anunciadas a caminho
+                    deadline = self._pending[0][3] + self.max_wait
+                    while (self._running and self._expected
+                           and len(self._pending) < self.max_batch_size):
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+
+                    # Lote = sequência inicial de imagens para o mesmo modelo
+                    model = self._pending[0][2]
+                    batch = []
+                    while (self._pending and len(batch) < self.max_batch_size
+                           and self._pending[0][2] is model and not self._pending[0][4]):
+                        batch.append(self._pending.popleft())
+
+            if tensor_item is not None:
+                self._execute_tensor(tensor_item)
+            else:
+                self._execute(batch, model)
+
+    def _execute(self, batch, model):
+        futures = [item[1] for item in batch]
+        try:
+            stacked = np.stack([item[0] for item in batch])
+            start = time.perf_counter()
+            if self.metrics:
+                for item in batch:
+                    self.metrics.observe('queue_wait', start - item[3])
+            predictions = self.predict_fn(stacked, model)
+            if self.metrics:
+                self.metrics.observe('inference', time.perf_counter() - start)
+            self.batches_run += 1
+            self.items_run += len(batch)
+            for fut, pred in zip(futures, predictions):
+                fut.set_result(float(pred[0]))
+        except Exception as e:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(e)
+
+    def _execute_tensor(self, item):
+        batch_array, future, model, arrived = item[:4]
+        try:
+            start = time.perf_counter()
+            if self.metrics:
+                self.metrics.observe('queue_wait', start - arrived)
+            predictions = self.predict_fn(batch_array, model)
+            if self.metrics:
+                self.metrics.observe('inference', time.perf_counter() - start)
+            self.batches_run += 1
+            self.items_run += len(batch_array)
+            future.set_result(predictions)
+        except Exception as e:
+            future.set_exception(e)
+
+
+# ============================================================================
+# CACHE DE PREDIÇÕES POR CONTEÚDO DA IMAGEM (SERVIDOR)
+# ============================================================================
+
+class PredictionCache:
+    """
+    Cache LRU de scores brutos, chaveado pelo hash dos bytes da imagem,
+    pela identidade do modelo carregado e pelo threshold.
+    Limitado por número de entradas e por memória estimada.
+    """
+    ENTRY_OVERHEAD_BYTES = 160  # estimativa de tuple + float + nó do OrderedDict
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (score, tamanho estimado)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_bytes, model_id, threshold):
+        digest = hashlib.blake2b(image_bytes, digest_size=16).digest()
+        return (digest, model_id, threshold)
+
+    def get(self, key):
+        """Retorna o score em cache ou None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, score):
+        size = len(key[0]) + len(str(key[1])) + self.ENTRY_OVERHEAD_BYTES
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (score, size)
+            self.current_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self.current_bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0
+            }
+
+
+# ============================================================================
+# MÉTRICAS DO SERVIDOR (CONTADORES E HISTOGRAMAS DE LATÊNCIA)
+# ============================================================================
+
+class LatencyHistogram:
+    """
+    Histograma log-linear no estilo HDR, em microssegundos.
+    Valores < 32 µs têm balde exato; acima disso cada potência de 2 é
+    dividida em 16 baldes (erro relativo <= ~3%). Memória fixa (~400 ints)
+    independente do número de amostras.
+    """
+    SUB_BUCKETS = 16
+    MAX_VALUE_US = 10 ** 9  # valores maiores caem no último balde
+    NUM_BUCKETS = 2 * SUB_BUCKETS + (MAX_VALUE_US.bit_length() - 5) * SUB_BUCKETS
+
+    def __init__(self):
+        self.counts = [0] * self.NUM_BUCKETS
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def bucket_index(cls, value_us):
+        if value_us < 2 * cls.SUB_BUCKETS:
+            return value_us
+        shift = value_us.bit_length() - 5
+        index = 2 * cls.SUB_BUCKETS + (shift - 1) * cls.SUB_BUCKETS + ((value_us >> shift) - cls.SUB_BUCKETS)
+        return min(index, cls.NUM_BUCKETS - 1)
+
+    @classmethod
+    def bucket_value(cls, index):
+        """Valor representativo (meio do balde) em µs"""
+        if index < 2 * cls.SUB_BUCKETS:
+            return index
+        shift = (index - 2 * cls.SUB_BUCKETS) // cls.SUB_BUCKETS + 1
+        mantissa = (index - 2 * cls.SUB_BUCKETS) % cls.SUB_BUCKETS + cls.SUB_BUCKETS
+        return (mantissa << shift) + (1 << (shift - 1))
+
+    def record(self, value_us):
+        value_us = max(0, int(value_us))
+        self.counts[self.bucket_index(value_us)] += 1
+        self.total += 1
+        self.sum_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def merge(self, other):
+        for i, count in enumerate(list(other.counts)):
+            if count:
+                self.counts[i] += count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        """Retorna {q: valor em µs}"""
+        # O denominador é a soma dos baldes, não self.total: ao agregar shards
+        # vivos a thread dona pode ter incrementado um sem o outro
+        counts = list(self.counts)
+        observed = sum(counts)
+        if not observed:
+            return {q: 0 for q in quantiles}
+        results = {}
+        targets = sorted(quantiles)
+        cumulative = 0
+        t = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            while t < len(targets) and cumulative >= targets[t] * observed:
+                results[targets[t]] = min(self.bucket_value(index), self.max_us)
+                t += 1
+            if t == len(targets):
+                break
+        for q in targets[t:]:
+            results[q] = self.max_us
+        return results
+
+    def summary(self):
+        p = self.percentiles()
+        return {
+            'count': self.total,
+            'mean_ms': round(self.sum_us / self.total / 1000, 3) if self.total else 0,
+            'p50_ms': round(p[0.5] / 1000, 3),
+            'p95_ms': round(p[0.95] / 1000, 3),
+            'p99_ms': round(p[0.99] / 1000, 3),
+            'max_ms': round(self.max_us / 1000, 3)
+        }
+
+
+class _MetricsShard:
+    """Contadores e histogramas de uma única thread (só ela escreve)"""
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}
+        self.histograms = {}
+
+    def merge_into(self, counters, histograms):
+        for name, value in list(self.counters.items()):
+            counters[name] = counters.get(name, 0) + value
+        for stage, hist in list(self.histograms.items()):
+            histograms.setdefault(stage, LatencyHistogram()).merge(hist)
+
+
+class ServerMetrics:
+    """
+    Métricas do servidor sem lock no caminho quente.
+    Cada thread escreve no seu próprio shard (contadores + histogramas);
+    snapshot() soma os shards. Shards de threads encerradas (uma por conexão
+    no motor threaded) são consolidados para a memória não crescer.
+    """
+    STAGES = ('decode', 'queue_wait', 'mutex_wait', 'inference')
+    RATE_WINDOW_SECONDS = 10
+
+    def __init__(self):
+        self.start_time = time.time()
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()  # só para registrar/consolidar shards
+        self._retired_counters = {}
+        self._retired_histograms = {}
+        self._rate_samples = deque([(self.start_time, 0)], maxlen=128)  # (instante, predições)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _MetricsShard(threading.current_thread())
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def incr(self, name, amount=1):
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + amount
+
+    def observe(self, stage, seconds):
+        histograms = self._shard().histograms
+        hist = histograms.get(stage)
+        if hist is None:
+            hist = histograms[stage] = LatencyHistogram()
+        hist.record(seconds * 1_000_000)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def counters(self):
+        """Apenas os contadores agregados (leve, para a GUI)"""
+        counters, _ = self._aggregate(with_histograms=False)
+        return counters
+
+    def snapshot(self):
+        """Cópia agregada: contadores, percentis por estágio e vazão"""
+        counters, histograms = self._aggregate()
+        now = time.time()
+        uptime = now - self.start_time
+        predictions = counters.get('requests_success', 0)
+
+        # Vazão recente: diferença em relação à amostra mais antiga da janela
+        with self._lock:
+            if now - self._rate_samples[-1][0] >= 1:
+                self._rate_samples.append((now, predictions))
+            while (len(self._rate_samples) > 2
+                   and now - self._rate_samples[1][0] >= self.RATE_WINDOW_SECONDS):
+                self._rate_samples.popleft()
+            oldest_time, oldest_count = self._rate_samples[0]
+        recent_elapsed = now - oldest_time
+
+        return {
+            'uptime_seconds': round(uptime, 1),
+            'counters': counters,
+            'latency': {stage: histograms.get(stage, LatencyHistogram()).summary()
+                        for stage in sorted(set(self.STAGES) | set(histograms))},
+            'throughput': {
+                'predictions_per_s': round(predictions / uptime, 3) if uptime > 0 else 0,
+                'recent_predictions_per_s': round((predictions - oldest_count) / recent_elapsed, 3)
+                                            if recent_elapsed > 0 else 0,
+                'window_seconds': round(recent_elapsed, 1)
+            }
+        }
+
+    def _aggregate(self, with_histograms=True):
+        with self._lock:
+            # Consolida shards de threads que já terminaram
+            alive = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    alive.append(shard)
+                else:
+                    shard.merge_into(self._retired_counters, self._retired_histograms)
+            self._shards = alive
+
+            counters = dict(self._retired_counters)
+            histograms = {}
+            if with_histograms:
+                for stage, hist in self._retired_histograms.items():
+                    histograms[stage] = LatencyHistogram()
+                    histograms[stage].merge(hist)
+            for shard in alive:
+                if with_histograms:
+                    shard.merge_into(counters, histograms)
+                else:
+                    for name, value in list(shard.counters.items()):
+                        counters[name] = counters.get(name, 0) + value
+        return counters, histograms
+
+
+# ============================================================================
+# LOGGING NÃO BLOQUEANTE (SERVIDOR)
+# ============================================================================
+
+class LogRingBuffer:
+    """
+    Buffer circular de linhas de log entre as threads do servidor e a GUI.
+    append() é O(1) e nunca bloqueia; quando cheio, as linhas mais antigas
+    são descartadas (e contadas). A GUI esvazia o buffer em lotes (drain).
+    """
+    def __init__(self, capacity=1000):
+        self._lines = deque(maxlen=max(1, int(capacity)))
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def append(self, line):
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen:
+                self.dropped += 1
+            self._lines.append(line)
+
+    def drain(self):
+        """Retorna (linhas pendentes, quantas foram descartadas desde o último drain)"""
+        with self._lock:
+            lines = list(self._lines)
+            self._lines.clear()
+            dropped, self.dropped = self.dropped, 0
+        return lines, dropped
+
+
+class AsyncFileLogSink:
+    """
+    Grava linhas de log em arquivo numa thread própria.
+    write() só enfileira (descarta se a fila estiver cheia), então as
+    threads de atendimento nunca esperam por disco.
+    """
+    def __init__(self, path, max_pending=10000, flush_interval=0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = threading.Event()
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True, name='log-file')
+        self._thread.start()
+
+    def write(self, line):
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=2):
+        self._closed.set()
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while not (self._closed.is_set() and self._queue.empty()):
+                try:
+                    lines = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                # Agrupa o que já estiver na fila em uma única escrita
+                while True:
+                    try:
+                        lines.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+
+
+# ============================================================================
+# REGISTRO DE MODELOS COM TROCA A QUENTE (SERVIDOR)
+# ============================================================================
+
+class ModelEntry:
+    """Modelo publicado no registro"""
+    def __init__(self, name, model, path=None, generation=0, replicas=None):
+        self.name = name
+        self.model = model
+        # Cópias independentes para os workers de inferência (uma por slot)
+        self.replicas = [model] + list(replicas or [])
+        self.path = path
+        self.generation = generation
+        self.info = get_model_info(model)
+        self.refcount = 0       # requisições usando o modelo neste momento
+        self.retired = False    # substituído/removido; liberado quando refcount zerar
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+
+    def replica(self, slot):
+        """Cópia do modelo usada pelo worker do slot (compartilhada se houver menos cópias)"""
+        return self.replicas[slot % len(self.replicas)]
+
+    @property
+    def model_id(self):
+        """Identidade estável do modelo (chave do cache de predições)"""
+        return f"{self.path or self.name}#{self.generation}"
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'generation': self.generation,
+            'info': self.info,
+            'replicas': len(self.replicas),
+            'in_use': self.refcount,
+            'loaded_at': datetime.fromtimestamp(self.loaded_at).isoformat()
+        }
+
+
+class ModelRegistry:
+    """
+    Mantém vários modelos carregados, identificados por nome.
+    - Carregamento e aquecimento (warm-up) acontecem fora do lock: o modelo
+      só é publicado depois de executar um lote fictício, então a primeira
+      requisição real não paga o custo de tracing do grafo.
+    - A publicação é uma troca atômica do ponteiro no dicionário; requisições
+      em andamento seguram uma referência (acquire) e terminam no modelo antigo.
+    - Acima de max_models, o modelo menos usado recentemente (e ocioso,
+      que não seja o padrão) é descarregado; um modelo em uso é descarregado
+      quando a última requisição que o segura termina.
+    - replicas > 1: load() carrega uma cópia do modelo por worker de inferência
+      (modelos e interpretadores TFLite não são usados por duas threads ao mesmo tempo).
+    """
+    def __init__(self, max_models=2, warmup_shape=(150, 150), warmup_batch_sizes=(1,),
+                 loader=None, verbose=True, replicas=1):
+        self.max_models = max(1, int(max_models))
+        self.replicas = max(1, int(replicas))
+        self.warmup_shape = warmup_shape  # (altura, largura)
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+        self.loader = loader or load_model
+        self.verbose = verbose
+        self._entries = OrderedDict()  # nome -> ModelEntry (ordem LRU)
+        self._cond = threading.Condition()
+        self._generation = 0
+        self.default_name = None
+
+    def load(self, name, path, make_default=True):
+        """Carrega do disco, aquece e publica. Retorna (ModelEntry, erro)"""
+        model, error = self.loader(path)
+        if error:
+            return None, error
+        replicas = []
+        for _ in range(self.replicas - 1):
+            replica, error = self.loader(path)
+            if error:
+                return None, f"Replica load failed: {error}"
+            replicas.append(replica)
+        return self.publish(name, model, path=path, make_default=make_default, replicas=replicas)
+
+    def publish(self, name, model, path=None, make_default=True, replicas=None):
+        """
+        Aquece um modelo já carregado (e suas cópias) e o publica com troca atômica.
+        replicas: as registry.replicas - 1 cópias extras, uma por worker; um
+        objeto de modelo nunca é compartilhado entre workers.
+        """
+        replicas = list(replicas or [])
+        if len(replicas) != self.replicas - 1:
+            return None, (f"Expected {self.replicas - 1} replica(s) for {self.replicas} "
+                          f"inference worker(s), got {len(replicas)}")
+        try:
+            for instance in [model] + replicas:
+                self._warmup(instance)
+        except Exception as e:
+            return None, f"Warm-up failed: {e}"
+
+        with self._cond:
+            self._generation += 1
+            entry = ModelEntry(name, model, path, self._generation, replicas)
+            old = self._entries.pop(name, None)
+            if old is not None:
+                old.retired = True
+            self._entries[name] = entry
+            if make_default or self.default_name is None:
+                self.default_name = name
+            self._evict_unlocked()
+
+        self._log(f"[MODELS] Publicado '{name}' (geração {entry.generation})")
+        return entry, None
+
+    def unload(self, name):
+        """Remove um modelo do registro (requisições em andamento terminam normalmente)"""
+        with self._cond:
+            entry = self._entries.pop(name, None)
+            if entry is None:
+                return False
+            entry.retired = True
+            if self.default_name == name:
+                self.default_name = next(reversed(self._entries), None)
+        self._log(f"[MODELS] Removido '{name}'")
+        return True
+
+    @contextmanager
+    def acquire(self, name=None):
+        """
+        Empresta o modelo (padrão se name for None) durante o bloco with.
+        Produz o ModelEntry, ou None se não houver modelo com esse nome.
+        """
+        with self._cond:
+            entry = self._entries.get(name or self.default_name)
+            if entry is not None:
+                entry.refcount += 1
+                entry.last_used = time.time()
+                self._entries.move_to_end(entry.name)
+        try:
+            yield entry
+        finally:
+            if entry is not None:
+                with self._cond:
+                    entry.refcount -= 1
+                    # Quem ficou acima de max_models por estar em uso sai agora
+                    if entry.refcount == 0 and len(self._entries) > self.max_models:
+                        self._evict_unlocked()
+
+    def get(self, name=None):
+        """Retorna o ModelEntry atual (sem reservar) ou None"""
+        with self._cond:
+            return self._entries.get(name or self.default_name)
+
+    def list_loaded(self):
+        with self._cond:
+            return [dict(entry.to_dict(), default=(name == self.default_name))
+                    for name, entry in self._entries.items()]
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                'loaded': len(self._entries),
+                'max_models': self.max_models,
+                'default': self.default_name,
+                'in_use': sum(e.refcount for e in self._entries.values())
+            }
+
+    def _warmup(self, model):
+        height, width = self.warmup_shape
+        for batch_size in self.warmup_batch_sizes:
+            dummy = np.zeros((batch_size, height, width, 3), dtype=np.float32)
+            model.predict(dummy, verbose=0)
+
+    def _evict_unlocked(self):
+        """Descarrega modelos LRU ociosos até caber em max_models"""
+        for name in list(self._entries):
+            if len(self._entries) <= self.max_models:
+                break
+            entry = self._entries[name]
+            if name == self.default_name or entry.refcount > 0:
+                continue
+            del self._entries[name]
+            entry.retired = True
+            self._log(f"[MODELS] Descarregado por LRU: '{name}'")
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
 
 
 # ============================================================================
 # FUNÇÕES UTILITÁRIAS GERAIS E DE ML
 # ============================================================================
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def resolve_project_path(path):
+    """Caminhos relativos do config.json são relativos à raiz do projeto, não ao CWD"""
+    if not path or os.path.isabs(path):
+        return path
+    return os.path.join(PROJECT_ROOT, path)
+
+
 def load_config(config_path='config.json'):
     """Carrega configuração ou cria padrão se não existir"""
     default_config = {
@@ -110,12 +1205,51 @@ def load_config(config_path='config.json'):
             "models_directory": "models",
             "max_image_size_mb": 10,
             "auto_load_default": False,
-            "default_model": ""
+            "default_model": "",
+            "engine": "threaded",
+            "backlog": 128,
+            "max_connections": 512,
+            "inference_workers": 4
         },
         "model": {
             "img_height": 150,
             "img_width": 150,
-            "prediction_threshold": 0.5
+            "prediction_threshold": 0.5,
+            "max_loaded_models": 2,
+            "warmup": True,
+            "backend": "keras"
+        },
+        "mutex": {
+            "timeout_seconds": 30,
+            "max_wait_seconds": 30,
+            "lease_seconds": 10,
+            "slots": 1,
+            "mode": "centralized",
+            "priority_classes": {
+                "critical": {"weight": 10, "max_hold_seconds": None, "image_quota": None},
+                "normal": {"weight": 3, "max_hold_seconds": None, "image_quota": None},
+                "bulk": {"weight": 1, "max_hold_seconds": None, "image_quota": None}
+            }
+        },
+        "batching": {
+            "enabled": True,
+            "max_batch_size": 16,
+            "max_wait_ms": 5
+        },
+        "preprocessing": {
+            "decode_workers": 4,
+            "executor": "thread"
+        },
+        "cache": {
+            "enabled": True,
+            "max_entries": 10000,
+            "max_mb": 16
+        },
+        "logging": {
+            "max_logs": 1000,
+            "save_logs": True,
+            "log_file": "server_logs.txt",
+            "mutex_journal": "server_mutex_events.evj"
         }
     }
 
@@ -146,39 +1280,196 @@ def validate_image_file(filename):
     valid_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif'}
     return os.path.splitext(filename.lower())[1] in valid_extensions
 
+MODEL_FORMATS = {
+    '.h5': 'keras',
+    '.keras': 'keras',
+    '.tflite': 'tflite'
+}
+
+def detect_model_format(path):
+    """Retorna 'keras', 'saved_model', 'tflite' ou None"""
+    if os.path.isdir(path):
+        if os.path.exists(os.path.join(path, 'saved_model.pb')):
+            return 'saved_model'
+        return None
+    return MODEL_FORMATS.get(os.path.splitext(path)[1].lower())
+
 def scan_models(models_dir):
-    """Escaneia diretório por arquivos .h5"""
+    """Escaneia diretório por modelos (.h5, .keras, .tflite e pastas SavedModel)"""
     if not os.path.exists(models_dir):
         os.makedirs(models_dir, exist_ok=True)
         return []
     
     models = []
-    for f in os.listdir(models_dir):
-        if f.endswith('.h5'):
-            full_path = os.path.join(models_dir, f)
-            size_mb = bytes_to_mb(os.path.getsize(full_path))
-            models.append({
-                'name': f,
-                'path': full_path,
-                'size': f"{size_mb:.2f} MB"
-            })
+    for f in sorted(os.listdir(models_dir)):
+        full_path = os.path.join(models_dir, f)
+        model_format = detect_model_format(full_path)
+        if model_format is None:
+            continue
+        if model_format == 'saved_model':
+            size_bytes = sum(os.path.getsize(os.path.join(root, name))
+                             for root, _, files in os.walk(full_path) for name in files)
+        else:
+            size_bytes = os.path.getsize(full_path)
+        models.append({
+            'name': f,
+            'path': full_path,
+            'size': f"{bytes_to_mb(size_bytes):.2f} MB",
+            'format': model_format,
+            # Gerados por quantize_model.py (<modelo>_int8.tflite)
+            'quantized': model_format == 'tflite' and '_int8' in f
+        })
     return models
 
-def load_model(model_path):
-    """Carrega modelo Keras do disco"""
-    if not TF_AVAILABLE:
+# ============================================================================
+# BACKENDS DE INFERÊNCIA
+# ============================================================================
+# Todos expõem predict(batch, verbose=0) -> (N, 1), a mesma interface do
+# modelo Keras, então registro, micro-batching e make_prediction não mudam.
+
+INFERENCE_BACKENDS = ('keras', 'tf_function', 'tflite')
+
+class TFFunctionBackend:
+    """
+    Executa um grafo tf.function compilado em vez do model.predict eager.
+    Aceita um modelo Keras (compila o forward) ou um SavedModel exportado
+    com assinatura 'serving_default'.
+    """
+    def __init__(self, model=None, saved_model_path=None):
+        self.keras_model = model
+        if saved_model_path:
+            tf = get_tf()
+            self._loaded = tf.saved_model.load(saved_model_path)
+            serving = self._loaded.signatures['serving_default']
+            self._input_name = list(serving.structured_input_signature[1].keys())[0]
+            self._output_name = list(serving.structured_outputs.keys())[0]
+            self._fn = lambda batch: serving(**{self._input_name: batch})[self._output_name]
+        else:
+            self._fn = get_tf().function(lambda batch: model(batch, training=False),
+                                   reduce_retracing=True)
+
+    def predict(self, batch, verbose=0):
+        tf = get_tf()
+        return self._fn(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+
+    def describe(self):
+        if self.keras_model is not None:
+            info = get_model_info(self.keras_model)
+        else:
+            info = {}
+        info['backend'] = 'tf_function'
+        return info
+
+
+class TFLiteBackend:
+    """
+    Interpretador TFLite. Cada thread usa o seu próprio interpretador
+    (o Interpreter não é thread-safe). Modelos quantizados (int8/uint8)
+    têm entrada quantizada e saída desquantizada automaticamente.
+    """
+    def __init__(self, model_path=None, model_content=None, num_threads=None):
+        self.model_path = model_path
+        self.model_content = model_content
+        self.num_threads = num_threads
+        self._local = threading.local()
+        interpreter = self._interpreter()  # valida o arquivo já no carregamento
+        self._input = interpreter.get_input_details()[0]
+        self._output = interpreter.get_output_details()[0]
+
+    def _interpreter(self):
+        interpreter = getattr(self._local, 'interpreter', None)
+        if interpreter is None:
+            interpreter = _tflite_interpreter_class()(model_path=self.model_path,
+                                              model_content=self.model_content,
+                                              num_threads=self.num_threads)
+            interpreter.allocate_tensors()
+            self._local.interpreter = interpreter
+            self._local.batch_size = int(interpreter.get_input_details()[0]['shape'][0])
+        return interpreter
+
+    @property
+    def quantized(self):
+        return self._input['dtype'] in (np.int8, np.uint8)
+
+    def predict(self, batch, verbose=0):
+        interpreter = self._interpreter()
+        input_index = self._input['index']
+        if self._local.batch_size != len(batch):
+            interpreter.resize_tensor_input(input_index, [len(batch)] + list(self._input['shape'][1:]))
+            interpreter.allocate_tensors()
+            self._local.batch_size = len(batch)
+
+        if self.quantized:
+            scale, zero_point = self._input['quantization']
+            batch = np.clip(np.round(batch / scale + zero_point),
+                            np.iinfo(self._input['dtype']).min,
+                            np.iinfo(self._input['dtype']).max).astype(self._input['dtype'])
+        interpreter.set_tensor(input_index, batch)
+        interpreter.invoke()
+        output = interpreter.get_tensor(self._output['index'])
+
+        if self._output['dtype'] in (np.int8, np.uint8):
+            scale, zero_point = self._output['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+    def describe(self):
+        return {
+            'input_shape': str(tuple(self._input['shape'])),
+            'output_shape': str(tuple(self._output['shape'])),
+            'input_dtype': np.dtype(self._input['dtype']).name,
+            'backend': 'tflite'
+        }
+
+
+def _tflite_interpreter_class():
+    """Prefere o tflite_runtime (leve, sem TensorFlow) quando instalado"""
+    if TFLITE_RUNTIME_AVAILABLE:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    return get_tf().lite.Interpreter
+
+
+def load_model(model_path, backend='keras'):
+    """
+    Carrega um modelo do disco com o backend de inferência pedido.
+    - .h5/.keras: 'keras' (model.predict), 'tf_function' (grafo compilado) ou
+      'tflite' (usa o .tflite exportado ao lado, ver export_model.py)
+    - pasta SavedModel: sempre 'tf_function'
+    - .tflite: sempre 'tflite'
+    Retorna: (modelo, error_message)
+    """
+    if backend not in INFERENCE_BACKENDS:
+        return None, f"Unknown inference backend '{backend}'"
+    model_format = detect_model_format(model_path)
+    if not TF_AVAILABLE and not (TFLITE_RUNTIME_AVAILABLE and model_format == 'tflite'):
         return None, "TensorFlow not installed on server"
         
     try:
         # Configuração para evitar erros de GPU/DirectML se necessário
         # os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2' 
-        model = tf.keras.models.load_model(model_path)
+        if model_format == 'tflite':
+            return TFLiteBackend(model_path), None
+        if model_format == 'saved_model':
+            return TFFunctionBackend(saved_model_path=model_path), None
+        
+        if backend == 'tflite':
+            tflite_path = os.path.splitext(model_path)[0] + '.tflite'
+            if not os.path.exists(tflite_path):
+                return None, f"{os.path.basename(tflite_path)} not found (run export_model.py)"
+            return TFLiteBackend(tflite_path), None
+        
+        model = get_tf().keras.models.load_model(model_path)
+        if backend == 'tf_function':
+            return TFFunctionBackend(model), None
         return model, None
     except Exception as e:
         return None, str(e)
 
 def get_model_info(model):
     """Extrai metadados básicos do modelo carregado"""
+    if hasattr(model, 'describe'):
+        return model.describe()
     try:
         input_shape = model.input_shape
         return {
@@ -189,38 +1480,123 @@ def get_model_info(model):
     except:
         return {'info': 'Unavailable'}
 
+def decode_image_into(image_bytes, out, target_width=150, target_height=150):
+    """
+    Decodifica e redimensiona uma imagem direto no buffer out (H, W, 3).
+    Não normaliza: os valores ficam em [0, 255] no dtype de out.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    
+    # JPEG: reduz a escala já na decodificação (DCT) para >= tamanho alvo
+    img.draft('RGB', (target_width, target_height))
+    
+    # Converter para RGB (caso seja PNG com transparência ou Grayscale)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    
+    # Redimensionar
+    if img.size != (target_width, target_height):
+        img = img.resize((target_width, target_height))
+    
+    out[...] = np.asarray(img)
+
+def preprocess_images_batch(images_bytes, target_width=150, target_height=150, out=None):
+    """
+    Pré-processa várias imagens em um único buffer float32 (N, H, W, 3),
+    normalizado em [0, 1] in-place. Não depende do TensorFlow.
+    Imagens inválidas são puladas; as válidas ficam contíguas no início.
+    Retorna: (batch_array, valid_indices, errors) com errors = [(indice, mensagem)]
+    """
+    count = len(images_bytes)
+    if out is None:
+        out = np.empty((count, target_height, target_width, 3), dtype=np.float32)
+    
+    valid_indices = []
+    errors = []
+    for i, image_bytes in enumerate(images_bytes):
+        try:
+            decode_image_into(image_bytes, out[len(valid_indices)], target_width, target_height)
+            valid_indices.append(i)
+        except Exception as e:
+            errors.append((i, str(e)))
+    
+    batch = out[:len(valid_indices)]
+    # Normalizar (1./255) - IMPORTANTE: Deve bater com o ImageDataGenerator do treino
+    np.multiply(batch, 1.0 / 255.0, out=batch)
+    return batch, valid_indices, errors
+
+def _decode_image_array(image_bytes, target_width, target_height):
+    """Decodifica uma imagem para uint8 (H, W, 3) - executado no pool de processos"""
+    out = np.empty((target_height, target_width, 3), dtype=np.uint8)
+    decode_image_into(image_bytes, out, target_width, target_height)
+    return out
+
+def preprocess_images_parallel(images_bytes, target_width=150, target_height=150, executor=None):
+    """
+    Igual a preprocess_images_batch, mas decodifica/redimensiona em paralelo.
+    Com ThreadPoolExecutor cada thread escreve direto no buffer do lote
+    (o PIL libera o GIL durante decode/resize); com ProcessPoolExecutor os
+    workers devolvem arrays uint8 que são copiados para o buffer.
+    Sem executor, cai no caminho serial.
+    Retorna: (batch_array, valid_indices, errors) com errors = [(indice, mensagem)]
+    """
+    if executor is None or len(images_bytes) <= 1:
+        return preprocess_images_batch(images_bytes, target_width, target_height)
+    
+    count = len(images_bytes)
+    out = np.empty((count, target_height, target_width, 3), dtype=np.float32)
+    
+    if isinstance(executor, ProcessPoolExecutor):
+        futures = [executor.submit(_decode_image_array, b, target_width, target_height)
+                   for b in images_bytes]
+    else:
+        futures = [executor.submit(decode_image_into, b, out[i], target_width, target_height)
+                   for i, b in enumerate(images_bytes)]
+    
+    valid_indices = []
+    errors = []
+    for i, future in enumerate(futures):
+        try:
+            result = future.result()
+            if result is not None:
+                out[i] = result
+            valid_indices.append(i)
+        except Exception as e:
+            errors.append((i, str(e)))
+    
+    # Compacta as imagens válidas no início do buffer
+    for position, index in enumerate(valid_indices):
+        if position != index:
+            out[position] = out[index]
+    
+    batch = out[:len(valid_indices)]
+    np.multiply(batch, 1.0 / 255.0, out=batch)
+    return batch, valid_indices, errors
+
 def process_image_from_bytes(image_bytes, target_width=150, target_height=150):
     """
     Converte bytes brutos da imagem para formato numpy array pronto para o modelo.
-    Retorna: (image_array, error_message)
+    Retorna: (image_array, error_message) com image_array float32 (1, H, W, 3)
     """
-    if not TF_AVAILABLE:
-        return None, "TensorFlow not installed"
+    batch, _, errors = preprocess_images_batch([image_bytes], target_width, target_height)
+    if errors:
+        return None, errors[0][1]
+    return batch, None
 
-    try:
-        # Abrir imagem da memória
-        img = Image.open(io.BytesIO(image_bytes))
-        
-        # Converter para RGB (caso seja PNG com transparência ou Grayscale)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Redimensionar
-        img = img.resize((target_width, target_height))
-        
-        # Converter para array
-        img_array = tf.keras.preprocessing.image.img_to_array(img)
-        
-        # Normalizar (1./255) - IMPORTANTE: Deve bater com o ImageDataGenerator do treino
-        img_array = img_array / 255.0
-        
-        # Adicionar dimensão do batch (1, 150, 150, 3)
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        return img_array, None
-        
-    except Exception as e:
-        return None, str(e)
+def build_prediction_result(score, threshold=0.5):
+    """Monta o dicionário de resposta a partir do score bruto do modelo"""
+    # Lógica binária
+    is_fire = score > threshold
+    
+    # Confiança
+    confidence = score if is_fire else 1 - score
+    
+    return {
+        'success': True,
+        'fire_detected': is_fire,
+        'confidence': confidence * 100,
+        'raw_score': score
+    }
 
 def make_prediction(model, processed_image, threshold=0.5):
     """Realiza a predição usando o modelo"""
@@ -229,20 +1605,9 @@ def make_prediction(model, processed_image, threshold=0.5):
         prediction = model.predict(processed_image, verbose=0)
         score = float(prediction[0][0])
         
-        # Lógica binária
-        is_fire = score > threshold
-        
-        # Confiança
-        confidence = score if is_fire else 1 - score
-        
-        return {
-            'success': True,
-            'fire_detected': is_fire,
-            'confidence': confidence * 100,
-            'raw_score': score
-        }
+        return build_prediction_result(score, threshold)
     except Exception as e:
         return {
             'success': False,
             'error': str(e)
-        }
\ No newline at end of file
+        }
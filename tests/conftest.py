@@ -0,0 +1,5 @@
+"""Os módulos do projeto ficam em src/ (scripts executados de dentro dela)"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,135 @@
+"""
+MutexManager: concessão e fila, slots, fila justa ponderada (WFQ), leases,
+remoção de quem está parado na fila e cota de imagens por concessão.
+"""
+import threading
+import time
+
+from utils import MutexManager
+
+
+def make_mutex(**kwargs):
+    kwargs.setdefault('verbose', False)
+    return MutexManager(**kwargs)
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_grant_then_fifo_queue():
+    mutex = make_mutex()
+    assert mutex.request_access('a') == (True, 'GRANTED', 0)
+    assert mutex.request_access('b')[:3] == (False, 'QUEUED', 1)
+    assert mutex.request_access('c')[:3] == (False, 'QUEUED', 2)
+    assert mutex.request_access('a')[0]  # reentrante
+
+    # Liberar entrega o slot direto à cabeça da fila
+    assert mutex.release('a')
+    assert mutex.owner_id == 'b'
+    assert mutex.request_access('b')[0]
+    assert not mutex.release('c')  # só o dono libera
+
+
+def test_slots_grant_distinct_workers():
+    mutex = make_mutex(slots=2)
+    assert mutex.request_access('a')[0] and mutex.request_access('b')[0]
+    assert {mutex.slot_of('a'), mutex.slot_of('b')} == {0, 1}
+    assert not mutex.request_access('c')[0]
+    assert mutex.locked
+
+    freed = mutex.slot_of('a')
+    mutex.release('a')
+    assert mutex.slot_of('c') == freed
+
+
+def test_long_poll_wakes_on_release():
+    mutex = make_mutex()
+    mutex.request_access('a')
+    result = {}
+    waiter = threading.Thread(target=lambda: result.update(granted=mutex.wait_for_access('b', timeout=5)[0]))
+    waiter.start()
+    assert wait_until(lambda: mutex.queue_length == 1)
+    mutex.release('a')
+    waiter.join(timeout=5)
+    assert result['granted'] and mutex.owner_id == 'b'
+
+
+def test_weighted_fair_queueing_ratio():
+    classes = {'critical': {'weight': 3}, 'bulk': {'weight': 1}}
+    mutex = make_mutex(classes=classes, lease_seconds=60)
+    mutex.request_access('holder', priority='bulk')
+    for i in range(40):
+        mutex.request_access(f'c{i}', priority='critical')
+        mutex.request_access(f'b{i}', priority='bulk')
+
+    granted = []
+    owner = 'holder'
+    for _ in range(40):
+        mutex.release(owner)
+        owner = mutex.owner_id
+        granted.append(mutex.grant_info(owner)['priority'])
+    # Peso 3:1 -> 30 de 40 concessões (±1 pela concessão já feita a 'holder')
+    assert abs(granted.count('critical') - 30) <= 1
+    # Classe de menor peso não passa fome: nunca mais de 4 'critical' seguidas
+    run = longest = 0
+    for priority in granted:
+        run = run + 1 if priority == 'critical' else 0
+        longest = max(longest, run)
+    assert longest <= 4
+
+
+def test_expired_lease_is_reclaimed_by_reaper():
+    expired = []
+    mutex = make_mutex(lease_seconds=0.1, on_expire=lambda client_id, reason: expired.append(client_id))
+    mutex.start_reaper()
+    try:
+        mutex.request_access('a')
+        assert mutex.heartbeat('a')[0]
+        assert wait_until(lambda: expired == ['a'])
+        assert mutex.owner_id is None
+        assert not mutex.heartbeat('a')[0]
+    finally:
+        mutex.stop_reaper()
+
+
+def test_silent_waiter_leaves_the_queue():
+    mutex = make_mutex(lease_seconds=0.2)
+    mutex.request_access('owner')
+    mutex.request_access('silent')
+    mutex.request_access('polling')
+
+    # O dono e o segundo da fila dão sinal de vida; 'silent' some
+    deadline = time.time() + 0.6
+    while time.time() < deadline:
+        mutex.heartbeat('owner')
+        mutex.request_access('polling')
+        time.sleep(0.02)
+
+    mutex.release('owner')
+    assert mutex.owner_id == 'polling'
+    assert mutex.queue_length == 0
+
+
+def test_image_quota_is_released_after_the_last_request():
+    classes = {'normal': {'weight': 1, 'image_quota': 3}}
+    mutex = make_mutex(classes=classes)
+    mutex.request_access('a')
+    mutex.request_access('b')
+
+    assert mutex.authorize('a', 2) == (True, None)
+    assert mutex.authorize('a', 2) == (False, 'quota_exceeded')  # recusado sem perder o slot
+    assert mutex.authorize('a', 1) == (True, None)
+    assert mutex.grant_info('a')['quota_left'] == 0
+
+    # Cota zerada, mas dois pedidos ainda em execução: o slot continua com 'a'
+    mutex.finish('a')
+    assert mutex.owner_id == 'a'
+    mutex.finish('a')
+    assert mutex.owner_id == 'b'
+    assert mutex.authorize('a', 1) == (False, 'not_owner')
@@ -0,0 +1,105 @@
+"""
+Enquadramento do protocolo RPC: quadro JSON, quadro binário com anexos,
+relógio de Lamport no transporte e ida e volta pelo pool de conexões.
+"""
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from lamport_clock import LamportClock
+from rpc_protocol import (
+    BINARY_FRAME_FLAG, ATTACHMENT_KEY, RPCConnectionPool, RPCServerBase,
+    encode_rpc_message, decode_rpc_body, parse_frame_header,
+    send_rpc_message, receive_rpc_message
+)
+
+
+def roundtrip(message, **clocks):
+    a, b = socket.socketpair()
+    with a, b:
+        send_rpc_message(a, message, clocks.get('sender'))
+        return receive_rpc_message(b, clocks.get('receiver'))
+
+
+def test_json_frame_is_length_prefixed():
+    frame = encode_rpc_message({'method': 'health_check', 'params': {}})
+    length, binary = parse_frame_header(frame[:4])
+    assert not binary
+    assert length == len(frame) - 4
+    assert decode_rpc_body(frame[4:]) == {'method': 'health_check', 'params': {}}
+
+
+def test_bytes_values_travel_as_attachments():
+    message = {
+        'method': 'predict_batch',
+        'params': {'images': [{'filename': 'a.jpg', 'image_bytes': b'\xff\xd8abc'},
+                              {'filename': 'b.jpg', 'image_bytes': b''}]}
+    }
+    frame = encode_rpc_message(message)
+    assert struct.unpack('>I', frame[:4])[0] & BINARY_FRAME_FLAG
+    length, binary = parse_frame_header(frame[:4])
+    assert binary and length == len(frame) - 4
+    # Os bytes não passam pelo JSON: o corpo JSON só tem marcadores
+    assert ATTACHMENT_KEY.encode() in frame
+    assert decode_rpc_body(frame[4:], binary) == message
+
+
+def test_socket_roundtrip_restores_attachments():
+    message = {'method': 'predict_image', 'params': {'image_bytes': bytes(range(256)) * 100}}
+    assert roundtrip(message) == message
+
+
+def test_lamport_timestamp_is_carried_and_merged():
+    sender, receiver = LamportClock('a'), LamportClock('b')
+    for _ in range(5):
+        sender.tick()
+    received = roundtrip({'method': 'ping', 'params': {}}, sender=sender, receiver=receiver)
+    assert received['lamport_ts'] == sender.get_timestamp()
+    assert receiver.get_timestamp() > received['lamport_ts']
+
+
+def test_closed_peer_yields_none():
+    a, b = socket.socketpair()
+    a.close()
+    with b:
+        assert receive_rpc_message(b) is None
+
+
+@pytest.fixture(params=['threaded', 'asyncio'])
+def echo_server(request):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = RPCServerBase('127.0.0.1', port, engine=request.param)
+    server.register_method('echo', lambda params: {'success': True, 'payload': params.get('payload')})
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    deadline = time.time() + 5
+    while not server.running and time.time() < deadline:
+        time.sleep(0.01)
+    yield server
+    server.stop()
+
+
+def test_pool_reuses_connections(echo_server):
+    pool = RPCConnectionPool('127.0.0.1', echo_server.port, max_size=2, timeout=5)
+    try:
+        for payload in (b'\x00\x01', 'texto', [1, 2, 3]):
+            response = pool.call({'method': 'echo', 'params': {'payload': payload}})
+            assert response == {'success': True, 'payload': payload}
+        assert pool._idle.qsize() == 1  # chamadas sequenciais usam a mesma conexão
+        assert pool.call({'method': 'missing', 'params': {}})['error'] == 'Method not found'
+    finally:
+        pool.close()
+
+
+def test_pool_discards_connection_closed_by_server():
+    a, b = socket.socketpair()
+    pool = RPCConnectionPool('127.0.0.1', 1)
+    with a:
+        assert pool._is_healthy(a, time.time())
+        b.close()
+        assert not pool._is_healthy(a, time.time())